@@ -0,0 +1,14 @@
+"""
+CourierX core: booking, pricing, receipt numbers, pincode lookup and
+persistence, with no Tk and no module-level state beyond configuration.
+
+    from courierx.booking import open_bookings
+    bookings = open_bookings()          # or Bookings(Database(url), load_rate_card(path))
+    price = bookings.quote("Punjab", 2.5, "141001", "110001")
+    receipt = bookings.book({...})
+
+Submodules import their own dependencies (SQLAlchemy, NumPy; pandas only when
+a pincode CSV has to be parsed), so importing the package itself is free.
+The Tkinter app (main.py) is one client of this package; `python -m courierx`
+is another.
+"""
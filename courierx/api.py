@@ -0,0 +1,320 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote
+
+from sqlalchemy import bindparam, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from . import metrics
+from .booking import PAYMENT_METHODS, Bookings, format_rupees, payment_status_for
+from .bulk import price_shipments, shipment_from_row
+from .db import Courier
+from .search import SEARCH_LIMIT, search_shipments
+from .tracking import TRACKING_BOOKED, current_status, timeline
+
+# =========================
+# Local booking API (HTTP/JSON over asyncio)
+# =========================
+#   POST /bookings                     fields as for bulk import (+ optional payment_method)
+#                                      -> 201 {"receipt", "price", "price_paise", "payment_status"}
+#   POST /bookings/<receipt>/payment   {"payment_method": ...} -> 200 {"receipt", "payment_method", ...}
+#   GET  /bookings/<receipt>           -> 200 the stored booking
+#   GET  /bookings/<receipt>/events    -> 200 {"receipt", "tracking_status", "events": [{"at", "status", ...}]}
+#   GET  /search?q=<words>[&limit=n]   -> 200 {"results": [booking, ...]}, best name/address matches first
+#   GET  /health                       -> 200 {"ok": true, "batches": ..., "writes": ...}
+#   GET  /metrics                      -> 200 Prometheus text (see courierx.metrics)
+#
+# Requests are validated on the event loop, then queued for one writer thread.
+# The writer takes everything queued so far (up to max_batch, after waiting
+# max_wait_ms for stragglers), prices the new bookings in one vectorized pass
+# and commits the whole batch in a single transaction, so concurrent counters
+# share commits instead of queueing on the SQLite write lock. Every response
+# is sent only after its batch has committed.
+API_HOST = os.environ.get("COURIERX_API_HOST", "127.0.0.1")
+API_PORT = int(os.environ.get("COURIERX_API_PORT", "8765"))
+API_MAX_BATCH = 256
+API_MAX_WAIT_MS = 2.0
+API_MAX_BODY = 64 * 1024
+
+API_BOOKINGS_TOTAL = metrics.counter("courierx_bookings_total", "Bookings stored", source="api")
+API_COMMITS = metrics.histogram("courierx_api_commit_seconds", "Group commits of the booking API")
+
+HTTP_REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                413: "Payload Too Large", 422: "Unprocessable Entity", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def courier_json(c) -> dict:
+    return {
+        "receipt": c.receipt,
+        "sender_name": c.sender_name, "sender_address": c.sender_address,
+        "sender_phone": c.sender_phone, "sender_pincode": c.sender_pincode,
+        "receiver_name": c.receiver_name, "receiver_address": c.receiver_address,
+        "receiver_phone": c.receiver_phone, "receiver_pincode": c.receiver_pincode,
+        "weight": c.weight, "price": format_rupees(c.price_paise), "price_paise": c.price_paise,
+        "payment_method": c.payment_method, "payment_status": c.payment_status or "Pending", "batch": c.batch,
+        "created_at": c.created_at.isoformat(sep=" ") if c.created_at else None,
+        "tracking_status": c.tracking_status or TRACKING_BOOKED, "tracking_location": c.tracking_location,
+        "tracking_at": c.tracking_at.isoformat(sep=" ") if c.tracking_at else None,
+    }
+
+
+class GroupCommitter:
+    """Collects bookings and payment updates from many requests into shared transactions."""
+
+    def __init__(self, bookings: Bookings, max_batch: int = API_MAX_BATCH, max_wait_ms: float = API_MAX_WAIT_MS):
+        self.bookings = bookings
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.writes = 0
+        self._queue = None
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+
+    async def submit(self, kind: str, item: dict):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((kind, item, future))
+        return await future
+
+    async def run(self):
+        self._queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            self._drain(batch)
+            if len(batch) < self.max_batch and self.max_wait > 0:
+                await asyncio.sleep(self.max_wait)
+                self._drain(batch)
+            with API_COMMITS.time(f"{len(batch)} writes"):
+                results = await loop.run_in_executor(self._writer, self._commit_isolated, batch)
+            self.batches += 1
+            self.writes += len(batch)
+            for (_, _, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _drain(self, batch: list):
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                return
+
+    def _commit_isolated(self, batch: list) -> list:
+        """Commit the batch; if it fails, retry item by item so one bad request can't fail the rest."""
+        try:
+            return self._commit(batch)
+        except IntegrityError as e:
+            if len(batch) > 1:
+                return [self._commit_isolated([item])[0] for item in batch]
+            kind, item, _ = batch[0]
+            if kind != "book":
+                return [e]
+            item.pop("receipt")  # only possible against receipts issued by the old random generator
+            try:
+                return self._commit(batch)
+            except Exception as e:
+                return [e]
+        except Exception as e:
+            if len(batch) == 1:
+                return [e]
+            return [self._commit_isolated([item])[0] for item in batch]
+
+    def _commit(self, batch: list) -> list:
+        new = [item for kind, item, _ in batch if kind == "book"]
+        payments = [item for kind, item, _ in batch if kind == "payment"]
+        unpriced = [row for row in new if "price_paise" not in row]
+        if unpriced:
+            price_shipments(self.bookings.rate_card, unpriced)
+        for row in new:
+            if "receipt" not in row:
+                row["receipt"] = self.bookings.receipts.next()
+
+        def write(s):
+            if new:
+                s.execute(insert(Courier), new)
+            if not payments:
+                return set()
+            wanted = [p["receipt"] for p in payments]
+            found = set(s.scalars(select(Courier.receipt).where(Courier.receipt.in_(wanted))))
+            t = Courier.__table__
+            params = [{"r": p["receipt"], "m": p["payment_method"], "st": p["payment_status"]}
+                      for p in payments if p["receipt"] in found]
+            if params:
+                s.execute(
+                    t.update().where(t.c.receipt == bindparam("r"))
+                    .values(payment_method=bindparam("m"), payment_status=bindparam("st")),
+                    params,
+                )
+            return found
+
+        found = self.bookings.db.run(write)
+        API_BOOKINGS_TOTAL.inc(len(new))
+        results = []
+        for kind, item, _ in batch:
+            if kind == "book":
+                results.append({"receipt": item["receipt"], "price": format_rupees(item["price_paise"]),
+                                "price_paise": item["price_paise"], "payment_status": item["payment_status"]})
+            elif item["receipt"] in found:
+                results.append({"receipt": item["receipt"], "payment_method": item["payment_method"],
+                                "payment_status": item["payment_status"]})
+            else:
+                results.append(HTTPError(404, f"No booking with receipt {item['receipt']}"))
+        return results
+
+
+class BookingAPI:
+    def __init__(self, bookings: Bookings, pincode_table=None, max_batch: int = API_MAX_BATCH,
+                 max_wait_ms: float = API_MAX_WAIT_MS):
+        self.bookings = bookings
+        self.pincode_table = pincode_table
+        self.committer = GroupCommitter(bookings, max_batch, max_wait_ms)
+        self._readers = ThreadPoolExecutor(max_workers=4, thread_name_prefix="db-reader")
+
+    # ---------- Routes ----------
+    async def create_booking(self, body: dict):
+        method = body.get("payment_method")
+        if method is not None and method not in PAYMENT_METHODS:
+            raise HTTPError(422, f"payment_method must be one of: {', '.join(PAYMENT_METHODS)}")
+        row, error = shipment_from_row(body, self.pincode_table)
+        if error:
+            raise HTTPError(422, error)
+        if method:
+            row["payment_method"] = method
+            row["payment_status"] = payment_status_for(method)
+        return 201, await self.committer.submit("book", row)
+
+    async def set_payment(self, receipt_no: str, body: dict):
+        method = body.get("payment_method")
+        if method not in PAYMENT_METHODS:
+            raise HTTPError(422, f"payment_method must be one of: {', '.join(PAYMENT_METHODS)}")
+        item = {"receipt": receipt_no, "payment_method": method, "payment_status": payment_status_for(method)}
+        return 200, await self.committer.submit("payment", item)
+
+    async def get_booking(self, receipt_no: str):
+        def fetch(s):
+            return s.scalars(select(Courier).where(Courier.receipt == receipt_no)).first()
+
+        c = await asyncio.get_running_loop().run_in_executor(self._readers, self.bookings.db.run, fetch)
+        if c is None:
+            raise HTTPError(404, f"No booking with receipt {receipt_no}")
+        return 200, courier_json(c)
+
+    async def get_events(self, receipt_no: str):
+        loop = asyncio.get_running_loop()
+        now = await loop.run_in_executor(self._readers, current_status, self.bookings.db, [receipt_no])
+        if receipt_no not in now:
+            raise HTTPError(404, f"No booking with receipt {receipt_no}")
+        events = await loop.run_in_executor(self._readers, timeline, self.bookings.db, receipt_no)
+        status, place, at = now[receipt_no]
+        return 200, {
+            "receipt": receipt_no, "tracking_status": status, "tracking_location": place,
+            "tracking_at": at.isoformat(sep=" ") if at else None,
+            "events": [{"at": at.isoformat(sep=" "), "status": status, "location": place}
+                       for at, status, place in events],
+        }
+
+    async def search(self, params: dict):
+        try:
+            limit = max(1, min(int(params.get("limit", [SEARCH_LIMIT])[0]), 500))
+        except ValueError:
+            raise HTTPError(400, "limit must be a number")
+        found = await asyncio.get_running_loop().run_in_executor(
+            self._readers, search_shipments, self.bookings.db, params.get("q", [""])[0], limit)
+        return 200, {"results": [courier_json(c) for c in found]}
+
+    async def dispatch(self, method: str, path: str, body: bytes):
+        path, _, query = path.partition("?")
+        parts = [unquote(p) for p in path.strip("/").split("/")]
+        data = {}
+        if method == "POST":
+            try:
+                data = json.loads(body or b"{}")
+            except ValueError as e:
+                raise HTTPError(400, f"Invalid JSON: {e}")
+            if not isinstance(data, dict):
+                raise HTTPError(400, "Expected a JSON object")
+        if parts == ["metrics"] and method == "GET":
+            return 200, metrics.render()
+        if parts == ["health"] and method == "GET":
+            return 200, {"ok": True, "batches": self.committer.batches, "writes": self.committer.writes}
+        if parts == ["search"] and method == "GET":
+            return await self.search(parse_qs(query))
+        if parts == ["bookings"] and method == "POST":
+            return await self.create_booking(data)
+        if len(parts) == 2 and parts[0] == "bookings" and method == "GET":
+            return await self.get_booking(parts[1].upper())
+        if len(parts) == 3 and parts[0] == "bookings" and parts[2] == "events" and method == "GET":
+            return await self.get_events(parts[1].upper())
+        if len(parts) == 3 and parts[0] == "bookings" and parts[2] == "payment" and method == "POST":
+            return await self.set_payment(parts[1].upper(), data)
+        if parts and parts[0] in ("bookings", "health", "metrics", "search"):
+            raise HTTPError(405, f"{method} not allowed on /{'/'.join(parts)}")
+        raise HTTPError(404, f"No route for /{'/'.join(parts)}")
+
+    # ---------- HTTP/1.1 (keep-alive, JSON bodies only) ----------
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                if length > API_MAX_BODY:
+                    status, payload, keep_alive = 413, {"error": "Request body too large"}, False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    try:
+                        status, payload = await self.dispatch(method, target, body)
+                    except HTTPError as e:
+                        status, payload = e.status, {"error": str(e)}
+                    except Exception as e:
+                        print(f"[WARN] {method} {target} failed: {e!r}")
+                        status, payload = 500, {"error": "Internal error"}
+                if isinstance(payload, str):
+                    data, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+                else:
+                    data, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json"
+                head = (f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+                        f"Content-Type: {content_type}; charset=utf-8\r\n"
+                        f"Content-Length: {len(data)}\r\n"
+                        + ("" if keep_alive else "Connection: close\r\n") + "\r\n")
+                writer.write(head.encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = API_HOST, port: int = API_PORT, ready=None):
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        committer = asyncio.create_task(self.committer.run())
+        if ready:
+            ready(server.sockets[0].getsockname())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            committer.cancel()
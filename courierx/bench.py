@@ -0,0 +1,341 @@
+import csv
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from .booking import Bookings, format_receiver_address, to_paise, validate_booking
+from .bulk import insert_shipments
+from .pricing import load_rate_card
+from .stress import PROJECT_ROOT, fresh_database
+
+# =========================
+# Headless throughput benchmark
+# =========================
+# Runs the core with no display: how long the package takes to import, and
+# how many bookings per second go through validate -> quote -> book ->
+# payment update, one transaction at a time and in bulk batches.
+
+
+def import_time_ms(module: str) -> float:
+    """Wall time to import `module` in a fresh interpreter."""
+    code = ("import time; t = time.perf_counter(); import " + module +
+            "; print((time.perf_counter() - t) * 1000)")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [PROJECT_ROOT, os.environ.get("PYTHONPATH")])))
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+    return float(out.stdout.strip())
+
+
+def sample_booking(i: int) -> dict:
+    state = random.choice(["Punjab", "Kerala", "Delhi", "Bihar", "Maharashtra"])
+    return dict(
+        sender_name="Bench Sender", sender_address="Counter 1", sender_pincode="110001",
+        sender_phone="9876543210", receiver_name=f"Receiver {i}", street="Main Road", locality="Market",
+        city="City", state=state, receiver_pincode="141001", receiver_phone="9123456780",
+        weight=str(round(random.uniform(0.2, 20), 1)),
+    )
+
+
+def run_benchmark(count: int = 2000, bulk_count: int = 50000, db_path: str = "bench_couriers.db") -> dict:
+    results = {
+        "import courierx (ms)": import_time_ms("courierx"),
+        "import courierx.booking (ms)": import_time_ms("courierx.booking"),
+        "  of which SQLAlchemy + NumPy (ms)": import_time_ms("sqlalchemy.orm, numpy"),
+    }
+    db = fresh_database(db_path)
+    bookings = Bookings(db, load_rate_card())
+    forms = [sample_booking(i) for i in range(count)]
+
+    started = time.perf_counter()
+    for form in forms:
+        validate_booking(**form)
+        bookings.quote(form["state"], float(form["weight"]), form["receiver_pincode"], form["sender_pincode"])
+    results["validate + quote (/s)"] = count / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for i, form in enumerate(forms):
+        price = bookings.quote(form["state"], float(form["weight"]), form["receiver_pincode"],
+                               form["sender_pincode"])
+        rcpt = bookings.book(dict(
+            sender_name=form["sender_name"], sender_address=form["sender_address"],
+            sender_phone=form["sender_phone"], sender_pincode=form["sender_pincode"],
+            receiver_name=form["receiver_name"],
+            receiver_address=format_receiver_address(str(i), form["street"], form["locality"],
+                                                     form["city"], form["state"]),
+            receiver_phone=form["receiver_phone"], receiver_pincode=form["receiver_pincode"],
+            weight=float(form["weight"]), price_paise=to_paise(price),
+            payment_method=None, payment_status="Pending",
+        ))
+        bookings.set_payment_method(rcpt, "Cash on Delivery", price)
+    results["counter bookings, book + payment (/s)"] = count / (time.perf_counter() - started)
+
+    rows = []
+    for i in range(bulk_count):
+        form = sample_booking(i)
+        rows.append(dict(
+            _state=form["state"], _volume_cm3=None,
+            sender_name=form["sender_name"], sender_address=form["sender_address"],
+            sender_phone=form["sender_phone"], sender_pincode=form["sender_pincode"],
+            receiver_name=form["receiver_name"],
+            receiver_address=format_receiver_address(str(i), form["street"], form["locality"],
+                                                     form["city"], form["state"]),
+            receiver_phone=form["receiver_phone"], receiver_pincode=form["receiver_pincode"],
+            weight=float(form["weight"]), payment_method=None, payment_status="Pending",
+        ))
+    started = time.perf_counter()
+    for lo in range(0, bulk_count, 5000):
+        insert_shipments(bookings, rows[lo:lo + 5000])
+    results["bulk bookings, 5000 per transaction (/s)"] = bulk_count / (time.perf_counter() - started)
+
+    db.dispose()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    return results
+
+
+# =========================
+# Benchmark suite (JSON results)
+# =========================
+# Times the hot paths one at a time against synthetic full-scale data in
+# --data-dir: a pincode CSV the size of the India post office directory and a
+# shipments database with a million bookings. Both are generated from a fixed
+# seed on first use and then reused, so runs on different commits measure the
+# same data. Results go to a JSON file; --compare prints the change against an
+# earlier run.
+SUITE_SEED = 2024
+SUITE_PINCODE_ROWS = 155000  # post offices in the India pincode directory
+SUITE_SHIPMENTS = 1000000
+SUITE_REPEAT = 5
+
+STATES = [
+    "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh", "Goa", "Gujarat", "Haryana",
+    "Himachal Pradesh", "Jharkhand", "Karnataka", "Kerala", "Madhya Pradesh", "Maharashtra", "Manipur",
+    "Meghalaya", "Mizoram", "Nagaland", "Odisha", "Punjab", "Rajasthan", "Sikkim", "Tamil Nadu", "Telangana",
+    "Tripura", "Uttar Pradesh", "Uttarakhand", "West Bengal", "Andaman and Nicobar Islands", "Chandigarh",
+    "Dadra and Nagar Haveli and Daman and Diu", "Delhi", "Jammu and Kashmir", "Ladakh", "Lakshadweep",
+    "Puducherry",
+]
+_SYLLABLES = ["ra", "ma", "ka", "la", "na", "sa", "ha", "pa", "da", "ga", "va", "ja", "ta", "ba", "sha",
+              "chi", "ri", "ni", "lu", "ko", "mu", "dhi", "bhi", "khe", "to", "ve", "su", "an", "in", "ur"]
+_SUFFIXES = ["pur", "nagar", "garh", "abad", "ganj", "palli", "halli", "wadi", "gaon", "kot", "pet", "puram",
+             "ur", "bagh", "khera", " Bazar", " Colony", " Road", ""]
+PINCODE_CSV_HEADER = ["circlename", "regionname", "divisionname", "officename", "pincode", "officetype",
+                      "delivery", "district", "statename", "latitude", "longitude"]
+
+
+def _place_name(rng: random.Random) -> str:
+    return ("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 3))) + rng.choice(_SUFFIXES)).title()
+
+
+def synthetic_pincode_csv(path: str, rows: int = SUITE_PINCODE_ROWS, seed: int = SUITE_SEED):
+    """India_pincode.csv-shaped file: ~8 post offices per PIN, ~20 districts per state."""
+    rng = random.Random(seed)
+    districts = [(state, _place_name(rng)) for state in STATES for _ in range(20)]
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(PINCODE_CSV_HEADER)
+        pin = 110001
+        for i in range(rows):
+            if i % 8 == 0:
+                pin = rng.randint(110000, 855999)
+                state, district = rng.choice(districts)
+            office = _place_name(rng) + rng.choice(["", "", " B.O", " S.O", " H.O"])
+            w.writerow([state + " Circle", "Region", district + " Division", office, pin,
+                        rng.choice(["BO", "SO", "HO"]), "Delivery", district, state.upper(),
+                        f"{rng.uniform(8, 35):.4f}", f"{rng.uniform(68, 97):.4f}"])
+    os.replace(tmp, path)
+
+
+def synthetic_shipments_db(db_path: str, rows: int = SUITE_SHIPMENTS, seed: int = SUITE_SEED):
+    """Migrated couriers database holding `rows` bookings over the past year."""
+    from sqlalchemy import insert
+
+    from .db import Courier
+    from .receipts import ReceiptAllocator
+
+    rng = random.Random(seed)
+    tmp = db_path + ".tmp"
+    db = fresh_database(tmp)
+    receipts = ReceiptAllocator(db).allocate(rows)
+    now = datetime(2026, 1, 1)
+    for lo in range(0, rows, 50000):
+        batch = []
+        for i in range(lo, min(rows, lo + 50000)):
+            state = rng.choice(STATES)
+            weight = round(rng.uniform(0.2, 20), 1)
+            method = rng.choice(["Google Pay", "Other UPI App", "Cash on Delivery", None])
+            batch.append(dict(
+                receipt=receipts[i], sender_name=f"Sender {i % 5000}", sender_address="Counter",
+                sender_phone=f"9{rng.randrange(10 ** 9):09d}", sender_pincode=str(rng.randint(110000, 855999)),
+                receiver_name=f"Receiver {i}",
+                receiver_address=format_receiver_address(str(i), "Main Road", "Market", "City", state),
+                receiver_phone=f"8{rng.randrange(10 ** 9):09d}", receiver_pincode=str(rng.randint(110000, 855999)),
+                weight=weight, price_paise=int(weight * 7000), payment_method=method,
+                payment_status="Pending" if method in (None, "Cash on Delivery")
+                else rng.choice(["Unverified", "Paid", "Paid"]),
+                created_at=now - timedelta(seconds=rng.randrange(365 * 86400)),
+            ))
+        db.run(lambda s: s.execute(insert(Courier), batch))
+    db.dispose()
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(tmp + suffix):
+            os.remove(tmp + suffix)
+    os.replace(tmp, db_path)
+
+
+def measure(fn, number: int = 1, repeat: int = SUITE_REPEAT, setup=None) -> dict:
+    """Time `number` calls of fn(i), `repeat` times; per-call times in ms."""
+    runs = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        for i in range(number):
+            fn(i)
+        runs.append((time.perf_counter() - started) / number * 1000)
+    median = statistics.median(runs)
+    return {"calls": number, "repeat": repeat, "median_ms": median, "min_ms": min(runs),
+            "per_s": 1000 / median if median else None}
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True,
+                             text=True, timeout=10)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_suite(data_dir: str = "bench_data", pincode_rows: int = SUITE_PINCODE_ROWS,
+              shipments: int = SUITE_SHIPMENTS, seed: int = SUITE_SEED, repeat: int = SUITE_REPEAT) -> dict:
+    from sqlalchemy import delete, func, select
+
+    from . import pincodes
+    from .db import Courier, Database
+    from .receipts import ReceiptAllocator
+
+    os.makedirs(data_dir, exist_ok=True)
+    csv_path = os.path.join(data_dir, f"pincodes-{pincode_rows}-{seed}.csv")
+    db_path = os.path.join(data_dir, f"shipments-{shipments}-{seed}.db")
+    if not os.path.exists(csv_path):
+        print(f"Generating {csv_path} ...", file=sys.stderr)
+        synthetic_pincode_csv(csv_path, pincode_rows, seed)
+    if not os.path.exists(db_path):
+        print(f"Generating {db_path} (one-off, takes a while) ...", file=sys.stderr)
+        synthetic_shipments_db(db_path, shipments, seed)
+
+    rng = random.Random(seed)
+    results = {}
+    cache_path = pincodes.cache_path_for(csv_path)
+
+    # ---------- Pincode data (startup and info_receiver-style lookups) ----------
+    results["pincodes.parse_csv"] = measure(lambda i: pincodes.read_csv_table(csv_path), repeat=min(repeat, 3))
+    pincodes.load(csv_path, cache_path)  # make sure the cache exists and is current
+    results["pincodes.load_cache"] = measure(lambda i: pincodes.load(csv_path, cache_path), repeat=repeat)
+    table = pincodes.load(csv_path, cache_path)
+    # Small --pincodes data sets have fewer distinct areas/PINs than lookups, so those are repeated
+    areas = [table.areas[c] for c in rng.sample(range(1, len(table.areas)), min(2000, len(table.areas) - 1))]
+    pins = [str(p) for p in rng.sample(sorted(table.pin_index), min(2000, len(table.pin_index)))]
+    prefixes = [a[:3] for a in areas]
+    typos = []
+    for a in areas[:500]:
+        j = rng.randrange(1, len(a) - 1)
+        typos.append(a[:j] + a[j + 1] + a[j] + a[j + 2:])  # swap two letters
+    results["pincodes.find_area"] = measure(lambda i: table.find_area(areas[i % len(areas)]), 2000, repeat)
+    results["pincodes.find_pin"] = measure(lambda i: table.find_pin(pins[i % len(pins)]), 2000, repeat)
+    results["pincodes.suggest_prefix"] = measure(
+        lambda i: table.suggest_areas(prefixes[i % len(prefixes)]), 2000, repeat)
+    results["pincodes.suggest_fuzzy"] = measure(lambda i: table.suggest_areas(typos[i % len(typos)]), 500, repeat)
+
+    # ---------- Pricing ----------
+    bookings = Bookings(Database(f"sqlite:///{os.path.abspath(db_path)}"), load_rate_card())
+    states = [rng.choice(STATES) for _ in range(100000)]
+    weights = [round(rng.uniform(0.2, 20), 1) for _ in range(100000)]
+    dest_pins = [rng.randint(110000, 855999) for _ in range(100000)]
+    results["pricing.quote"] = measure(
+        lambda i: bookings.quote(states[i], weights[i], str(dest_pins[i]), "110001"), 5000, repeat)
+    rate_card = bookings.rate_card
+    results["pricing.price_batch_100k"] = measure(
+        lambda i: rate_card.price_batch(weights, rate_card.regions_for(dest_pins, states)), 1, repeat)
+
+    # ---------- Receipts and bookings on the million-row table ----------
+    db = bookings.db
+    base_id = db.run(lambda s: s.scalar(select(func.max(Courier.id))))
+    existing = db.run(lambda s: s.scalars(
+        select(Courier.receipt).where(Courier.id.in_([rng.randint(1, base_id) for _ in range(2000)]))).all())
+    allocator = [None]
+
+    def fresh_allocator():
+        allocator[0] = ReceiptAllocator(db)  # so block reservations are part of the timing
+
+    results["receipts.next"] = measure(lambda i: allocator[0].next(), 2000, repeat, setup=fresh_allocator)
+    results["bookings.get"] = measure(lambda i: bookings.get(existing[i % len(existing)]), 2000, repeat)
+
+    form = sample_booking(0)
+
+    def submit(i):
+        price = bookings.quote(form["state"], float(form["weight"]), form["receiver_pincode"], form["sender_pincode"])
+        rcpt = bookings.book(dict(
+            sender_name=form["sender_name"], sender_address=form["sender_address"],
+            sender_phone=form["sender_phone"], sender_pincode=form["sender_pincode"],
+            receiver_name=form["receiver_name"],
+            receiver_address=format_receiver_address(str(i), form["street"], form["locality"],
+                                                     form["city"], form["state"]),
+            receiver_phone=form["receiver_phone"], receiver_pincode=form["receiver_pincode"],
+            weight=float(form["weight"]), price_paise=to_paise(price), payment_method=None, payment_status="Pending",
+        ))
+        bookings.set_payment_method(rcpt, "Google Pay", price)
+
+    try:
+        results["bookings.submit"] = measure(submit, 300, repeat)
+    finally:
+        db.run(lambda s: s.execute(delete(Courier).where(Courier.id > base_id)))  # keep the data set fixed
+        db.dispose()
+
+    # ---------- QR codes (payment and receipt windows) ----------
+    try:
+        import qr_render
+    except ImportError as e:
+        results["qr"] = {"skipped": f"{e} (run from the project root)"}
+    else:
+        upi = ("upi://pay?pa=jigerjeet@upi&pn=Jigerjeet&am={:.2f}&cu=INR&tn=Courier%20EM{:08d}")
+        receipt = ("Receipt: EM{:08d}\nSender: Asha Verma, 9876543210, 110005\n"
+                   "Receiver: Rahul Sharma, 9123456780, 141001\nWeight: 2.5 kg\n"
+                   "Delivery Price: ₹175.00\nPayment: Google Pay (Unverified)\nStatus: Submitted")
+        results["qr.render_payment"] = measure(lambda i: qr_render.render_qr(upi.format(70 + i, i), 200), 50, repeat)
+        results["qr.render_receipt"] = measure(lambda i: qr_render.render_qr(receipt.format(i), 180), 50, repeat)
+        qr_render.qr_image(receipt.format(0), 180)
+        results["qr.cached"] = measure(lambda i: qr_render.qr_image(receipt.format(0), 180), 2000, repeat)
+
+    return {
+        "meta": {
+            "commit": git_commit(), "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "seed": seed, "pincode_rows": pincode_rows, "shipments": shipments,
+        },
+        "results": results,
+    }
+
+
+def compare_results(old: dict, new: dict) -> list:
+    """(name, old median ms, new median ms, new/old) for benchmarks present in both runs."""
+    rows = []
+    for name, r in new["results"].items():
+        o = old.get("results", {}).get(name)
+        if o and "median_ms" in o and "median_ms" in r:
+            rows.append((name, o["median_ms"], r["median_ms"], r["median_ms"] / o["median_ms"]))
+    return rows
+
+
+def write_results(results: dict, path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
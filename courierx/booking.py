@@ -0,0 +1,181 @@
+import math
+from datetime import datetime
+
+from sqlalchemy import case, func, select
+from sqlalchemy.exc import IntegrityError
+
+from . import metrics, pricing
+from .db import DB_URL, Courier, Database
+from .receipts import ReceiptAllocator
+
+# =========================
+# Booking
+# =========================
+# Validation and money helpers are plain functions shared by the GUI, bulk
+# import and any other front end. Bookings ties a Database, a RateCard and a
+# ReceiptAllocator together; it holds no other state, so several front ends
+# (or threads) can share one instance.
+
+
+MAX_WEIGHT_KG = 1000.0  # far above any parcel; stops "inf"/"1e400" from reaching the rate card
+
+
+def phn_is_valid(number: str) -> bool:
+    return number.isdigit() and len(number) == 10 and number[0] in "6789"
+
+
+def validate_booking(sender_name, sender_address, sender_pincode, sender_phone,
+                     receiver_name, street, locality, city, state, receiver_pincode, receiver_phone,
+                     weight):
+    """Return (title, message) for the first problem with a booking, or None if it's valid."""
+    if not all([sender_name, sender_address, sender_pincode, sender_phone]):
+        return "Missing Info", "Please fill in all sender details."
+    if not all([receiver_name, street, locality, city, state, receiver_pincode, receiver_phone]):
+        return "Missing Info", "Please fill in all receiver details."
+    if not phn_is_valid(sender_phone):
+        return "Invalid Phone", "Sender phone must be 10 digits and start with 6, 7, 8, or 9."
+    if not phn_is_valid(receiver_phone):
+        return "Invalid Phone", "Receiver phone must be 10 digits and start with 6, 7, 8, or 9."
+    if not (sender_pincode.isdigit() and len(sender_pincode) == 6):
+        return "Invalid PIN", "Sender PIN must be exactly 6 digits."
+    if not (receiver_pincode.isdigit() and len(receiver_pincode) == 6):
+        return "Invalid PIN", "Receiver PIN must be exactly 6 digits."
+    if not weight:
+        return "Missing Info", "Please enter package weight (kg)."
+    try:
+        weight_float = float(weight)
+        if not (math.isfinite(weight_float) and weight_float > 0):
+            raise ValueError
+    except Exception:
+        return "Invalid Weight", "Weight must be a positive number, e.g., 2.5"
+    if weight_float > MAX_WEIGHT_KG:
+        return "Invalid Weight", f"Weight can be at most {MAX_WEIGHT_KG:g} kg."
+    return None
+
+
+def format_receiver_address(house, street, locality, city, state) -> str:
+    return f"{house}, {street}, {locality}, {city}, {state}"
+
+
+def to_paise(rupees: float) -> int:
+    return int(round(float(rupees) * 100))
+
+
+def format_rupees(paise) -> str:
+    """'70.00' style amount for integer paise ('0.00' when unknown)."""
+    paise = int(paise or 0)
+    return f"{paise // 100}.{paise % 100:02d}"
+
+
+PAYMENT_METHODS = ("Google Pay", "Other UPI App", "Cash on Delivery")
+
+
+def payment_status_for(method: str) -> str:
+    """UPI payments wait for reconciliation; cash is collected on delivery."""
+    return "Pending" if method == "Cash on Delivery" else "Unverified"
+
+
+BOOKINGS_TOTAL = metrics.counter("courierx_bookings_total", "Bookings stored", source="counter")
+
+REPORT_PERIODS = {"day": "%Y-%m-%d", "month": "%Y-%m"}
+
+SEARCH_FIELDS = {
+    "Receipt": lambda v: Courier.receipt == v.upper(),
+    "Phone": lambda v: (Courier.sender_phone == v) | (Courier.receiver_phone == v),
+    "Receiver PIN": lambda v: Courier.receiver_pincode == v,
+    "Payment status": lambda v: Courier.payment_status == v.capitalize(),
+}
+
+
+class Bookings:
+    def __init__(self, db: Database, rate_card: pricing.RateCard, receipts: ReceiptAllocator = None):
+        self.db = db
+        self.rate_card = rate_card
+        self.receipts = receipts or ReceiptAllocator(db)
+
+    def quote(self, state: str, weight: float, pincode: str = None, origin_pincode: str = None,
+              volume_cm3: float = None) -> float:
+        """Delivery price in rupees."""
+        paise = self.rate_card.price(weight, dest_state=state, dest_pincode=pincode,
+                                     origin_pincode=origin_pincode, volume_cm3=volume_cm3)
+        return paise / 100
+
+    def book(self, fields: dict) -> str:
+        """Insert one booking in its own transaction; returns the receipt actually used."""
+        fields = dict(fields)
+        if not fields.get("receipt"):  # not setdefault: that would draw (and waste) a number every time
+            fields["receipt"] = self.receipts.next()
+        try:
+            self.db.run(lambda s: s.add(Courier(**fields)))
+        except IntegrityError:
+            # Only possible against receipts issued by the old random generator
+            fields["receipt"] = self.receipts.next()
+            self.db.run(lambda s: s.add(Courier(**fields)))
+        BOOKINGS_TOTAL.inc()
+        return fields["receipt"]
+
+    def set_payment_method(self, receipt_no: str, method: str, amount: float):
+        def update_payment(s):
+            c = s.query(Courier).filter_by(receipt=receipt_no).one()
+            c.payment_method = method
+            c.price_paise = to_paise(amount)
+            c.payment_status = payment_status_for(method)
+
+        self.db.run(update_payment)
+
+    def set_batch_payment(self, batch_no: str, method: str) -> int:
+        """One payment method for every parcel of a multi-parcel booking; returns the parcels updated."""
+        t = Courier.__table__
+        return self.db.run(lambda s: s.execute(
+            t.update().where(t.c.batch == batch_no)
+            .values(payment_method=method, payment_status=payment_status_for(method))
+        ).rowcount)
+
+    def get(self, receipt_no: str) -> Courier:
+        """The booking for receipt_no (detached); raises NoResultFound if there is none."""
+        return self.db.run(lambda s: s.query(Courier).filter_by(receipt=receipt_no).one())
+
+    def get_batch(self, batch_no: str) -> list:
+        """The parcels (detached) of a multi-parcel booking, in booking order; [] if there is no such batch."""
+        return self.db.run(lambda s: s.scalars(select(Courier).where(Courier.batch == batch_no)
+                                               .order_by(Courier.id)).all())
+
+    def revenue_summary(self, period: str = "day", start: datetime = None, end: datetime = None) -> list:
+        """(period, parcels, total kg, booked paise, paid paise) rows, aggregated in SQL.
+
+        Bookings from before created_at was recorded are reported under period None.
+        """
+        bucket = func.strftime(REPORT_PERIODS[period], Courier.created_at).label("period")
+        query = (
+            select(
+                bucket,
+                func.count(),
+                func.coalesce(func.sum(Courier.weight), 0.0),
+                func.coalesce(func.sum(Courier.price_paise), 0),
+                func.coalesce(func.sum(case((Courier.payment_status == "Paid", Courier.price_paise), else_=0)), 0),
+            )
+            .group_by(bucket)
+            .order_by(bucket)
+        )
+        if start:
+            query = query.where(Courier.created_at >= start)
+        if end:
+            query = query.where(Courier.created_at < end)
+        return self.db.run(lambda s: [tuple(r) for r in s.execute(query)])
+
+    def search(self, field: str, value: str, limit: int = 200) -> list:
+        """Newest shipments matching one indexed field (see SEARCH_FIELDS)."""
+        where = SEARCH_FIELDS[field](value.strip())
+        query = select(Courier).where(where).order_by(Courier.id.desc()).limit(limit)
+        return self.db.run(lambda s: s.scalars(query).all())
+
+
+def open_bookings(db_url: str = DB_URL, rates_path: str = pricing.RATES_PATH, migrate: bool = True) -> Bookings:
+    """Bookings on the database at db_url with the rate card at rates_path.
+
+    With migrate=False the caller runs db.migrate() itself (the GUI does, once its window is up).
+    """
+    db = Database(db_url)
+    if migrate:
+        db.migrate()
+    return Bookings(db, pricing.load_rate_card(rates_path))
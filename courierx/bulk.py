@@ -0,0 +1,171 @@
+import csv
+import json
+import math
+
+from sqlalchemy import insert
+
+from . import metrics
+from .booking import Bookings, format_receiver_address, payment_status_for, validate_booking
+from .db import Courier
+from .pricing import RateCard
+
+# =========================
+# Bulk import
+# =========================
+IMPORT_FIELDS = [
+    "sender_name", "sender_address", "sender_pincode", "sender_phone",
+    "receiver_name", "house", "street", "locality", "city", "state", "receiver_pincode", "receiver_phone",
+    "weight",
+]
+IMPORT_DIMENSIONS = ["length_cm", "width_cm", "height_cm"]  # optional, for volumetric weight
+MAX_SIDE_CM = 1000.0
+IMPORT_BATCH_SIZE = 5000
+
+BULK_BOOKINGS_TOTAL = metrics.counter("courierx_bookings_total", "Bookings stored", source="bulk")
+BATCH_BOOKINGS_TOTAL = metrics.counter("courierx_bookings_total", "Bookings stored", source="batch")
+
+
+def read_shipments(path: str):
+    """Yield (line_no, row dict) from a CSV (with header) or JSONL file, streaming."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if path.lower().endswith((".jsonl", ".ndjson", ".json")):
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    row = {"_error": f"Invalid JSON: {e}"}
+                if not isinstance(row, dict):
+                    row = {"_error": "Expected a JSON object per line"}
+                yield line_no, row
+        else:
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+
+
+def shipment_from_row(row: dict, pincode_table=None, strict_pins: bool = False):
+    """Validate one imported row like a counter booking; return (courier dict, None) or (None, error).
+
+    pincode_table (a pincodes.PincodeTable, optional) fills a blank city/state from the receiver PIN.
+    """
+    if "_error" in row:
+        return None, row["_error"]
+    b = {k: str(row.get(k) or "").strip() for k in IMPORT_FIELDS}
+    if pincode_table is not None and (not b["city"] or not b["state"]):
+        match = pincode_table.find_pin(b["receiver_pincode"])
+        if match:
+            b["city"] = b["city"] or match[0]
+            b["state"] = b["state"] or match[1]
+
+    problem = validate_booking(**{k: v for k, v in b.items() if k != "house"})
+    if problem:
+        return None, problem[1]
+    if strict_pins and pincode_table is not None:
+        for who in ("sender", "receiver"):
+            if not pincode_table.is_known_pin(b[f"{who}_pincode"]):
+                return None, f"{who.capitalize()} PIN not found in the pincode data."
+
+    volume = None
+    dims = [str(row.get(k) or "").strip() for k in IMPORT_DIMENSIONS]
+    if any(dims):
+        try:
+            sides = [float(d) for d in dims]
+            if not all(math.isfinite(x) and 0 < x <= MAX_SIDE_CM for x in sides):
+                raise ValueError
+        except ValueError:
+            return None, f"Dimensions (length_cm, width_cm, height_cm) must be positive numbers up to {MAX_SIDE_CM:g}."
+        volume = sides[0] * sides[1] * sides[2]
+
+    return {
+        "_state": b["state"],
+        "_volume_cm3": volume,
+        "sender_name": b["sender_name"],
+        "sender_address": b["sender_address"],
+        "sender_phone": b["sender_phone"],
+        "sender_pincode": b["sender_pincode"],
+        "receiver_name": b["receiver_name"],
+        "receiver_address": format_receiver_address(b["house"], b["street"], b["locality"], b["city"], b["state"]),
+        "receiver_phone": b["receiver_phone"],
+        "receiver_pincode": b["receiver_pincode"],
+        "weight": float(b["weight"]),
+        "payment_method": None,
+        "payment_status": "Pending",
+    }, None
+
+
+def price_shipments(rate_card: RateCard, rows: list):
+    """Set price_paise on a batch of imported rows with one vectorized rate-card pass."""
+    def pins(key):
+        return [int(r[key]) for r in rows]
+
+    volumes = [r.pop("_volume_cm3") for r in rows]
+    states = [r.pop("_state") for r in rows]
+    paise = rate_card.price_batch(
+        [r["weight"] for r in rows],
+        rate_card.regions_for(pins("receiver_pincode"), states),
+        rate_card.regions_for(pins("sender_pincode")),
+        [v if v is not None else 0.0 for v in volumes] if any(v is not None for v in volumes) else None,
+    )
+    for r, p in zip(rows, paise.tolist()):
+        r["price_paise"] = p
+
+
+def insert_shipments(bookings: Bookings, rows: list) -> list:
+    """Price the rows, give each a receipt and insert them all in one transaction; returns the receipts."""
+    price_shipments(bookings.rate_card, rows)
+    receipts = bookings.receipts.allocate(len(rows))
+    for row, rcpt in zip(rows, receipts):
+        row["receipt"] = rcpt
+    bookings.db.run(lambda s: s.execute(insert(Courier), rows))
+    BULK_BOOKINGS_TOTAL.inc(len(rows))
+    return receipts
+
+
+def bulk_import(bookings: Bookings, path: str, pincode_table=None, strict_pins: bool = False,
+                batch_size: int = IMPORT_BATCH_SIZE, on_error=None):
+    """Stream shipments from `path` into the database in batched transactions.
+
+    Invalid rows are reported through on_error(line_no, message) and skipped;
+    they never abort the batch. Returns (imported, failed).
+    """
+    imported = failed = 0
+    batch = []
+    for line_no, row in read_shipments(path):
+        courier, error = shipment_from_row(row, pincode_table, strict_pins)
+        if error:
+            failed += 1
+            if on_error:
+                on_error(line_no, error)
+            continue
+        batch.append(courier)
+        if len(batch) >= batch_size:
+            insert_shipments(bookings, batch)
+            imported += len(batch)
+            batch = []
+    if batch:
+        insert_shipments(bookings, batch)
+        imported += len(batch)
+    return imported, failed
+
+
+def book_parcels(bookings: Bookings, rows: list, payment_method: str = None) -> tuple:
+    """Book one sender's parcels (rows as from shipment_from_row) as a single multi-parcel booking.
+
+    The parcels are priced in one pass and get their receipts plus one
+    consolidated receipt (the batch number, shared by all of them) from a
+    single reservation, and are inserted in one transaction: all or none.
+    Returns (batch number, parcel receipts).
+    """
+    price_shipments(bookings.rate_card, rows)
+    batch_no, *receipts = bookings.receipts.allocate(len(rows) + 1)
+    for row, rcpt in zip(rows, receipts):
+        row["receipt"] = rcpt
+        row["batch"] = batch_no
+        if payment_method:
+            row["payment_method"] = payment_method
+            row["payment_status"] = payment_status_for(payment_method)
+    bookings.db.run(lambda s: s.execute(insert(Courier), rows))
+    BATCH_BOOKINGS_TOTAL.inc(len(rows))
+    return batch_no, receipts
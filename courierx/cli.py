@@ -0,0 +1,307 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from datetime import date, datetime
+
+from . import metrics, pincodes
+from .booking import REPORT_PERIODS, format_rupees, open_bookings
+from .bulk import IMPORT_BATCH_SIZE, IMPORT_FIELDS, bulk_import
+from .manifest import MANIFEST_GROUPS, MANIFEST_PREFIX_DIGITS, bag_label, sync_pin_regions, write_manifest
+from .reconcile import RECONCILE_BATCH_SIZE, RECONCILE_WINDOW_MINUTES, reconcile_payments
+from .search import SEARCH_LIMIT, search_shipments
+from .tracking import SCAN_BATCH_SIZE, TRACKING_STATUSES, current_status, ingest_scans, timeline, tracking_status
+
+# =========================
+# Headless commands: python -m courierx <command> (or python main.py <command>)
+# =========================
+
+
+def load_pincodes_or_warn():
+    try:
+        return pincodes.load(pincodes.CSV_PATH)
+    except Exception as e:
+        print(f"[WARN] Failed to load {pincodes.CSV_PATH}: {e}")
+        return None
+
+
+def run_import(args) -> int:
+    bookings = open_bookings()
+    table = load_pincodes_or_warn()
+    err_file = open(args.errors, "w", newline="", encoding="utf-8") if args.errors else None
+    err_writer = csv.writer(err_file) if err_file else None
+    if err_writer:
+        err_writer.writerow(["line", "error"])
+
+    def on_error(line_no, message):
+        if err_writer:
+            err_writer.writerow([line_no, message])
+        else:
+            print(f"[ERROR] line {line_no}: {message}", file=sys.stderr)
+
+    started = time.perf_counter()
+    try:
+        imported, failed = bulk_import(bookings, args.path, table, args.strict_pins, args.batch_size, on_error)
+    finally:
+        if err_file:
+            err_file.close()
+    print(f"Imported {imported} shipment(s), rejected {failed}, in {time.perf_counter() - started:.1f}s")
+    return 1 if failed and not imported else 0
+
+
+def run_reconcile(args) -> int:
+    bookings = open_bookings()
+    report_file = open(args.report, "w", newline="", encoding="utf-8") if args.report else None
+    report = csv.writer(report_file) if report_file else None
+    if report:
+        report.writerow(["line", "result", "reason", "statement row"])
+
+    def on_issue(line_no, kind, reason, row):
+        if report:
+            report.writerow([line_no, kind, reason, json.dumps(row, ensure_ascii=False)])
+        else:
+            print(f"[{kind.upper()}] line {line_no}: {reason}", file=sys.stderr)
+
+    started = time.perf_counter()
+    try:
+        counts = reconcile_payments(bookings.db, args.path, args.window, args.batch_size, args.dry_run, on_issue)
+    finally:
+        if report_file:
+            report_file.close()
+    print(f"{counts['lines']} statement line(s) in {time.perf_counter() - started:.1f}s: "
+          f"{counts['matched']} matched, {counts['already_paid']} already paid, {counts['ambiguous']} ambiguous, "
+          f"{counts['unmatched']} unmatched, {counts['duplicates']} duplicate(s)")
+    print("Dry run: no bookings changed" if args.dry_run else f"{counts['updated']} booking(s) marked Paid")
+    return 0
+
+
+def run_scans(args) -> int:
+    bookings = open_bookings()
+    err_file = open(args.errors, "w", newline="", encoding="utf-8") if args.errors else None
+    err_writer = csv.writer(err_file) if err_file else None
+    if err_writer:
+        err_writer.writerow(["line", "error"])
+
+    def on_error(line_no, message):
+        if err_writer:
+            err_writer.writerow([line_no, message])
+        else:
+            print(f"[ERROR] line {line_no}: {message}", file=sys.stderr)
+
+    started = time.perf_counter()
+    try:
+        counts = ingest_scans(bookings.db, args.path, args.status, args.location, args.batch_size, on_error)
+    finally:
+        if err_file:
+            err_file.close()
+    print(f"{counts['lines']} scan(s) in {time.perf_counter() - started:.1f}s: {counts['stored']} stored, "
+          f"{counts['duplicates']} already recorded, {counts['rejected']} rejected")
+    return 1 if counts["rejected"] and not counts["stored"] else 0
+
+
+def run_track(args) -> int:
+    db = open_bookings().db
+    receipt_no = args.receipt.upper()
+    now = current_status(db, [receipt_no]).get(receipt_no)
+    if now is None:
+        print(f"No booking with receipt {receipt_no}", file=sys.stderr)
+        return 1
+    for at, status, place in timeline(db, receipt_no):
+        print(f"{at:%Y-%m-%d %H:%M}  {status:<18}{place or ''}")
+    status, place, at = now
+    print(f"Now: {status}" + (f", {place}" if place else "") + (f" since {at:%Y-%m-%d %H:%M}" if at else ""))
+    return 0
+
+
+def run_report(args) -> int:
+    bookings = open_bookings()
+    print(f"{args.by.capitalize():<12}{'Parcels':>10}{'Weight (kg)':>14}{'Booked (₹)':>16}{'Paid (₹)':>16}")
+    for period, parcels, kg, booked, paid in bookings.revenue_summary(args.by, args.start, args.end):
+        print(f"{period or '(undated)':<12}{parcels:>10}{kg:>14.2f}"
+              f"{format_rupees(booked):>16}{format_rupees(paid):>16}")
+    return 0
+
+
+def run_search(args) -> int:
+    found = search_shipments(open_bookings().db, " ".join(args.words), args.limit)
+    for c in found:
+        booked = c.created_at.strftime("%Y-%m-%d") if c.created_at else ""
+        print(f"{c.receipt:<14}{booked:<12}{c.sender_name} -> {c.receiver_name}, {c.receiver_address}")
+    print(f"{len(found)} match(es)")
+    return 0 if found else 1
+
+
+def run_manifest(args) -> int:
+    bookings = open_bookings()
+    if args.by != "prefix":
+        table = load_pincodes_or_warn()
+        if table is not None:
+            sync_pin_regions(bookings.db, table)
+    started = time.perf_counter()
+    totals = write_manifest(bookings.db, args.date, args.by, args.csv, args.sheet, args.prefix_digits)
+    print(f"{'Bag':<48}{'Parcels':>10}{'Weight (kg)':>14}{'Price (₹)':>16}")
+    for bag, parcels, kg, paise in totals:
+        print(f"{bag_label(args.by, bag)[:47]:<48}{parcels:>10}{kg:>14.2f}{format_rupees(paise):>16}")
+    print(f"{sum(t[1] for t in totals)} parcel(s) in {len(totals)} bag(s) booked on {args.date}, "
+          f"in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+def run_bench(args) -> int:
+    from .bench import run_benchmark
+
+    for name, value in run_benchmark(args.bookings, args.bulk, args.db).items():
+        print(f"{name:<44}{value:>12,.1f}")
+    return 0
+
+
+def run_bench_suite(args) -> int:
+    from .bench import compare_results, run_suite, write_results
+
+    results = run_suite(args.data_dir, args.pincodes, args.shipments, args.seed, args.repeat)
+    write_results(results, args.json)
+    for name, r in results["results"].items():
+        if "median_ms" in r:
+            print(f"{name:<28}{r['median_ms']:>12.4f} ms{r['per_s']:>14,.1f} /s")
+        else:
+            print(f"{name:<28}{r.get('skipped', '')}")
+    print(f"Results written to {args.json}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            old = json.load(f)
+        print(f"\nvs {args.compare} (commit {old.get('meta', {}).get('commit')}):")
+        for name, before, after, ratio in compare_results(old, results):
+            print(f"{name:<28}{before:>12.4f} ->{after:>10.4f} ms  {ratio:>6.2f}x")
+    return 0
+
+
+def run_serve(args) -> int:
+    import asyncio
+
+    from .api import BookingAPI
+
+    table = None if args.no_pincodes else load_pincodes_or_warn()
+    api = BookingAPI(open_bookings(), table, args.max_batch, args.max_wait_ms)
+
+    def ready(address):
+        print(f"CourierX booking API on http://{address[0]}:{address[1]}", flush=True)
+
+    try:
+        asyncio.run(api.serve(args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def run_cli(argv: list) -> int:
+    parser = argparse.ArgumentParser(prog="courierx", description="CourierX headless commands")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_import = sub.add_parser("import", help="Bulk-book shipments from a CSV or JSONL file")
+    p_import.add_argument("path", help="CSV with a header row, or JSONL, using the columns: " + ", ".join(IMPORT_FIELDS))
+    p_import.add_argument("--errors", help="Write rejected rows (line, error) to this CSV instead of stderr")
+    p_import.add_argument("--strict-pins", action="store_true", help="Reject PINs missing from the pincode data")
+    p_import.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    p_scans = sub.add_parser("scans", help="Add a barcode/QR scanner dump to the tracking log")
+    p_scans.add_argument("path", help="CSV with a header row (receipt, and status, location, time), "
+                                      "or one scan per line (receipt number and optional time)")
+    p_scans.add_argument("--status", type=tracking_status,
+                         help=f"For scans without one: {', '.join(TRACKING_STATUSES)}")
+    p_scans.add_argument("--location", help="For scans without one, e.g. the hub posting the dump")
+    p_scans.add_argument("--errors", help="Write rejected lines (line, error) to this CSV instead of stderr")
+    p_scans.add_argument("--batch-size", type=int, default=SCAN_BATCH_SIZE)
+    p_track = sub.add_parser("track", help="A shipment's tracking history and current status")
+    p_track.add_argument("receipt")
+    p_report = sub.add_parser("report", help="Revenue and weight totals per day or month")
+    p_report.add_argument("--by", choices=list(REPORT_PERIODS), default="day")
+    p_report.add_argument("--from", dest="start", type=datetime.fromisoformat, help="YYYY-MM-DD (inclusive)")
+    p_report.add_argument("--to", dest="end", type=datetime.fromisoformat, help="YYYY-MM-DD (exclusive)")
+    p_search = sub.add_parser("search", help="Best shipments whose names/addresses contain every word")
+    p_search.add_argument("words", nargs="+", help='e.g. sharma karol bagh (end a word with * for a prefix)')
+    p_search.add_argument("--limit", type=int, default=SEARCH_LIMIT)
+    p_manifest = sub.add_parser("manifest", help="A day's parcels sorted into outbound bags, with per-bag totals")
+    p_manifest.add_argument("--date", type=date.fromisoformat, default=date.today(), help="YYYY-MM-DD (default today)")
+    p_manifest.add_argument("--by", choices=MANIFEST_GROUPS, default="district",
+                            help="Bag by receiver district or state (pincode data), or by PIN prefix")
+    p_manifest.add_argument("--prefix-digits", type=int, choices=range(1, 7), default=MANIFEST_PREFIX_DIGITS,
+                            metavar="1-6", help="PIN digits per bag with --by prefix")
+    p_manifest.add_argument("--csv", help="Write the manifest (one row per parcel) to this CSV")
+    p_manifest.add_argument("--sheet", help="Write a printable manifest (one page per bag) to this text file")
+    p_stress = sub.add_parser("stress", help="Simulate several terminals booking into a scratch database")
+    p_stress.add_argument("--terminals", type=int, default=4)
+    p_stress.add_argument("--bookings", type=int, default=250, help="Bookings per terminal")
+    p_stress.add_argument("--db", default="stress_couriers.db", help="Scratch database (recreated)")
+    p_bench = sub.add_parser("bench", help="Import time and booking throughput of the core, on a scratch database")
+    p_bench.add_argument("--bookings", type=int, default=2000, help="Counter bookings (one transaction each)")
+    p_bench.add_argument("--bulk", type=int, default=50000, help="Bulk bookings (batched transactions)")
+    p_bench.add_argument("--db", default="bench_couriers.db", help="Scratch database (recreated, then removed)")
+    from .bench import SUITE_PINCODE_ROWS, SUITE_REPEAT, SUITE_SEED, SUITE_SHIPMENTS
+
+    p_suite = sub.add_parser("bench-suite", help="Time the hot paths on synthetic full-scale data; JSON results")
+    p_suite.add_argument("--json", default="bench_results.json", help="Write results here")
+    p_suite.add_argument("--compare", help="Earlier results JSON to compare against")
+    p_suite.add_argument("--data-dir", default="bench_data", help="Synthetic data (generated once, then reused)")
+    p_suite.add_argument("--pincodes", type=int, default=SUITE_PINCODE_ROWS,
+                         help="Rows in the synthetic pincode CSV")
+    p_suite.add_argument("--shipments", type=int, default=SUITE_SHIPMENTS,
+                         help="Bookings in the synthetic database")
+    p_suite.add_argument("--seed", type=int, default=SUITE_SEED)
+    p_suite.add_argument("--repeat", type=int, default=SUITE_REPEAT)
+    p_reconcile = sub.add_parser("reconcile", help="Mark UPI payments found on a bank statement CSV as Paid")
+    p_reconcile.add_argument("path", help="Statement CSV with a header row (amount, and note/remarks, date/time, UTR)")
+    p_reconcile.add_argument("--window", type=float, default=RECONCILE_WINDOW_MINUTES,
+                             help="Minutes after booking a payment may arrive (matches without a receipt in the note)")
+    p_reconcile.add_argument("--report", help="Write unmatched/ambiguous lines to this CSV instead of stderr")
+    p_reconcile.add_argument("--batch-size", type=int, default=RECONCILE_BATCH_SIZE)
+    p_reconcile.add_argument("--dry-run", action="store_true", help="Match and report, but don't update bookings")
+    from .api import API_HOST, API_MAX_BATCH, API_MAX_WAIT_MS, API_PORT
+
+    p_serve = sub.add_parser("serve", help="Local HTTP/JSON booking API for counter clients")
+    p_serve.add_argument("--host", default=API_HOST)
+    p_serve.add_argument("--port", type=int, default=API_PORT)
+    p_serve.add_argument("--max-batch", type=int, default=API_MAX_BATCH, help="Most writes per shared commit")
+    p_serve.add_argument("--max-wait-ms", type=float, default=API_MAX_WAIT_MS,
+                         help="How long a commit waits for more writes to join it")
+    p_serve.add_argument("--no-pincodes", action="store_true", help="Don't load the pincode data (no PIN checks)")
+    p_load = sub.add_parser("loadtest", help="Drive the booking API with many concurrent counters")
+    p_load.add_argument("--counters", type=int, default=200, help="Concurrent counters (one connection each)")
+    p_load.add_argument("--bookings", type=int, default=10, help="Bookings per counter")
+    p_load.add_argument("--db", default="loadtest_couriers.db", help="Scratch database (recreated)")
+    p_load.add_argument("--max-batch", type=int, help="Passed to serve (1 disables group commit)")
+    p_load.add_argument("--max-wait-ms", type=float, help="Passed to serve")
+    p_terminal = sub.add_parser("stress-terminal", help=argparse.SUPPRESS)
+    p_terminal.add_argument("--bookings", type=int, required=True)
+    p_terminal.add_argument("--terminal", type=int, required=True)
+    args = parser.parse_args(argv)
+    metrics.start_textfile_writer()  # only with COURIERX_METRICS_FILE set
+
+    if args.command == "import":
+        return run_import(args)
+    if args.command == "report":
+        return run_report(args)
+    if args.command == "reconcile":
+        return run_reconcile(args)
+    if args.command == "scans":
+        return run_scans(args)
+    if args.command == "track":
+        return run_track(args)
+    if args.command == "search":
+        return run_search(args)
+    if args.command == "manifest":
+        return run_manifest(args)
+    if args.command == "bench":
+        return run_bench(args)
+    if args.command == "bench-suite":
+        return run_bench_suite(args)
+    if args.command == "serve":
+        return run_serve(args)
+    if args.command == "loadtest":
+        from .loadtest import run_loadtest
+
+        return run_loadtest(args.counters, args.bookings, args.db, args.max_batch, args.max_wait_ms)
+    from .stress import run_stress, stress_terminal
+
+    if args.command == "stress":
+        return run_stress(args.terminals, args.bookings, args.db)
+    stress_terminal(open_bookings(), args.bookings, args.terminal)
+    return 0
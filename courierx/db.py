@@ -0,0 +1,301 @@
+import os
+import random
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import create_engine, event, inspect, text, Column, DateTime, Float, Index, Integer, String
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from . import metrics
+
+# =========================
+# Database
+# =========================
+# Several counters may share one couriers.db. Every operation gets its own
+# short-lived session from Database.run(), which retries when SQLite reports
+# the database as locked. WAL lets readers proceed while a terminal writes, but
+# it needs every terminal on the same machine; for a database on a network
+# share set COURIERX_DB_JOURNAL=DELETE.
+DB_URL = os.environ.get("COURIERX_DB_URL", "sqlite:///couriers.db")
+DB_JOURNAL_MODE = os.environ.get("COURIERX_DB_JOURNAL", "WAL")
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("COURIERX_DB_BUSY_TIMEOUT_MS", "5000"))
+DB_POOL_SIZE = int(os.environ.get("COURIERX_DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("COURIERX_DB_MAX_OVERFLOW", "10"))
+DB_LOCK_RETRIES = int(os.environ.get("COURIERX_DB_LOCK_RETRIES", "8"))
+
+DB_TRANSACTIONS = metrics.histogram("courierx_db_transaction_seconds",
+                                    "Database.run() transactions, commit and lock retries included")
+DB_LOCK_RETRIES_TOTAL = metrics.counter("courierx_db_lock_retries_total", "Transactions retried on a locked database")
+
+Base = declarative_base()
+
+
+class Courier(Base):
+    __tablename__ = "couriers"
+    id = Column(Integer, primary_key=True)
+    receipt = Column(String(20), unique=True)
+
+    sender_name = Column(String(100))
+    sender_address = Column(String(300))
+    sender_phone = Column(String(20), index=True)
+    sender_pincode = Column(String(10))
+
+    receiver_name = Column(String(100))
+    receiver_address = Column(String(300))
+    receiver_phone = Column(String(20), index=True)
+    receiver_pincode = Column(String(10), index=True)
+
+    # New fields we persist
+    weight = Column("weight_kg", Float)       # kg
+    price_paise = Column(Integer)             # delivery price in paise (₹1 = 100 paise)
+    created_at = Column(DateTime, default=datetime.now)
+    payment_method = Column(String(30))       # "Google Pay" / "Other UPI App" / "Cash on Delivery"
+    payment_status = Column(String(20), index=True)  # "Pending" / "Unverified" / "Paid"
+    batch = Column(String(20), index=True)    # consolidated receipt of a multi-parcel booking, else None
+    # Newest tracking scan (see ShipmentEvent), kept current by a trigger; None = not scanned since booking
+    tracking_status = Column(String(30))
+    tracking_location = Column(String(100))
+    tracking_at = Column(DateTime)
+
+    # Covers the revenue/weight reports so they never touch the wide rows
+    __table_args__ = (
+        Index("ix_couriers_created_totals", "created_at", "weight_kg", "price_paise", "payment_status"),
+    )
+
+
+class ReceiptSequence(Base):
+    """Next unused receipt sequence number per prefix, shared by every terminal."""
+    __tablename__ = "receipt_sequence"
+    prefix = Column(String(10), primary_key=True)
+    next_value = Column(Integer, nullable=False)
+
+
+class PinRegion(Base):
+    """District and state of each receiver PIN, copied from the pincode dataset so SQL can group by them."""
+    __tablename__ = "pin_regions"
+    __table_args__ = {"sqlite_with_rowid": False}
+    pin = Column(String(10), primary_key=True)
+    district = Column(String(100))
+    state = Column(String(100))
+
+
+class ShipmentEvent(Base):
+    """One tracking scan. The log is only appended to: a wrong scan is corrected by a later one."""
+    __tablename__ = "shipment_events"
+    id = Column(Integer, primary_key=True)
+    receipt = Column(String(20), nullable=False)
+    status = Column(String(30), nullable=False)
+    location = Column(String(100))
+    scanned_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        # A receipt's timeline in time order; unique, so a scan posted twice is stored once
+        Index("ix_shipment_events_scan", "receipt", "scanned_at", "status", unique=True),
+        Index("ix_shipment_events_time", "scanned_at"),
+    )
+
+
+# Moves couriers.tracking_* to each new scan unless the booking already shows a later one (dumps arrive late)
+TRACKING_TRIGGER = (
+    "CREATE TRIGGER IF NOT EXISTS shipment_events_latest AFTER INSERT ON shipment_events BEGIN "
+    "UPDATE couriers SET tracking_status = new.status, tracking_location = new.location, "
+    "tracking_at = new.scanned_at "
+    "WHERE receipt = new.receipt AND (tracking_at IS NULL OR tracking_at <= new.scanned_at); END"
+)
+
+
+def make_engine(url: str = DB_URL):
+    eng = create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        connect_args={"timeout": DB_BUSY_TIMEOUT_MS / 1000, "check_same_thread": False},
+    )
+
+    @event.listens_for(eng, "connect")
+    def _sqlite_pragmas(dbapi_conn, _):
+        cur = dbapi_conn.cursor()
+        cur.execute(f"PRAGMA journal_mode={DB_JOURNAL_MODE}")
+        cur.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        if DB_JOURNAL_MODE.upper() == "WAL":
+            cur.execute("PRAGMA synchronous=NORMAL")
+        cur.close()
+
+    return eng
+
+
+def is_lock_error(e: OperationalError) -> bool:
+    msg = str(e.orig).lower()
+    return "locked" in msg or "busy" in msg
+
+
+class Database:
+    """One couriers database: its engine, a session factory and lock-retry handling."""
+
+    def __init__(self, url: str = DB_URL, lock_retries: int = DB_LOCK_RETRIES):
+        self.url = url
+        self.engine = make_engine(url)
+        self.Session = sessionmaker(bind=self.engine, expire_on_commit=False)
+        self.max_lock_retries = lock_retries
+        self.lock_retries = 0  # lock-contention retries so far (diagnostics)
+
+    @contextmanager
+    def session_scope(self):
+        """One short transaction: commit on success, roll back on error, always close."""
+        s = self.Session()
+        try:
+            yield s
+            s.commit()
+        except Exception:
+            s.rollback()
+            raise
+        finally:
+            s.close()
+
+    def run(self, op, retries: int = None):
+        """Run op(session) in its own transaction, retrying with backoff on lock contention."""
+        retries = self.max_lock_retries if retries is None else retries
+        with DB_TRANSACTIONS.time(getattr(op, "__qualname__", None)):
+            for attempt in range(retries + 1):
+                try:
+                    with self.session_scope() as s:
+                        return op(s)
+                except OperationalError as e:
+                    if attempt == retries or not is_lock_error(e):
+                        raise
+                    self.lock_retries += 1
+                    DB_LOCK_RETRIES_TOTAL.inc()
+                    time.sleep(min(0.02 * 2 ** attempt, 1.0) * random.uniform(0.5, 1.5))
+
+    def migrate(self, progress=None):
+        migrate_db(self.engine, progress)
+
+    def dispose(self):
+        self.engine.dispose()
+
+
+def print_progress(step: str, done: int, total: int):
+    """Default migration progress report: one stderr line per batch."""
+    print(f"[INFO] {step}: {done:,}/{total:,} bookings", file=sys.stderr, flush=True)
+
+
+def migrate_db(eng, progress=None):
+    """Bring a database of any earlier version up to the current schema.
+
+    The batched steps (amount conversion, search backfill) report each batch
+    to progress(step, done, total); by default it is printed to stderr.
+    """
+    progress = progress or print_progress
+    Base.metadata.create_all(eng)
+    add_missing_columns(eng)
+    with eng.begin() as conn:
+        conn.exec_driver_sql(TRACKING_TRIGGER)
+    convert_text_amounts(eng, progress=progress)
+    create_search_index(eng, progress=progress)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(eng, checkfirst=True)
+
+
+def add_missing_columns(eng):
+    insp = inspect(eng)
+    with eng.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name not in existing:
+                    conn.exec_driver_sql(
+                        f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col.type.compile(eng.dialect)}")
+
+
+def convert_text_amounts(eng, batch_size: int = 20000, progress=None):
+    """Move pre-numeric weight/delivery_price text into weight_kg/price_paise, in id batches.
+
+    Each batch is its own transaction, so other terminals keep working and an
+    interrupted run resumes where it stopped. Converted rows have the old text
+    cleared; PRAGMA user_version records completion so later starts skip this.
+    """
+    with eng.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA user_version").scalar() >= 1:
+            return
+        legacy = {c["name"] for c in inspect(conn).get_columns("couriers")} >= {"weight", "delivery_price"}
+        max_id = conn.exec_driver_sql("SELECT MAX(id) FROM couriers").scalar() or 0
+
+    if legacy:
+        convert = text(
+            "UPDATE couriers SET "
+            "weight_kg = COALESCE(weight_kg, CAST(weight AS REAL)), "
+            "price_paise = COALESCE(price_paise, CAST(ROUND(CAST(delivery_price AS REAL) * 100) AS INTEGER)), "
+            "weight = NULL, delivery_price = NULL "
+            "WHERE id > :lo AND id <= :hi AND (weight IS NOT NULL OR delivery_price IS NOT NULL)"
+        )
+        for lo in range(0, max_id, batch_size):
+            with eng.begin() as conn:
+                conn.execute(convert, {"lo": lo, "hi": lo + batch_size})
+            if progress:
+                progress("Converting amounts", min(lo + batch_size, max_id), max_id)
+    with eng.begin() as conn:
+        conn.exec_driver_sql("PRAGMA user_version = 1")
+
+
+# =========================
+# Full-text search index
+# =========================
+# couriers_fts is an FTS5 index over the names and addresses of couriers
+# (external content: it stores only the index, and reads the text back from
+# couriers by id). Triggers keep it in step with every insert, delete and
+# name/address update, whichever terminal or tool makes them.
+SEARCH_COLUMNS = ("sender_name", "receiver_name", "sender_address", "receiver_address")
+_SEARCH_COLS = ", ".join(SEARCH_COLUMNS)
+_SEARCH_NEW = ", ".join(f"new.{c}" for c in SEARCH_COLUMNS)
+_SEARCH_OLD = ", ".join(f"old.{c}" for c in SEARCH_COLUMNS)
+SEARCH_TRIGGERS = (
+    f"CREATE TRIGGER IF NOT EXISTS couriers_fts_insert AFTER INSERT ON couriers BEGIN "
+    f"INSERT INTO couriers_fts (rowid, {_SEARCH_COLS}) VALUES (new.id, {_SEARCH_NEW}); END",
+    f"CREATE TRIGGER IF NOT EXISTS couriers_fts_delete AFTER DELETE ON couriers BEGIN "
+    f"INSERT INTO couriers_fts (couriers_fts, rowid, {_SEARCH_COLS}) VALUES ('delete', old.id, {_SEARCH_OLD}); END",
+    f"CREATE TRIGGER IF NOT EXISTS couriers_fts_update AFTER UPDATE OF {_SEARCH_COLS} ON couriers BEGIN "
+    f"INSERT INTO couriers_fts (couriers_fts, rowid, {_SEARCH_COLS}) VALUES ('delete', old.id, {_SEARCH_OLD}); "
+    f"INSERT INTO couriers_fts (rowid, {_SEARCH_COLS}) VALUES (new.id, {_SEARCH_NEW}); END",
+)
+
+
+def create_search_index(eng, batch_size: int = 50000, progress=None):
+    """Create couriers_fts and index the existing rows, in id batches.
+
+    Until the backfill is done there are no triggers, so the batches run
+    until they reach the newest row; the last batch creates the triggers in
+    the same transaction, so no booking from another terminal is missed. An
+    interrupted backfill starts over on the next start. PRAGMA user_version 2
+    records completion. progress(step, done, total) hears about each batch.
+    """
+    with eng.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA user_version").scalar() >= 2:
+            return
+    with eng.begin() as conn:
+        conn.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS couriers_fts USING fts5({_SEARCH_COLS}, content='couriers', "
+            "content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+        conn.exec_driver_sql("INSERT INTO couriers_fts (couriers_fts) VALUES ('delete-all')")
+
+    backfill = text(f"INSERT INTO couriers_fts (rowid, {_SEARCH_COLS}) "
+                    f"SELECT id, {_SEARCH_COLS} FROM couriers WHERE id > :lo AND id <= :hi")
+    lo = 0
+    while True:
+        with eng.begin() as conn:
+            conn.execute(backfill, {"lo": lo, "hi": lo + batch_size})
+            lo += batch_size
+            # The insert holds the write lock, so nothing can be booked between this check and the commit
+            max_id = conn.exec_driver_sql("SELECT MAX(id) FROM couriers").scalar() or 0
+            if lo >= max_id:
+                for trigger in SEARCH_TRIGGERS:
+                    conn.exec_driver_sql(trigger)
+                conn.exec_driver_sql("PRAGMA user_version = 2")
+        if progress and max_id:
+            progress("Indexing bookings for search", min(lo, max_id), max_id)
+        if lo >= max_id:
+            return
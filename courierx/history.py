@@ -0,0 +1,160 @@
+import operator
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, or_, select
+
+from .booking import SEARCH_FIELDS
+from .db import Courier, Database
+from .search import matching_ids
+
+# =========================
+# Shipment history (keyset pagination)
+# =========================
+# Pages are fetched "after the last row seen" instead of with OFFSET, so page
+# 25,000 of a 5M-row table costs the same as page 1. Every sortable column has
+# an index, and SQLite index entries end in the rowid (= id), so rows come out
+# in (column, id) order straight from the index. Rows whose sort value is NULL
+# are listed as their own segment, where SQLite sorts them (first).
+HISTORY_PAGE_SIZE = 200
+
+HISTORY_COLUMNS = (
+    Courier.id, Courier.receipt, Courier.created_at, Courier.sender_name, Courier.sender_phone,
+    Courier.receiver_name, Courier.receiver_phone, Courier.receiver_pincode, Courier.weight,
+    Courier.price_paise, Courier.payment_method, Courier.payment_status,
+)
+
+HISTORY_SORTS = {
+    "id": Courier.id,
+    "receipt": Courier.receipt,
+    "created_at": Courier.created_at,
+    "sender_phone": Courier.sender_phone,
+    "receiver_phone": Courier.receiver_phone,
+    "receiver_pincode": Courier.receiver_pincode,
+    "payment_status": Courier.payment_status,
+}
+_KEY_POSITION = {name: HISTORY_COLUMNS.index(col) for name, col in HISTORY_SORTS.items()}
+
+
+def _booked_on(value: str):
+    day = datetime.strptime(value, "%Y-%m-%d")
+    return (Courier.created_at >= day) & (Courier.created_at < day + timedelta(days=1))
+
+
+def _unindexed(col):
+    """col as an expression SQLite can't use an index for (same values, same order)."""
+    return col.op("+" if col is Courier.id else "||", return_type=col.type)(0 if col is Courier.id else "")
+
+
+# The filters of SEARCH_FIELDS plus a booking date and full-text name/address
+# search (courierx.search). Most match a few rows, so
+# their own index should drive and the matches get sorted; payment status
+# matches a third of the table, so the sort column's index drives instead and
+# other statuses are skipped.
+HISTORY_FILTERS = (*SEARCH_FIELDS, "Booked on", "Name / address")
+_FILTER_COLUMN = {"Receipt": "receipt", "Receiver PIN": "receiver_pincode", "Payment status": "payment_status",
+                  "Booked on": "created_at"}
+_BROAD_FILTERS = {"Payment status"}
+
+
+def _filter_clause(field: str, value: str, sort: str):
+    if field == "Booked on":
+        return _booked_on(value)
+    if field == "Name / address":
+        return Courier.id.in_(matching_ids(value))
+    if field in _BROAD_FILTERS and _FILTER_COLUMN[field] != sort:
+        return _unindexed(Courier.payment_status) == value.capitalize()
+    return SEARCH_FIELDS[field](value)
+
+
+def _text_page(value: str, descending: bool, after, limit: int):
+    """The full-text filter for a page by id: the index yields matches in id order, so seek and stop there."""
+    ids = matching_ids(value)
+    rowid = ids.selected_columns[0]
+    if after:
+        ids = ids.where(rowid < after[1] if descending else rowid > after[1])
+    return Courier.id.in_(ids.order_by(rowid.desc() if descending else rowid.asc()).limit(limit))
+
+
+def _filter_drives(field: str, sort: str) -> bool:
+    return field not in _BROAD_FILTERS and _FILTER_COLUMN.get(field) != sort
+
+
+def row_key(row, sort: str = "id") -> tuple:
+    """(sort value, id) of a history row: the cursor for the page after it."""
+    return row[_KEY_POSITION[sort]], row[0]
+
+
+def _segments(sort: str, descending: bool, after, filter_drives: bool) -> list:
+    """(condition, order_by) per segment, together listing every row strictly after `after`.
+
+    The rest of the current value's group is read by id (an equality plus a
+    rowid range), then the later values by (column, id), so a seek never scans
+    the rows of a large group that were already shown. When a selective filter
+    drives, the sort columns are hidden from the planner so it uses the
+    filter's index, and the segments are merged so the matches are sorted once
+    (SQLite puts NULL first ascending and last descending, as the segments do).
+    """
+    col, row_id = HISTORY_SORTS[sort], Courier.id
+    if filter_drives:
+        col, row_id = _unindexed(col), _unindexed(row_id)
+    by_id = row_id.desc() if descending else row_id.asc()
+    later = operator.lt if descending else operator.gt
+    if sort == "id":
+        return [((later(row_id, after[1]) if after else None), [by_id])]
+
+    order = [col.desc() if descending else col.asc(), by_id]
+    nulls = col.is_(None), [by_id]
+    values = col.is_not(None), order
+    if after is None:
+        segments = [values, nulls] if descending else [nulls, values]
+    elif after[0] is None:
+        segments = [(and_(col.is_(None), later(row_id, after[1])), [by_id])] + ([] if descending else [values])
+    else:
+        segments = [(and_(col == after[0], later(row_id, after[1])), [by_id]), (later(col, after[0]), order)]
+        if descending:
+            segments.append(nulls)
+    if filter_drives:
+        return [(or_(*(cond for cond, _ in segments)), order)]
+    return segments
+
+
+def fetch_page(db: Database, sort: str = "id", descending: bool = True, field: str = None, value: str = None,
+               after: tuple = None, backward: bool = False, limit: int = HISTORY_PAGE_SIZE) -> list:
+    """Up to `limit` rows (HISTORY_COLUMNS tuples) in the given order, optionally filtered.
+
+    field/value filter like HISTORY_FILTERS. Forward pages start after the key
+    `after` (see row_key; None = from the top). Backward pages hold the rows
+    just before `after`, still returned in display order, for scrolling back up.
+    """
+    value = (value or "").strip()
+    field = field if value else None
+    where = _filter_clause(field, value, sort) if field else None
+    if field == "Name / address" and sort == "id":
+        where = _text_page(value, descending != backward, after, limit)
+    filter_drives = bool(field) and _filter_drives(field, sort)
+
+    def fetch(s):
+        rows = []
+        for cond, order_by in _segments(sort, descending != backward, after, filter_drives):
+            query = select(*HISTORY_COLUMNS)
+            for c in (cond, where):
+                if c is not None:
+                    query = query.where(c)
+            rows.extend(tuple(r) for r in s.execute(query.order_by(*order_by).limit(limit - len(rows))))
+            if len(rows) >= limit:
+                break
+        return rows
+
+    rows = db.run(fetch)
+    if backward:
+        rows.reverse()
+    return rows
+
+
+def count_rows(db: Database, field: str = None, value: str = None) -> int:
+    """Rows matching the filter (a full count; run it off the Tk thread)."""
+    value = (value or "").strip()
+    query = select(func.count()).select_from(Courier)
+    if field and value:
+        query = query.where(_filter_clause(field, value, sort="id"))
+    return db.run(lambda s: s.scalar(query))
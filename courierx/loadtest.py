@@ -0,0 +1,160 @@
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+from sqlalchemy import func, select
+
+from .db import Courier
+from .stress import PROJECT_ROOT, fresh_database
+
+# =========================
+# Booking API load test
+# =========================
+# Starts `python -m courierx serve` on a scratch database and drives it with
+# many simulated counters on localhost. Each counter keeps one HTTP/1.1
+# connection open and repeats: book a parcel, choose a payment method, and
+# fetch the receipt. Latency is measured per request, from send to full reply.
+
+
+class Client:
+    """Minimal keep-alive HTTP/1.1 JSON client (one connection, one request at a time)."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method: str, path: str, body: dict = None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        data = json.dumps(body).encode() if body is not None else b""
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+                          f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        return status, json.loads(await self.reader.readexactly(length))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))]
+
+
+async def counter(host: str, port: int, terminal: int, count: int, latencies: dict, errors: list):
+    client = Client(host, port)
+    try:
+        for i in range(count):
+            form = dict(
+                sender_name=f"Counter {terminal}", sender_address="Counter", sender_pincode="110001",
+                sender_phone="9876543210", receiver_name=f"Receiver {i}", house=str(i), street="Main Road",
+                locality="Market", city="City", state=random.choice(["Punjab", "Kerala", "Delhi", "Bihar"]),
+                receiver_pincode="141001", receiver_phone="9123456780", weight=round(random.uniform(0.2, 20), 1),
+            )
+            steps = [("book", "POST", "/bookings", form)]
+            receipt = None
+            for name, method, path, body in steps:
+                started = time.perf_counter()
+                status, reply = await client.request(method, path, body)
+                latencies[name].append(time.perf_counter() - started)
+                if status >= 300:
+                    errors.append(f"{name}: {status} {reply}")
+                    break
+                if name == "book":
+                    receipt = reply["receipt"]
+                    steps += [
+                        ("payment", "POST", f"/bookings/{receipt}/payment",
+                         {"payment_method": random.choice(["Google Pay", "Cash on Delivery"])}),
+                        ("fetch", "GET", f"/bookings/{receipt}", None),
+                    ]
+    except (ConnectionError, asyncio.IncompleteReadError) as e:
+        errors.append(f"counter {terminal}: {e!r}")
+    finally:
+        client.close()
+
+
+async def drive(host: str, port: int, counters: int, count: int):
+    latencies = {"book": [], "payment": [], "fetch": []}
+    errors = []
+    started = time.perf_counter()
+    await asyncio.gather(*(counter(host, port, t, count, latencies, errors) for t in range(counters)))
+    return time.perf_counter() - started, latencies, errors
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_health(url: str, timeout: float = 30.0) -> dict:
+    deadline = time.time() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as resp:
+                return json.load(resp)
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def run_loadtest(counters: int = 200, count: int = 10, db_path: str = "loadtest_couriers.db",
+                 max_batch: int = None, max_wait_ms: float = None) -> int:
+    check_db = fresh_database(db_path)
+    host, port = "127.0.0.1", free_port()
+    cmd = [sys.executable, "-m", "courierx", "serve", "--host", host, "--port", str(port), "--no-pincodes"]
+    if max_batch is not None:
+        cmd += ["--max-batch", str(max_batch)]
+    if max_wait_ms is not None:
+        cmd += ["--max-wait-ms", str(max_wait_ms)]
+    env = dict(os.environ, COURIERX_DB_URL=check_db.url,
+               PYTHONPATH=os.pathsep.join(filter(None, [PROJECT_ROOT, os.environ.get("PYTHONPATH")])))
+    server = subprocess.Popen(cmd, env=env)
+    try:
+        wait_for_health(f"http://{host}:{port}/health")
+        elapsed, latencies, errors = asyncio.run(drive(host, port, counters, count))
+        health = wait_for_health(f"http://{host}:{port}/health")
+    finally:
+        server.terminate()
+        server.wait()
+
+    with check_db.engine.connect() as conn:
+        stored = conn.execute(select(func.count()).select_from(Courier)).scalar()
+        unpaid = conn.execute(select(func.count()).where(Courier.payment_method.is_(None))).scalar()
+    check_db.dispose()
+
+    booked = len(latencies["book"]) - sum(1 for e in errors if e.startswith("book:"))
+    print(f"{counters} counters x {count} bookings in {elapsed:.2f}s: {booked / elapsed:.0f} bookings/s, "
+          f"{sum(map(len, latencies.values())) / elapsed:.0f} requests/s")
+    for name, values in latencies.items():
+        values.sort()
+        print(f"  {name:<8} p50 {percentile(values, 50) * 1000:7.1f} ms   p99 {percentile(values, 99) * 1000:7.1f} ms"
+              f"   ({len(values)} requests)")
+    writes = health.get("writes", 0)
+    batches = health.get("batches", 0)
+    print(f"  {writes} writes in {batches} transactions ({writes / batches if batches else 0:.1f} per commit)")
+    print(f"stored: {stored}, missing payment updates: {unpaid}, errors: {len(errors)}")
+    for e in errors[:5]:
+        print(f"  {e}")
+    ok = not errors and stored == counters * count and not unpaid
+    print("OK" if ok else "FAILED")
+    return 0 if ok else 1
@@ -0,0 +1,146 @@
+import csv
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import delete, func, insert, literal, select
+
+from .booking import format_rupees
+from .db import Courier, Database, PinRegion
+
+# =========================
+# Dispatch manifests
+# =========================
+# A day's parcels sorted into outbound bags, by the receiver's district or
+# state (from the pincode dataset, copied into pin_regions so SQLite can join
+# on it) or by a PIN prefix (3 digits = the sorting district). SQLite does the
+# work: one GROUP BY for the per-bag totals, then one scan in bag order whose
+# rows are written out as they arrive, so memory stays flat however many
+# parcels a branch books.
+MANIFEST_GROUPS = ("district", "state", "prefix")
+MANIFEST_PREFIX_DIGITS = 3
+MANIFEST_FIELDS = ["bag", "receipt", "receiver_name", "receiver_phone", "receiver_pincode", "receiver_address",
+                   "weight_kg", "price"]
+SHEET_WIDTH = 80
+UNKNOWN_REGION = "(PIN not in pincode data)"
+
+
+def sync_pin_regions(db: Database, table) -> int:
+    """Make pin_regions match the pincode table (a pincodes.PincodeTable); returns the PINs written."""
+    wanted = {str(pin): table.match(i)[:2] for pin, i in table.pin_index.items()}
+
+    def sync(s):
+        stored = {pin: (district, state) for pin, district, state in s.execute(select(PinRegion.__table__))}
+        if stored == wanted:
+            return 0
+        s.execute(delete(PinRegion))
+        s.execute(insert(PinRegion), [{"pin": p, "district": d, "state": st} for p, (d, st) in wanted.items()])
+        return len(wanted)
+
+    return db.run(sync)
+
+
+def bag_columns(group: str, prefix_digits: int = MANIFEST_PREFIX_DIGITS) -> list:
+    """The labelled SQL expressions naming a parcel's bag, outermost first."""
+    if group == "prefix":
+        return [func.substr(Courier.receiver_pincode, 1, prefix_digits).label("bag_prefix")]
+    state = func.coalesce(PinRegion.state, UNKNOWN_REGION).label("bag_state")
+    if group == "state":
+        return [state]
+    if group == "district":
+        return [state, func.coalesce(PinRegion.district, literal("")).label("bag_district")]
+    raise ValueError(f"group must be one of: {', '.join(MANIFEST_GROUPS)}")
+
+
+def bag_label(group: str, bag: tuple) -> str:
+    if group == "prefix":
+        prefix = bag[0] or ""
+        return f"PIN {prefix}{'x' * (6 - len(prefix))}"
+    return " / ".join(part for part in bag if part)
+
+
+def _parcels_of_day(query, day: date, group: str, upto_id: int = None):
+    start = datetime.combine(day, time())
+    query = query.where(Courier.created_at >= start, Courier.created_at < start + timedelta(days=1))
+    if upto_id is not None:
+        query = query.where(Courier.id <= upto_id)
+    if group == "prefix":
+        return query.select_from(Courier)
+    return query.select_from(Courier).outerjoin(PinRegion, PinRegion.pin == Courier.receiver_pincode)
+
+
+def bag_totals(db: Database, day: date, group: str = "district", prefix_digits: int = MANIFEST_PREFIX_DIGITS,
+               upto_id: int = None) -> list:
+    """(bag, parcels, kg, price paise) per bag for the parcels booked on `day` (with id <= upto_id), in bag order."""
+    bag = bag_columns(group, prefix_digits)
+    query = _parcels_of_day(
+        select(*bag, func.count(), func.coalesce(func.sum(Courier.weight), 0.0),
+               func.coalesce(func.sum(Courier.price_paise), 0)), day, group, upto_id,
+    ).group_by(*bag).order_by(*bag)
+    return db.run(lambda s: [(tuple(r[:len(bag)]), r[-3], r[-2], r[-1]) for r in s.execute(query)])
+
+
+def stream_parcels(db: Database, day: date, group: str, handle, prefix_digits: int = MANIFEST_PREFIX_DIGITS,
+                   upto_id: int = None, chunk: int = 2000):
+    """Call handle(bag, row) for each parcel of `day`, in bag then PIN then receipt order, streaming."""
+    bag = bag_columns(group, prefix_digits)
+    query = _parcels_of_day(
+        select(*bag, Courier.receipt, Courier.receiver_name, Courier.receiver_phone, Courier.receiver_pincode,
+               Courier.receiver_address, Courier.weight, Courier.price_paise), day, group, upto_id,
+    ).order_by(*bag, Courier.receiver_pincode, Courier.receipt)
+
+    def scan(s):
+        for r in s.execute(query.execution_options(yield_per=chunk)):
+            handle(tuple(r[:len(bag)]), r[len(bag):])
+
+    db.run(scan, retries=0)  # a retry would repeat rows already handled
+
+
+def _sheet_header(group: str, day: date, number: int, bags: int, bag: tuple, parcels: int, kg: float) -> str:
+    title = f"DISPATCH MANIFEST  {day.isoformat()}  bag {number} of {bags}"
+    label = bag_label(group, bag)
+    return (f"{title}\n{'=' * SHEET_WIDTH}\n"
+            f"Bag: {label}\nParcels: {parcels}    Total weight: {kg:.2f} kg\n{'-' * SHEET_WIDTH}\n"
+            f"{'#':>4}  {'Receipt':<12}{'Receiver':<24}{'PIN':<8}{'City':<20}{'Kg':>8}\n{'-' * SHEET_WIDTH}\n")
+
+
+def write_manifest(db: Database, day: date, group: str = "district", csv_path: str = None, sheet_path: str = None,
+                   prefix_digits: int = MANIFEST_PREFIX_DIGITS) -> list:
+    """Write the day's manifest as CSV (one row per parcel) and/or a printable text sheet (one page per bag).
+
+    Returns the bag totals (see bag_totals).
+    """
+    # Bookings made while the file is written are left out of both passes, so the totals match the rows
+    upto_id = db.run(lambda s: s.scalar(select(func.max(Courier.id)))) or 0
+    totals = bag_totals(db, day, group, prefix_digits, upto_id)
+    if not csv_path and not sheet_path:
+        return totals
+    by_bag = {bag: (i + 1, parcels, kg) for i, (bag, parcels, kg, _) in enumerate(totals)}
+    csv_file = open(csv_path, "w", newline="", encoding="utf-8") if csv_path else None
+    sheet = open(sheet_path, "w", encoding="utf-8") if sheet_path else None
+    state = {"bag": None, "n": 0}
+
+    def handle(bag, row):
+        receipt, name, phone, pin, address, kg, paise = row
+        if csv_file:
+            writer.writerow([bag_label(group, bag), receipt, name, phone, pin, address,
+                             f"{kg:g}" if kg is not None else "", format_rupees(paise)])
+        if sheet:
+            if bag != state["bag"]:
+                number, parcels, total_kg = by_bag[bag]
+                sheet.write(("\f" if state["bag"] is not None else "")
+                            + _sheet_header(group, day, number, len(totals), bag, parcels, total_kg))
+                state.update(bag=bag, n=0)
+            state["n"] += 1
+            city = (address or "").rsplit(", ", 2)[-2] if (address or "").count(", ") >= 2 else ""
+            sheet.write(f"{state['n']:>4}  {receipt:<12}{(name or '')[:23]:<24}{pin or '':<8}{city[:19]:<20}"
+                        f"{kg or 0:>8.2f}\n")
+
+    try:
+        if csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(MANIFEST_FIELDS)
+        stream_parcels(db, day, group, handle, prefix_digits, upto_id)
+    finally:
+        for f in (csv_file, sheet):
+            if f:
+                f.close()
+    return totals
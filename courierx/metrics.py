@@ -0,0 +1,223 @@
+import atexit
+import functools
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+# =========================
+# Metrics
+# =========================
+# In-process timing histograms and counters for the hot paths, exported in
+# the Prometheus text format: written to COURIERX_METRICS_FILE every
+# COURIERX_METRICS_INTERVAL seconds (for node_exporter's textfile collector,
+# or just to read), and served at GET /metrics by `python -m courierx serve`.
+#
+# Metrics are module-level objects created once at import, so recording one is
+# a bisect and three additions under a lock. Operations slower than
+# COURIERX_SLOW_MS are also logged, to stderr or to COURIERX_SLOW_LOG.
+# COURIERX_METRICS=0 turns spans into no-ops.
+METRICS_ENABLED = os.environ.get("COURIERX_METRICS", "1") != "0"
+METRICS_FILE = os.environ.get("COURIERX_METRICS_FILE")
+METRICS_INTERVAL = float(os.environ.get("COURIERX_METRICS_INTERVAL", "15"))
+SLOW_MS = float(os.environ.get("COURIERX_SLOW_MS", "0"))  # 0 = no slow-operation log
+SLOW_LOG = os.environ.get("COURIERX_SLOW_LOG")
+
+# Upper bounds in seconds, from sub-millisecond lookups to a stuck printer
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_registry = {}  # (name, labels) -> Counter/Histogram, in creation order
+_help = {}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels: tuple, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(v) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    def __init__(self, name: str, labels: tuple):
+        self.name = name
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, n: int = 1):
+        with _lock:
+            self.value += n
+
+    def samples(self):
+        yield self.name, _label_text(self.labels), self.value
+
+
+class Histogram:
+    def __init__(self, name: str, labels: tuple):
+        self.name = name
+        self.labels = labels
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float, detail: str = None):
+        i = bisect_left(BUCKETS, seconds)
+        with _lock:
+            self.counts[i] += 1
+            self.sum += seconds
+            self.count += 1
+        if SLOW_MS and seconds * 1000 >= SLOW_MS:
+            log_slow(self, seconds, detail)
+
+    def time(self, detail: str = None):
+        """Context manager recording the duration of its block."""
+        return _Span(self, detail) if METRICS_ENABLED else _NO_SPAN
+
+    def samples(self):
+        with _lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = 0
+        for bound, n in zip(BUCKETS + ("+Inf",), counts):
+            cumulative += n
+            le = bound if isinstance(bound, str) else repr(bound)
+            yield self.name + "_bucket", _label_text(self.labels, f'le="{le}"'), cumulative
+        yield self.name + "_sum", _label_text(self.labels), total
+        yield self.name + "_count", _label_text(self.labels), count
+
+
+class _Span:
+    __slots__ = ("hist", "detail", "started")
+
+    def __init__(self, hist: Histogram, detail: str):
+        self.hist = hist
+        self.detail = detail
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.started, self.detail)
+        return False
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def _get(cls, name: str, help_text: str, labels: dict):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        metric = _registry.get(key)
+        if metric is None:
+            metric = _registry[key] = cls(name, key[1])
+            _help.setdefault(name, (help_text, "counter" if cls is Counter else "histogram"))
+    return metric
+
+
+def counter(name: str, help_text: str, **labels) -> Counter:
+    """The counter `name` with these labels (created on first use)."""
+    return _get(Counter, name, help_text, labels)
+
+
+def histogram(name: str, help_text: str, **labels) -> Histogram:
+    """The timing histogram `name` (seconds) with these labels (created on first use)."""
+    return _get(Histogram, name, help_text, labels)
+
+
+def timed(hist: Histogram):
+    """Decorator recording every call of the function in `hist`."""
+    def wrap(fn):
+        if not METRICS_ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                hist.observe(time.perf_counter() - started)
+        return inner
+    return wrap
+
+
+def log_slow(hist: Histogram, seconds: float, detail: str = None):
+    line = (f"[SLOW] {time.strftime('%Y-%m-%d %H:%M:%S')} {hist.name}{_label_text(hist.labels)} "
+            f"{seconds * 1000:.1f} ms" + (f" {detail}" if detail else ""))
+    if not SLOW_LOG:
+        print(line, file=sys.stderr)
+        return
+    try:
+        with _lock, open(SLOW_LOG, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError as e:
+        print(f"[WARN] Couldn't write slow-operation log {SLOW_LOG}: {e}")
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format."""
+    with _lock:
+        metrics = list(_registry.values())
+        helps = dict(_help)
+    by_name = {}
+    for m in metrics:
+        by_name.setdefault(m.name, []).append(m)
+    lines = []
+    for name, group in by_name.items():
+        help_text, kind = helps[name]
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for m in group:
+            lines.extend(f"{sample}{labels} {_format_value(value)}" for sample, labels, value in m.samples())
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path: str = METRICS_FILE):
+    """Atomically replace `path` with the current metrics."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+
+_writer = None
+
+
+def start_textfile_writer(path: str = METRICS_FILE, interval: float = METRICS_INTERVAL):
+    """Write the metrics to `path` every `interval` seconds and at exit (no-op without a path)."""
+    global _writer
+    if not path or not METRICS_ENABLED or _writer is not None:
+        return None
+
+    def write():
+        try:
+            write_textfile(path)
+        except OSError as e:
+            print(f"[WARN] Couldn't write metrics to {path}: {e}")
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            write()
+
+    _writer = threading.Thread(target=loop, name="metrics-writer", daemon=True)
+    _writer.start()
+    atexit.register(write)
+    return _writer
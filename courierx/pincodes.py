@@ -0,0 +1,399 @@
+import difflib
+import hashlib
+import os
+import pickle
+from array import array
+from bisect import bisect_left
+
+from . import metrics
+
+# =========================
+# India pincode dataset
+# =========================
+# The raw CSV is only parsed (with pandas) when the compact cache next to it is
+# missing or stale. The cache keeps just area/pincode/district/state, with the
+# strings dictionary-encoded and the pincodes as plain integers, so later starts
+# are a single pickle load.
+
+CSV_PATH = "India_pincode.csv"
+CACHE_VERSION = 2
+
+PINCODE_LOAD = metrics.histogram("courierx_pincode_load_seconds", "Loading the pincode table (cache or CSV)")
+PINCODE_CSV_PARSE = metrics.histogram("courierx_pincode_csv_parse_seconds", "Parsing the raw pincode CSV")
+# Lookups are microseconds, so front ends time them per request rather than per table call
+LOOKUP_OPS = ("find_area", "find_pin", "suggest")
+LOOKUP_SECONDS = {op: metrics.histogram("courierx_pincode_lookup_seconds", "Pincode lookups from a front end", op=op)
+                  for op in LOOKUP_OPS}
+LOOKUP_MISSES = {op: metrics.counter("courierx_pincode_lookup_misses_total", "Pincode lookups that found nothing",
+                                     op=op) for op in LOOKUP_OPS}
+
+
+def cache_path_for(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + ".cache"
+
+
+def normalize_pin_value(val) -> str:
+    s = str(val).strip()
+    if "." in s:  # CSV sometimes has floats
+        s = s.split(".", 1)[0]
+    return s
+
+
+def _pin_key(pin) -> int:
+    """Dictionary key for a pincode; 0 (never a real PIN) for anything malformed."""
+    if isinstance(pin, int):
+        return pin
+    pin = normalize_pin_value(pin)
+    return int(pin) if len(pin) == 6 and pin.isdigit() else 0
+
+
+def normalize_area(area) -> str:
+    return str(area or "").strip().lower()
+
+
+def area_grams(key: str) -> set:
+    """Trigrams of a normalized area name, anchored at the start so prefixes weigh more."""
+    padded = f" {key}"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def detect_columns(columns) -> dict:
+    """Map area/pin/district/state to the CSV's actual column names (None if absent)."""
+    columns = [c.strip() for c in columns]
+
+    def find_col(candidates):
+        cols_norm = {c: c.strip().lower().replace(" ", "").replace("_", "") for c in columns}
+        for c, n in cols_norm.items():
+            if n in candidates:
+                return c
+        return None
+
+    # Try common variants
+    col_area = find_col({"area", "locality", "officename", "village", "location", "place", "areaname"})
+    col_pin = find_col({"pincode", "pin", "postcode", "zipcode", "pincodeno", "pincodenumber"})
+    if col_pin is None:
+        for c in columns:
+            if c.strip().lower() in ("pin code", "pin-code", "pin code number", "p.o.pincode"):
+                col_pin = c
+                break
+
+    # District / City
+    col_dist = None
+    for c in columns:
+        if c.strip().lower() in ("district"):
+            col_dist = c
+            break
+
+    # State
+    col_state = None
+    for c in columns:
+        if c.strip().lower() in ("state", "statename"):
+            col_state = c
+            break
+
+    return {"area": col_area, "pin": col_pin, "district": col_dist, "state": col_state}
+
+
+class PincodeTable:
+    """Dictionary-encoded pincode rows plus the lookup indexes built over them.
+
+    Rows are grouped by area code in ``area_order``; the rows for area code ``c``
+    are ``area_order[area_offsets[c]:area_offsets[c + 1]]``, in CSV order.
+    ``area_sorted`` lists area codes alphabetically for prefix search, and the
+    trigram postings (same offsets layout) back the fuzzy suggestions.
+    """
+
+    def __init__(self, columns, areas, districts, states, area_codes, dist_codes, state_codes, pins,
+                 area_order, area_offsets, area_sorted, grams, gram_postings, gram_offsets):
+        self.columns = columns
+        self.areas = areas              # distinct area names (first spelling seen per normalized name)
+        self.districts = districts
+        self.states = states
+        self.area_codes = area_codes    # array('I'), one entry per CSV row
+        self.dist_codes = dist_codes
+        self.state_codes = state_codes
+        self.pins = pins                # array('I'), 0 where the CSV had no usable PIN
+        self.area_order = area_order
+        self.area_offsets = area_offsets
+        self.area_sorted = area_sorted
+        self.grams = grams
+        self.gram_postings = gram_postings
+        self.gram_offsets = gram_offsets
+        self.area_index = self._build_area_index()
+        self.sorted_keys = [self.areas[c].lower() for c in area_sorted]
+        self.gram_index = dict(zip(grams, range(len(grams))))
+        self.pin_index = self._build_pin_index()
+
+    def __len__(self):
+        return len(self.pins)
+
+    def _build_area_index(self) -> dict:
+        """normalized area -> area code; areas are already distinct after normalizing."""
+        index = dict(zip(map(str.lower, self.areas), range(len(self.areas))))
+        index.pop("", None)
+        return index
+
+    def _build_pin_index(self) -> dict:
+        """pincode (int) -> first row carrying it."""
+        n = len(self.pins)
+        index = dict(zip(reversed(self.pins), range(n - 1, -1, -1)))
+        index.pop(0, None)
+        return index
+
+    def match(self, i: int) -> tuple:
+        """(district, state, pincode) for row i."""
+        pin = self.pins[i]
+        return self.districts[self.dist_codes[i]], self.states[self.state_codes[i]], str(pin) if pin else ""
+
+    def area_rows(self, area: str):
+        c = self.area_index.get(normalize_area(area))
+        if c is None:
+            return ()
+        return self.area_order[self.area_offsets[c]:self.area_offsets[c + 1]]
+
+    def find_area(self, area: str) -> list:
+        """All (district, state, pincode) candidates for an area name, in CSV order."""
+        matches = []
+        for i in self.area_rows(area):
+            m = self.match(i)
+            if m not in matches:  # post offices of one area often share a PIN
+                matches.append(m)
+        return matches
+
+    # ---------- Reverse (pincode) lookups ----------
+    def find_pin(self, pin):
+        """(district, state) for a pincode (str or int), or None if it isn't in the dataset."""
+        i = self.pin_index.get(_pin_key(pin))
+        if i is None:
+            return None
+        return self.districts[self.dist_codes[i]], self.states[self.state_codes[i]]
+
+    def is_known_pin(self, pin) -> bool:
+        return _pin_key(pin) in self.pin_index
+
+    def unknown_pins(self, pins) -> list:
+        """Positions of the pins that aren't in the dataset, for bulk validation."""
+        index = self.pin_index
+        return [i for i, pin in enumerate(pins) if _pin_key(pin) not in index]
+
+    # ---------- Typeahead ----------
+    def suggest_areas(self, text: str, limit: int = 8) -> list:
+        """Area names completing ``text``: prefix matches first, then fuzzy ones."""
+        q = normalize_area(text)
+        if not q:
+            return []
+        codes = self._prefix_codes(q, limit)
+        if len(codes) < limit:
+            for c in self._fuzzy_codes(q, limit):
+                if c not in codes:
+                    codes.append(c)
+                    if len(codes) == limit:
+                        break
+        return [self.areas[c] for c in codes]
+
+    def _prefix_codes(self, q: str, limit: int) -> list:
+        keys = self.sorted_keys
+        codes = []
+        i = bisect_left(keys, q)
+        while i < len(keys) and len(codes) < limit and keys[i].startswith(q):
+            codes.append(self.area_sorted[i])
+            i += 1
+        return codes
+
+    def _fuzzy_codes(self, q: str, limit: int, min_ratio: float = 0.6) -> list:
+        """Rank areas sharing the most trigrams with q, then re-score the best few."""
+        import numpy as np
+
+        ids = [self.gram_index[g] for g in area_grams(q) if g in self.gram_index]
+        if not ids:
+            return []
+        postings = np.frombuffer(self.gram_postings, dtype=np.uint32)
+        offsets = self.gram_offsets
+        hits = np.concatenate([postings[offsets[g]:offsets[g + 1]] for g in ids])
+        cand, counts = np.unique(hits, return_counts=True)
+        k = min(limit * 2, len(cand))
+        best = np.argsort(-counts, kind="stable")[:k]
+
+        scored = []
+        for c, shared in zip(cand[best].tolist(), counts[best].tolist()):
+            key = self.areas[c].lower()
+            ratio = max(difflib.SequenceMatcher(None, q, key).ratio(),
+                        difflib.SequenceMatcher(None, q, key[:len(q)]).ratio())
+            if ratio >= min_ratio:
+                scored.append((-ratio, -shared, len(key), c))
+        scored.sort()
+        return [c for *_, c in scored]
+
+    # ---------- Cache (de)serialization ----------
+    def to_payload(self) -> dict:
+        return {
+            "columns": self.columns,
+            "areas": self.areas,
+            "districts": self.districts,
+            "states": self.states,
+            "area_codes": self.area_codes,
+            "dist_codes": self.dist_codes,
+            "state_codes": self.state_codes,
+            "pins": self.pins,
+            "area_order": self.area_order,
+            "area_offsets": self.area_offsets,
+            "area_sorted": self.area_sorted,
+            "grams": self.grams,
+            "gram_postings": self.gram_postings,
+            "gram_offsets": self.gram_offsets,
+        }
+
+    @classmethod
+    def from_payload(cls, payload: dict) -> "PincodeTable":
+        return cls(**payload)
+
+
+def _uint_array(values) -> array:
+    arr = array("I")
+    arr.frombytes(values.astype("uint32").tobytes())
+    return arr
+
+
+def _encode(series, normalize=False):
+    """Dictionary-encode a string column into (codes, distinct values).
+
+    With ``normalize`` the codes group case variants together, and each
+    distinct value is the first spelling seen for its group.
+    """
+    import pandas as pd
+
+    series = series.fillna("").str.strip()
+    codes, uniques = pd.factorize(series.str.lower() if normalize else series, sort=False)
+    if normalize:
+        first_rows = pd.Series(range(len(codes))).groupby(codes, sort=True).first()
+        uniques = series.iloc[first_rows.to_numpy()]
+    return codes, [str(u) for u in uniques]
+
+
+def _group_offsets(np, codes, n_groups: int):
+    """Row order grouped by code, plus offsets so group c is order[off[c]:off[c + 1]]."""
+    order = np.argsort(codes, kind="stable")
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=n_groups))))
+    return order, offsets
+
+
+def _build_gram_postings(np, areas: list):
+    gram_ids = {}
+    gram_col = array("I")
+    code_col = array("I")
+    for code, area in enumerate(areas):
+        for g in area_grams(area.lower()):
+            gram_col.append(gram_ids.setdefault(g, len(gram_ids)))
+            code_col.append(code)
+    gram_col = np.frombuffer(gram_col, dtype=np.uint32)
+    order, offsets = _group_offsets(np, gram_col, len(gram_ids))
+    return list(gram_ids), np.frombuffer(code_col, dtype=np.uint32)[order], offsets
+
+
+@metrics.timed(PINCODE_CSV_PARSE)
+def read_csv_table(csv_path: str) -> PincodeTable:
+    """Parse the raw CSV, reading only the four columns we use."""
+    import numpy as np
+    import pandas as pd
+
+    header = pd.read_csv(csv_path, nrows=0).columns
+    stripped = {c.strip(): c for c in header}
+    cols = detect_columns(header)
+    if not cols["area"] or not cols["pin"]:
+        raise ValueError(f"area/pincode columns not found in {csv_path}")
+
+    usecols = [stripped[c] for c in cols.values() if c]
+    df = pd.read_csv(csv_path, usecols=usecols, dtype=str)
+    df.columns = [c.strip() for c in df.columns]
+    n = len(df)
+
+    area_codes, areas = _encode(df[cols["area"]], normalize=True)
+    if cols["district"]:
+        dist_codes, districts = _encode(df[cols["district"]])
+    else:
+        dist_codes, districts = np.zeros(n, dtype="uint32"), [""]
+    if cols["state"]:
+        state_codes, states = _encode(df[cols["state"]])
+    else:
+        state_codes, states = np.zeros(n, dtype="uint32"), [""]
+
+    pins = pd.to_numeric(df[cols["pin"]].fillna("").map(normalize_pin_value), errors="coerce")
+    pins = pins.where((pins >= 0) & (pins <= 999999)).fillna(0).to_numpy()
+
+    area_order, area_offsets = _group_offsets(np, area_codes, len(areas))
+    area_sorted = sorted(range(len(areas)), key=lambda c: areas[c].lower())
+    grams, gram_postings, gram_offsets = _build_gram_postings(np, areas)
+
+    return PincodeTable(
+        cols, areas, districts, states,
+        _uint_array(area_codes), _uint_array(dist_codes), _uint_array(state_codes), _uint_array(pins),
+        _uint_array(area_order), _uint_array(area_offsets), array("I", area_sorted),
+        grams, _uint_array(gram_postings), _uint_array(gram_offsets),
+    )
+
+
+def file_sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _read_cache(cache_path: str):
+    try:
+        with open(cache_path, "rb") as f:
+            cached = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        return None
+    if not isinstance(cached, dict) or cached.get("version") != CACHE_VERSION:
+        return None
+    return cached
+
+
+def _write_cache(cache_path: str, meta: dict, table: PincodeTable):
+    tmp = cache_path + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump({"version": CACHE_VERSION, **meta, "table": table.to_payload()}, f,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, cache_path)
+
+
+@metrics.timed(PINCODE_LOAD)
+def load(csv_path: str = CSV_PATH, cache_path: str = None) -> PincodeTable:
+    """Load the pincode table, rebuilding the on-disk cache when the CSV changed.
+
+    The cache is trusted when the CSV's size and mtime match; if only the mtime
+    moved, the content hash decides. A cache without its CSV is used as-is.
+    """
+    cache_path = cache_path or cache_path_for(csv_path)
+    cached = _read_cache(cache_path)
+
+    try:
+        st = os.stat(csv_path)
+    except FileNotFoundError:
+        if cached is None:
+            raise
+        return PincodeTable.from_payload(cached["table"])
+
+    meta = {"csv_size": st.st_size, "csv_mtime_ns": st.st_mtime_ns}
+    if cached is not None:
+        if cached.get("csv_size") == st.st_size and cached.get("csv_mtime_ns") == st.st_mtime_ns:
+            return PincodeTable.from_payload(cached["table"])
+        meta["csv_sha1"] = file_sha1(csv_path)
+        if cached.get("csv_sha1") == meta["csv_sha1"]:
+            table = PincodeTable.from_payload(cached["table"])
+            _try_write_cache(cache_path, meta, table)  # remember the new mtime
+            return table
+
+    table = read_csv_table(csv_path)
+    meta.setdefault("csv_sha1", file_sha1(csv_path))
+    _try_write_cache(cache_path, meta, table)
+    return table
+
+
+def _try_write_cache(cache_path: str, meta: dict, table: PincodeTable):
+    try:
+        _write_cache(cache_path, meta, table)
+    except OSError as e:
+        print(f"[WARN] Couldn't write pincode cache {cache_path}: {e}")
@@ -0,0 +1,193 @@
+import json
+import os
+
+import numpy as np
+
+# =========================
+# Rate cards
+# =========================
+# A rate card (rates.json) is read once into lookup arrays:
+#   - origin/destination -> region, by pincode prefix (1-3 digits, longest wins)
+#     and otherwise by state name;
+#   - (origin region, destination region) -> zone, with "*" wildcards;
+#   - per zone, piecewise per-kg weight bands, optional round-up step and
+#     minimum charge;
+#   - surcharges (percent / flat / per kg), always on or keyed by a flag such
+#     as "cod".
+# Chargeable weight is max(actual, volume / volumetric_divisor). Every price is
+# computed by price_batch(); single quotes are a batch of one, so both paths
+# always agree. Amounts come back as integer paise.
+
+RATES_PATH = os.environ.get("COURIERX_RATES", "rates.json")
+
+# Used when no rates.json is present: the original flat rules (₹70/kg into the
+# six northern states, ₹120/kg everywhere else).
+DEFAULT_RATES = {
+    "state_aliases": {"up": "uttar pradesh", "hp": "himachal pradesh"},
+    "regions": {
+        "north": {"states": ["haryana", "punjab", "uttar pradesh", "delhi", "rajasthan", "himachal pradesh"]},
+    },
+    "default_region": "rest",
+    "zones": {"*>north": "preferred", "*>*": "standard"},
+    "rates": {
+        "preferred": {"bands": [[0, 70]]},
+        "standard": {"bands": [[0, 120]]},
+    },
+    "volumetric_divisor": 5000,
+    "surcharges": [],
+}
+
+
+def _norm(s) -> str:
+    return str(s or "").strip().lower()
+
+
+class RateCard:
+    def __init__(self, config: dict):
+        self.config = config
+        aliases = {_norm(k): _norm(v) for k, v in config.get("state_aliases", {}).items()}
+        default_region = config.get("default_region", "rest")
+
+        self.regions = list(config.get("regions", {}))
+        if default_region not in self.regions:
+            self.regions.append(default_region)
+        region_id = {name: i for i, name in enumerate(self.regions)}
+        self.default_region = region_id[default_region]
+
+        # state -> region (aliases resolve to the same region)
+        self.state_region = {}
+        # 3-digit pincode prefix -> region, -1 where no prefix rule applies
+        self.prefix_region = np.full(1000, -1, dtype=np.int16)
+        prefix_rules = []
+        for name, spec in config.get("regions", {}).items():
+            for state in spec.get("states", []):
+                self.state_region[_norm(state)] = region_id[name]
+            for prefix in spec.get("pin_prefixes", []):
+                prefix_rules.append((str(prefix), region_id[name]))
+        for alias, state in aliases.items():
+            if state in self.state_region:
+                self.state_region.setdefault(alias, self.state_region[state])
+        for prefix, rid in sorted(prefix_rules, key=lambda r: len(r[0])):  # longer prefixes override
+            span = 10 ** (3 - len(prefix))
+            start = int(prefix) * span
+            self.prefix_region[start:start + span] = rid
+
+        # (origin region, destination region) -> zone
+        self.zones = list(config["rates"])
+        zone_id = {name: i for i, name in enumerate(self.zones)}
+        n = len(self.regions)
+        self.zone_of = np.full((n, n), -1, dtype=np.int16)
+        rules = sorted(config["zones"].items(), key=lambda r: r[0].count("*"), reverse=True)
+        for key, zone in rules:  # wildcards first, specific pairs overwrite them
+            origin, dest = (part.strip() for part in key.split(">"))
+            rows = range(n) if origin == "*" else [region_id[origin]]
+            cols = range(n) if dest == "*" else [region_id[dest]]
+            for o in rows:
+                for d in cols:
+                    self.zone_of[o, d] = zone_id[zone]
+        if (self.zone_of < 0).any():
+            raise ValueError("rate card 'zones' must cover every origin/destination pair (add '*>*')")
+
+        # Weight bands, padded to the same length per zone
+        width = max(len(spec["bands"]) for spec in config["rates"].values())
+        self.band_start = np.full((len(self.zones), width), np.inf)
+        self.band_rate = np.zeros((len(self.zones), width))
+        self.band_base = np.zeros((len(self.zones), width))  # price accumulated before each band
+        self.round_up = np.zeros(len(self.zones))
+        self.min_charge = np.zeros(len(self.zones))
+        for z, name in enumerate(self.zones):
+            spec = config["rates"][name]
+            bands = sorted((float(b), float(r)) for b, r in spec["bands"])
+            if bands[0][0] != 0:
+                raise ValueError(f"rate card zone {name!r}: first band must start at 0 kg")
+            base = 0.0
+            for i, (start, rate) in enumerate(bands):
+                if i:
+                    prev_start, prev_rate = bands[i - 1]
+                    base += prev_rate * (start - prev_start)
+                self.band_start[z, i] = start
+                self.band_rate[z, i] = rate
+                self.band_base[z, i] = base
+            self.round_up[z] = float(spec.get("round_up_kg", 0))
+            self.min_charge[z] = float(spec.get("min_charge", 0))
+
+        self.volumetric_divisor = float(config.get("volumetric_divisor", 5000))
+        self.surcharges = [
+            (s.get("when"), float(s.get("percent", 0)), float(s.get("flat", 0)), float(s.get("per_kg", 0)))
+            for s in config.get("surcharges", [])
+        ]
+
+    # ---------- Region resolution ----------
+    def region(self, pincode=None, state=None) -> int:
+        pin = str(pincode or "").strip()
+        if len(pin) == 6 and pin.isdigit():
+            rid = self.prefix_region[int(pin) // 1000]
+            if rid >= 0:
+                return int(rid)
+        return self.state_region.get(_norm(state), self.default_region)
+
+    def regions_for(self, pincodes=None, states=None) -> np.ndarray:
+        """Vectorized region(): pincodes as ints (0 = unknown) and/or a sequence of states."""
+        n = len(pincodes) if pincodes is not None else len(states)
+        if states is not None:
+            lookup = self.state_region
+            out = np.fromiter((lookup.get(_norm(s), self.default_region) for s in states), dtype=np.int16, count=n)
+        else:
+            out = np.full(n, self.default_region, dtype=np.int16)
+        if pincodes is not None:
+            pins = np.asarray(pincodes, dtype=np.int64)
+            valid = (pins >= 100000) & (pins <= 999999)
+            by_prefix = np.where(valid, self.prefix_region[np.where(valid, pins // 1000, 0)], -1)
+            out = np.where(by_prefix >= 0, by_prefix, out).astype(np.int16)
+        return out
+
+    # ---------- Pricing ----------
+    def price_batch(self, weights, dest_regions, origin_regions=None, volumes_cm3=None, flags=None) -> np.ndarray:
+        """Prices in paise (int64) for arrays of shipments.
+
+        flags maps a surcharge's "when" name (e.g. "cod") to a boolean array.
+        """
+        w = np.asarray(weights, dtype=np.float64)
+        dest = np.asarray(dest_regions, dtype=np.intp)
+        origin = np.full_like(dest, self.default_region) if origin_regions is None \
+            else np.asarray(origin_regions, dtype=np.intp)
+        if volumes_cm3 is not None:
+            w = np.maximum(w, np.asarray(volumes_cm3, dtype=np.float64) / self.volumetric_divisor)
+
+        zone = self.zone_of[origin, dest]
+        step = self.round_up[zone]
+        w = np.where(step > 0, np.ceil(w / np.where(step > 0, step, 1) - 1e-9) * step, w)
+
+        band = (self.band_start[zone] <= w[:, None]).sum(axis=1) - 1
+        price = self.band_base[zone, band] + self.band_rate[zone, band] * (w - self.band_start[zone, band])
+        price = np.maximum(price, self.min_charge[zone])
+
+        extra = np.zeros_like(price)
+        for when, percent, flat, per_kg in self.surcharges:
+            amount = price * (percent / 100) + flat + per_kg * w
+            if when:
+                mask = (flags or {}).get(when)
+                amount = amount * np.asarray(mask, dtype=bool) if mask is not None else 0.0
+            extra = extra + amount
+
+        return np.rint(np.round(price + extra, 2) * 100).astype(np.int64)
+
+    def price(self, weight, dest_state=None, dest_pincode=None, origin_state=None, origin_pincode=None,
+              volume_cm3=None, flags=()) -> int:
+        """Price in paise for one shipment (a batch of one)."""
+        paise = self.price_batch(
+            [weight],
+            [self.region(dest_pincode, dest_state)],
+            [self.region(origin_pincode, origin_state)],
+            None if volume_cm3 is None else [volume_cm3],
+            {f: [True] for f in flags},
+        )
+        return int(paise[0])
+
+
+def load_rate_card(path: str = RATES_PATH) -> RateCard:
+    """Read rates.json once; fall back to the built-in flat rules if it's absent."""
+    if not os.path.exists(path):
+        return RateCard(DEFAULT_RATES)
+    with open(path, encoding="utf-8") as f:
+        return RateCard(json.load(f))
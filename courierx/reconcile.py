@@ -0,0 +1,254 @@
+import bisect
+import csv
+import math
+import re
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+from .booking import format_rupees, to_paise
+from .db import Courier, Database
+
+# =========================
+# UPI payment reconciliation
+# =========================
+# UPI bookings stay "Unverified" until they're found on the bank statement.
+# The statement is streamed once against an in-memory index of the unverified
+# bookings: a receipt number in the transaction note (the payment QR puts it
+# there) wins; otherwise the amount must match exactly one unclaimed booking
+# made within the time window before the payment. A multi-parcel booking is
+# paid once, for its total, under its batch number. Matches are marked "Paid"
+# in batched transactions as the file is read.
+STATEMENT_COLUMNS = {  # header aliases, compared lower-case
+    "amount": ["amount", "credit", "credit amount", "cr amount", "deposit", "txn amount", "transaction amount"],
+    "note": ["note", "remarks", "transaction remarks", "narration", "description", "particulars"],
+    "time": ["time", "timestamp", "date/time", "txn date", "transaction date", "date", "value date"],
+    "ref": ["utr", "rrn", "upi ref no", "reference", "ref no", "transaction id", "txn id"],
+}
+STATEMENT_DMY = re.compile(r"(\d{1,2})[/-](\d{1,2})[/-](\d{4})(?:[ T](\d{1,2}):(\d{2})(?::(\d{2}))?)?")
+STATEMENT_TIME_FORMATS = ("%d %b %Y %H:%M:%S", "%d %b %Y %H:%M", "%d-%b-%Y %H:%M:%S", "%d-%b-%Y", "%d %b %Y")
+RECEIPT_IN_NOTE = re.compile(r"\bEM[0-9A-Z]{8}\b")
+RECONCILE_WINDOW_MINUTES = 30
+RECONCILE_CLOCK_SKEW = 120  # seconds a statement clock may run behind ours
+RECONCILE_BATCH_SIZE = 5000
+
+
+def statement_columns(header: list) -> dict:
+    """Map amount/note/time/ref to the statement's own column names (amount is required)."""
+    by_lower = {h.strip().lower(): h for h in header if h}
+    cols = {key: next((by_lower[a] for a in aliases if a in by_lower), None)
+            for key, aliases in STATEMENT_COLUMNS.items()}
+    if not cols["amount"]:
+        raise ValueError(f"No amount column in statement header: {', '.join(header)}")
+    return cols
+
+
+class StatementTimeParser:
+    """Statement/dump time parser for one file.
+
+    A file uses one time format throughout, so the format that matched last is
+    tried first. It is remembered on the parser, not in STATEMENT_TIME_FORMATS,
+    so keep one parser per file being read.
+    """
+
+    def __init__(self):
+        self.last_format = None
+
+    def __call__(self, text: str):
+        text = text.strip()
+        if not text:
+            return None
+        m = STATEMENT_DMY.fullmatch(text)  # the common Indian dd/mm/yyyy [hh:mm[:ss]], without strptime
+        if m:
+            day, month, year, hour, minute, second = (int(g) if g else 0 for g in m.groups())
+            try:
+                return datetime(year, month, day, hour, minute, second)
+            except ValueError:
+                return None
+        try:
+            return datetime.fromisoformat(text)
+        except ValueError:
+            pass
+        last = self.last_format
+        for fmt in ((last,) if last else ()) + STATEMENT_TIME_FORMATS:
+            try:
+                parsed = datetime.strptime(text, fmt)
+            except ValueError:
+                continue
+            self.last_format = fmt
+            return parsed
+        return None
+
+
+def parse_statement_time(text: str):
+    """One statement time (no format remembered between calls); None if unreadable."""
+    return StatementTimeParser()(text)
+
+
+def parse_statement_amount(text: str):
+    cleaned = text.replace(",", "").replace("₹", "").replace("INR", "").replace("Rs.", "").strip()
+    try:
+        rupees = float(cleaned)
+    except ValueError:
+        return None
+    return to_paise(rupees) if math.isfinite(rupees) else None  # "inf"/"1e400" can't be paise
+
+
+class PaymentIndex:
+    """UPI payments awaiting (or recently given) a bank match, by receipt and by (amount, booking time).
+
+    A payment is a single booking, keyed by its id, or a whole multi-parcel
+    booking paid with one payment for its total, keyed by its batch number and
+    found by that or by any of its parcels' receipts.
+    """
+
+    def __init__(self, rows):
+        self.by_receipt = {}
+        self.ids = {}  # key -> booking ids the payment covers
+        self.expected = {}  # key -> (receipt shown in reports, paise)
+        self.paid = set()  # marked Paid by an earlier run, so re-reading a statement is harmless
+        booked_at = {}
+        for cid, rcpt, paise, created, status, batch in rows:
+            key = batch or cid
+            if key in self.ids:
+                self.ids[key].append(cid)
+                self.expected[key] = (batch, self.expected[key][1] + (paise or 0))
+            else:
+                self.ids[key] = [cid]
+                self.expected[key] = (batch or rcpt, paise if batch is None else paise or 0)
+                booked_at[key] = created
+                if status == "Paid":
+                    self.paid.add(key)
+            self.by_receipt[rcpt] = key
+            if batch:
+                self.by_receipt[batch] = key
+        by_amount = {}
+        for key, created in booked_at.items():
+            if created is not None:
+                rcpt, paise = self.expected[key]
+                by_amount.setdefault(paise, []).append((created.timestamp(), rcpt, key))
+        self.by_amount = {}
+        for paise, entries in by_amount.items():
+            entries.sort()
+            self.by_amount[paise] = ([e[0] for e in entries], [(key, rcpt) for _, rcpt, key in entries])
+        self.claimed = set()  # matched during this run
+
+    def __len__(self):
+        return len(self.ids)
+
+    def candidates(self, paise: int, paid_at: datetime, window_s: float) -> list:
+        """Payments of exactly `paise` booked in the window before paid_at, not yet matched in this run."""
+        times, entries = self.by_amount.get(paise, ((), ()))
+        t = paid_at.timestamp()
+        lo = bisect.bisect_left(times, t - window_s)
+        hi = bisect.bisect_right(times, t + RECONCILE_CLOCK_SKEW)
+        return [(key, rcpt) for key, rcpt in entries[lo:hi] if key not in self.claimed]
+
+
+def load_payment_index(db: Database, window_s: float) -> PaymentIndex:
+    """Unverified bookings, plus the Paid ones a statement covering them could still mention."""
+    def load(s):
+        fields = (Courier.id, Courier.receipt, Courier.price_paise, Courier.created_at, Courier.payment_status,
+                  Courier.batch)
+        rows = s.execute(select(*fields).where(Courier.payment_status == "Unverified")).all()
+        dated = [r[3] for r in rows if r[3] is not None]
+        if dated:
+            since = datetime.fromtimestamp(min(dated).timestamp() - window_s)
+            rows += s.execute(
+                select(*fields).where(Courier.payment_status == "Paid", Courier.created_at >= since)
+            ).all()
+        return rows
+
+    return PaymentIndex(db.run(load))
+
+
+def mark_paid(db: Database, ids: list) -> int:
+    """Unverified -> Paid for ids in one transaction; returns the rows changed."""
+    return db.run(lambda s: s.execute(
+        update(Courier).where(Courier.id.in_(ids), Courier.payment_status == "Unverified")
+        .values(payment_status="Paid")
+    ).rowcount)
+
+
+def match_statement_line(index: PaymentIndex, paise, note: str, time_text: str, window_s: float,
+                         parse_time=parse_statement_time):
+    """Return ("matched", key, receipt), ("already_paid", key, receipt) or ("unmatched" | "ambiguous", None, reason).
+
+    key is the payment's key in the index. The time is only parsed (with parse_time) when the note names no receipt.
+    """
+    if paise is None or paise <= 0:
+        return "unmatched", None, "not a credit amount"
+    for rcpt in RECEIPT_IN_NOTE.findall(note.upper()):
+        key = index.by_receipt.get(rcpt)
+        if key is None:
+            continue
+        rcpt, expected = index.expected[key]
+        if key in index.paid:
+            return "already_paid", key, rcpt
+        if key in index.claimed:
+            return "ambiguous", None, f"receipt {rcpt} already matched to another payment"
+        if expected != paise:
+            return "unmatched", None, f"receipt {rcpt} is for ₹{format_rupees(expected)}"
+        return "matched", key, rcpt
+    paid_at = parse_time(time_text)
+    if paid_at is None:
+        return "unmatched", None, "no receipt in note and no usable time"
+    found = index.candidates(paise, paid_at, window_s)
+    if len(found) == 1:
+        key, rcpt = found[0]
+        return ("already_paid" if key in index.paid else "matched"), key, rcpt
+    if found:
+        shown = ", ".join(r for _, r in found[:5]) + (" …" if len(found) > 5 else "")
+        return "ambiguous", None, f"{len(found)} bookings of ₹{format_rupees(paise)}: {shown}"
+    return "unmatched", None, f"no UPI booking of ₹{format_rupees(paise)} in the window"
+
+
+def reconcile_payments(db: Database, path: str, window_minutes: float = RECONCILE_WINDOW_MINUTES,
+                       batch_size: int = RECONCILE_BATCH_SIZE, dry_run: bool = False, on_issue=None) -> dict:
+    """Stream a bank/UPI statement CSV and mark the bookings it pays for as "Paid".
+
+    Unmatched and ambiguous lines go to on_issue(line_no, kind, reason, row).
+    Returns counts: lines, matched, already_paid, unmatched, ambiguous, duplicates, updated.
+    """
+    window_s = window_minutes * 60
+    index = load_payment_index(db, window_s)
+    counts = dict(lines=0, matched=0, already_paid=0, unmatched=0, ambiguous=0, duplicates=0, updated=0)
+    seen_refs = set()
+    pending = []
+    parse_time = StatementTimeParser()
+
+    def flush():
+        if pending and not dry_run:
+            counts["updated"] += mark_paid(db, pending)
+        pending.clear()
+
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        cols = statement_columns(reader.fieldnames or [])
+        for row in reader:
+            counts["lines"] += 1
+            ref = (row.get(cols["ref"]) or "").strip() if cols["ref"] else ""
+            if ref:
+                if ref in seen_refs:
+                    counts["duplicates"] += 1
+                    continue
+                seen_refs.add(ref)
+            kind, key, detail = match_statement_line(
+                index,
+                parse_statement_amount(row.get(cols["amount"]) or ""),
+                (row.get(cols["note"]) or "") if cols["note"] else "",
+                (row.get(cols["time"]) or "") if cols["time"] else "",
+                window_s,
+                parse_time,
+            )
+            counts[kind] += 1
+            if kind in ("matched", "already_paid"):
+                index.claimed.add(key)
+                if kind == "matched":
+                    pending.extend(index.ids[key])
+                    if len(pending) >= batch_size:
+                        flush()
+            elif on_issue:
+                on_issue(reader.line_num, kind, detail, row)
+    flush()
+    return counts
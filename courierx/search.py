@@ -0,0 +1,59 @@
+import re
+
+from sqlalchemy import column, func, literal_column, select, table
+
+from .db import Courier, Database
+
+# =========================
+# Full-text shipment search
+# =========================
+# Free text ("sharma karol bagh") against the couriers_fts index (see
+# courierx.db): every word must appear in a name or address; a word typed with
+# a trailing * matches as a prefix ("karol ba*"). Whole words are the default:
+# FTS5 answers a prefix longer than its prefix indexes (3 letters) by merging
+# the doclists of every term it matches first.
+#
+# BM25 is computed for every row it ranks, so only the newest SEARCH_CANDIDATES
+# matches are ranked (FTS5 walks matches by rowid = id, newest first, and stops
+# there); names weigh more than addresses. A common surname over millions of
+# shipments thus costs the same as a rare one.
+SEARCH_LIMIT = 50
+SEARCH_CANDIDATES = 2000
+# bm25() weights, in SEARCH_COLUMNS order: sender_name, receiver_name, sender_address, receiver_address
+SEARCH_WEIGHTS = (4.0, 4.0, 1.0, 1.0)
+
+_fts = table("couriers_fts", column("rowid"))
+_fts_match = literal_column("couriers_fts").op("MATCH")
+
+
+def fts_query(text: str) -> str:
+    """An FTS5 query matching every word of `text` ('' if it has none)."""
+    terms = []
+    for word, star in re.findall(r"(\w+)(\*?)", text.lower()):
+        terms.append(f'"{word}"*' if star and len(word) > 1 else f'"{word}"')
+    return " ".join(terms)
+
+
+def matching_ids(text: str):
+    """Subquery of the ids of every courier matching `text`, for use in IN (...)."""
+    return select(_fts.c.rowid).where(_fts_match(fts_query(text)))
+
+
+def search_shipments(db: Database, text: str, limit: int = SEARCH_LIMIT) -> list:
+    """The best `limit` couriers (detached) whose names/addresses contain every word of `text`."""
+    query = fts_query(text)
+    if not query:
+        return []
+    newest = (select(_fts.c.rowid).where(_fts_match(query))
+              .order_by(_fts.c.rowid.desc()).limit(1).offset(SEARCH_CANDIDATES - 1))
+    rank = func.bm25(literal_column("couriers_fts"), *SEARCH_WEIGHTS)
+
+    def search(s):
+        oldest = s.scalar(newest) or 0
+        best = (select(_fts.c.rowid.label("id"), rank.label("rank"))
+                .where(_fts_match(query), _fts.c.rowid >= oldest)
+                .order_by(rank, _fts.c.rowid.desc()).limit(limit).subquery())
+        return s.scalars(select(Courier).join(best, Courier.id == best.c.id)
+                         .order_by(best.c.rank, Courier.id.desc())).all()
+
+    return db.run(search)
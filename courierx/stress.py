@@ -0,0 +1,89 @@
+import os
+import random
+import subprocess
+import sys
+import time
+
+from sqlalchemy import select
+
+from .booking import Bookings, format_receiver_address, to_paise
+from .db import Courier, Database
+
+# =========================
+# Multi-terminal stress test
+# =========================
+# Each simulated terminal is its own `python -m courierx stress-terminal`
+# process, so they contend for couriers.db exactly like separate counters.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def stress_terminal(bookings: Bookings, count: int, terminal: int):
+    """Book like one counter would (insert, then payment update); print each receipt."""
+    started = time.time()
+    for i in range(count):
+        state = random.choice(["Punjab", "Kerala", "Delhi", "Bihar"])
+        weight = round(random.uniform(0.2, 20), 1)
+        price = bookings.quote(state, weight)
+        rcpt = bookings.book(dict(
+            sender_name=f"Terminal {terminal}", sender_address="Counter", sender_phone="9876543210",
+            sender_pincode="110001", receiver_name=f"Receiver {i}",
+            receiver_address=format_receiver_address(str(i), "Main Road", "Market", "City", state),
+            receiver_phone="9123456780", receiver_pincode="141001", weight=weight,
+            price_paise=to_paise(price), payment_method=None, payment_status="Pending",
+        ))
+        bookings.set_payment_method(rcpt, random.choice(["Google Pay", "Cash on Delivery"]), price)
+        print(rcpt)
+    print(f"#window {started} {time.time()} {bookings.db.lock_retries}")
+
+
+def fresh_database(db_path: str) -> Database:
+    """Delete db_path (and its WAL files) and create an empty, migrated database there."""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    db = Database(f"sqlite:///{os.path.abspath(db_path)}")
+    db.migrate()
+    return db
+
+
+def run_stress(terminals: int, count: int, db_path: str) -> int:
+    """Run `terminals` booking processes against one fresh database and audit the result."""
+    check_db = fresh_database(db_path)
+
+    env = dict(os.environ, COURIERX_DB_URL=check_db.url,
+               PYTHONPATH=os.pathsep.join(filter(None, [PROJECT_ROOT, os.environ.get("PYTHONPATH")])))
+    cmd = [sys.executable, "-m", "courierx", "stress-terminal", "--bookings", str(count)]
+    procs = [subprocess.Popen(cmd + ["--terminal", str(t)], stdout=subprocess.PIPE, text=True, env=env)
+             for t in range(terminals)]
+
+    issued, starts, ends, retries = [], [], [], 0
+    for p in procs:
+        out, _ = p.communicate()
+        for line in out.splitlines():
+            if line.startswith("#window"):
+                _, start, end, n = line.split()
+                starts.append(float(start))
+                ends.append(float(end))
+                retries += int(n)
+            elif line:
+                issued.append(line)
+    failed = [p.returncode for p in procs if p.returncode]
+
+    with check_db.engine.connect() as conn:
+        stored = [r[0] for r in conn.execute(select(Courier.receipt))]
+        unpaid = conn.execute(
+            select(Courier.receipt).where(Courier.payment_method.is_(None))
+        ).fetchall()
+    check_db.dispose()
+
+    elapsed = (max(ends) - min(starts)) if starts else 0.0
+    duplicated = len(issued) - len(set(issued)) + len(stored) - len(set(stored))
+    lost = len(set(issued) - set(stored))
+    print(f"{terminals} terminals x {count} bookings: {len(issued)} booked in {elapsed:.2f}s "
+          f"({len(issued) / elapsed if elapsed else 0:.0f} bookings/s, 2 transactions each), "
+          f"{retries} lock retries")
+    print(f"duplicated receipts: {duplicated}, lost bookings: {lost}, "
+          f"missing payment updates: {len(unpaid)}, failed terminals: {len(failed)}")
+    ok = not (duplicated or lost or unpaid or failed) and len(issued) == terminals * count
+    print("OK" if ok else "FAILED")
+    return 0 if ok else 1
@@ -0,0 +1,179 @@
+import csv
+from datetime import datetime
+from itertools import chain
+
+from sqlalchemy import insert, select
+
+from . import metrics
+from .db import Courier, Database, ShipmentEvent
+from .reconcile import RECEIPT_IN_NOTE, StatementTimeParser
+
+# =========================
+# Shipment tracking
+# =========================
+# Every scan is appended to shipment_events. A trigger (see courierx.db) moves
+# the booking's tracking_* columns to the newest scan, so "where is it now" is
+# one lookup by receipt, and a timeline reads just that receipt's events off
+# the (receipt, time) index. Scanner dumps are read in batches, each stored in
+# one transaction. A scan already in the log (same receipt, time and status) is
+# skipped, so posting the same timestamped dump twice changes nothing.
+TRACKING_STATUSES = ("Submitted", "Received at hub", "In transit", "Out for delivery", "Delivered", "Returned")
+TRACKING_BOOKED = "Submitted"  # shown until the first scan
+SCAN_BATCH_SIZE = 5000
+SCAN_COLUMNS = {  # dump header aliases, compared lower-case
+    "receipt": ["receipt", "receipt no", "receipt_no", "awb", "barcode", "code", "tracking number"],
+    "status": ["status", "event", "scan type"],
+    "location": ["location", "hub", "branch", "scanned at"],
+    "time": ["time", "timestamp", "scanned_at", "date/time", "date", "scan time"],
+}
+
+SCANS_TOTAL = metrics.counter("courierx_tracking_scans_total", "Tracking scans stored", source="dump")
+
+_STATUS_BY_KEY = {s.lower(): s for s in TRACKING_STATUSES}
+
+
+def tracking_status(text: str) -> str:
+    """The TRACKING_STATUSES spelling of text (any case); raises ValueError for anything else."""
+    status = _STATUS_BY_KEY.get(" ".join((text or "").split()).lower())
+    if status is None:
+        raise ValueError(f"status must be one of: {', '.join(TRACKING_STATUSES)}")
+    return status
+
+
+def status_text(c: Courier) -> str:
+    """A booking's current status for receipts and QR codes, e.g. "In transit, Nagpur hub (16 Oct 14:05)"."""
+    if not c.tracking_status:
+        return TRACKING_BOOKED
+    where = f", {c.tracking_location}" if c.tracking_location else ""
+    when = f" ({c.tracking_at:%d %b %H:%M})" if c.tracking_at else ""
+    return f"{c.tracking_status}{where}{when}"
+
+
+def current_status(db: Database, receipts: list) -> dict:
+    """receipt -> (status, location, scanned at) for each booked receipt; unscanned ones are TRACKING_BOOKED."""
+    query = (select(Courier.receipt, Courier.tracking_status, Courier.tracking_location, Courier.tracking_at)
+             .where(Courier.receipt.in_(set(receipts))))
+    return db.run(lambda s: {r: (status or TRACKING_BOOKED, loc, at) for r, status, loc, at in s.execute(query)})
+
+
+def timeline(db: Database, receipt_no: str) -> list:
+    """(scanned at, status, location) of every scan of receipt_no, oldest first."""
+    query = (select(ShipmentEvent.scanned_at, ShipmentEvent.status, ShipmentEvent.location)
+             .where(ShipmentEvent.receipt == receipt_no).order_by(ShipmentEvent.scanned_at))
+    return db.run(lambda s: [tuple(r) for r in s.execute(query)])
+
+
+def record_scans(db: Database, events: list) -> tuple:
+    """Store event dicts (receipt, status, location, scanned_at) in one transaction.
+
+    Returns (stored, unknown receipts). Scans of receipts with no booking are
+    not stored; scans already in the log are skipped.
+    """
+    if not events:
+        return 0, []
+
+    def write(s):
+        wanted = {e["receipt"] for e in events}
+        known = set(s.scalars(select(Courier.receipt).where(Courier.receipt.in_(wanted))))
+        rows = [e for e in events if e["receipt"] in known]
+        stored = s.execute(insert(ShipmentEvent.__table__).prefix_with("OR IGNORE"), rows).rowcount if rows else 0
+        return stored, sorted(wanted - known)
+
+    return db.run(write)
+
+
+def scan_columns(header: list):
+    """Map receipt/status/location/time to the dump's own column names, or None if it has no receipt column."""
+    by_lower = {h.strip().lower(): h for h in header if h}
+    cols = {key: next((by_lower[a] for a in aliases if a in by_lower), None) for key, aliases in SCAN_COLUMNS.items()}
+    return cols if cols["receipt"] else None
+
+
+def _scan_rows(f, parse_time):
+    """(line number, receipt text, status text, location text, time text) per scan in an open dump file.
+
+    A dump with a header row is read by column; otherwise each line is one
+    scan: the first receipt number anywhere on it (a scanned receipt QR carries
+    "Receipt: EM…"), and the first other field that reads as a time.
+    """
+    reader = csv.reader(f)
+    first = next(reader, None)
+    if first is None:
+        return
+    cols = scan_columns(first)
+    if cols:
+        pos = {key: first.index(name) if name else None for key, name in cols.items()}
+        for row in reader:
+            if not any(v.strip() for v in row):
+                continue
+            field = {key: (row[i].strip() if i is not None and i < len(row) else "") for key, i in pos.items()}
+            yield reader.line_num, field["receipt"], field["status"], field["location"], field["time"]
+        return
+    for row in chain([first], reader):
+        if not any(v.strip() for v in row):
+            continue
+        found = RECEIPT_IN_NOTE.search(",".join(row).upper())
+        if not found:
+            yield reader.line_num, ",".join(row), "", "", ""
+            continue
+        when = next((v for v in row if found.group() not in v.upper() and parse_time(v)), "")
+        yield reader.line_num, found.group(), "", "", when
+
+
+def ingest_scans(db: Database, path: str, status: str = None, location: str = None,
+                 batch_size: int = SCAN_BATCH_SIZE, on_error=None) -> dict:
+    """Stream a scanner dump (CSV with a header row, or one scan per line) into the tracking log.
+
+    status/location apply to scans whose dump doesn't give them (a hub posts
+    all its "In transit" scans at once); scans without a time get the time of
+    the import. Rejected lines go to on_error(line_no, message).
+    Returns counts: lines, stored, duplicates, rejected.
+    """
+    default_status = tracking_status(status) if status else None
+    now = datetime.now()
+    counts = dict(lines=0, stored=0, duplicates=0, rejected=0)
+    pending = []
+    parse_time = StatementTimeParser()
+
+    def reject(line_no, message):
+        counts["rejected"] += 1
+        if on_error:
+            on_error(line_no, message)
+
+    def flush():
+        stored, unknown = record_scans(db, [e for _, e in pending])
+        unknown = set(unknown)
+        for line_no, e in pending:
+            if e["receipt"] in unknown:
+                reject(line_no, f"No booking with receipt {e['receipt']}")
+        counts["stored"] += stored
+        counts["duplicates"] += sum(1 for _, e in pending if e["receipt"] not in unknown) - stored
+        SCANS_TOTAL.inc(stored)
+        pending.clear()
+
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for line_no, text, given_status, place, when in _scan_rows(f, parse_time):
+            counts["lines"] += 1
+            found = RECEIPT_IN_NOTE.search(text.upper())
+            if not found:
+                reject(line_no, f"No receipt number in {text[:40]!r}")
+                continue
+            try:
+                scan_status = tracking_status(given_status) if given_status else default_status
+            except ValueError as e:
+                reject(line_no, str(e))
+                continue
+            if scan_status is None:
+                reject(line_no, "No status (give one with the dump or as the default)")
+                continue
+            scanned_at = parse_time(when) if when else now
+            if scanned_at is None:
+                reject(line_no, f"Unreadable time {when!r}")
+                continue
+            pending.append((line_no, {"receipt": found.group(), "status": scan_status,
+                                      "location": place or location or None, "scanned_at": scanned_at}))
+            if len(pending) >= batch_size:
+                flush()
+    if pending:
+        flush()
+    return counts
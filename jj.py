@@ -1,41 +1,280 @@
-import serial
+import itertools
+import queue
+import sys
+import textwrap
+import threading
+import time
 from datetime import datetime
 
+import serial
+
+from courierx import metrics
+
+
+# =========================
+# ESC/POS encoding
+# =========================
+ESC = b'\x1b'
+GS = b'\x1d'
+INIT = ESC + b'@'
+LINE_WIDTH = 32  # characters per line on 58 mm paper (48 for 80 mm)
+
+# Python codec -> ESC t code page number (Epson numbering)
+CODEPAGES = {'cp437': 0, 'cp850': 2, 'cp860': 3, 'cp863': 4, 'cp865': 5, 'cp1252': 16, 'cp866': 17, 'cp858': 19}
+
+# Characters no ESC/POS code page carries, printed as plain text instead
+TRANSLITERATE = str.maketrans({'₹': 'Rs.', '—': '-', '–': '-', '‘': "'", '’': "'", '“': '"', '”': '"',
+                               '…': '...', '🏤': None, '📤': None, '📥': None, '✅': None})
+
+QR_ERROR_LEVELS = {'L': 48, 'M': 49, 'Q': 50, 'H': 51}
+# Byte-mode capacity of the largest QR (version 40) per error level; printers drop bigger symbols silently
+QR_MAX_BYTES = {'L': 2953, 'M': 2331, 'Q': 1663, 'H': 1273}
+
+PRINT_SECONDS = metrics.histogram('courierx_print_seconds', 'Printing one receipt, retries included')
+PRINT_JOBS = {status: metrics.counter('courierx_print_jobs_total', 'Receipts sent to the printer', status=status)
+              for status in ('printed', 'failed')}
+PRINT_RETRIES = metrics.counter('courierx_print_retries_total', 'Printer writes retried after an error')
+
+
+def encode_text(text, codepage='cp437'):
+    return text.translate(TRANSLITERATE).encode(codepage, errors='replace')
+
+
+def align(where):
+    return ESC + b'a' + bytes([{'left': 0, 'center': 1, 'right': 2}[where]])
+
+
+def bold(on):
+    return ESC + b'E' + bytes([1 if on else 0])
 
-def print_courier_receipt(data, port='COM3', baudrate=9600):
+
+def text_size(width=1, height=1):
+    return GS + b'!' + bytes([(width - 1) << 4 | (height - 1)])
+
+
+def select_codepage(codepage):
+    return ESC + b't' + bytes([CODEPAGES[codepage]])
+
+
+def _gs_k(fn, params):
+    """GS ( k <pL pH> cn=49 fn params: one 2D-symbol (QR) function."""
+    n = len(params) + 2
+    return GS + b'(k' + bytes([n & 0xFF, n >> 8, 49, fn]) + params
+
+
+def qr_code(payload, module_size=4, error_level='M'):
+    """Printer-native QR: model 2, module size, error correction, store data, print."""
+    data = payload.encode('utf-8')
+    if len(data) > QR_MAX_BYTES[error_level]:
+        raise ValueError(f'QR payload too long for the printer: {len(data)} bytes, '
+                         f'at most {QR_MAX_BYTES[error_level]} at error level {error_level}')
+    return (
+        _gs_k(65, bytes([50, 0]))                            # model 2
+        + _gs_k(67, bytes([module_size]))                     # module size in dots
+        + _gs_k(69, bytes([QR_ERROR_LEVELS[error_level]]))    # error correction level
+        + _gs_k(80, b'0' + data)                              # store the data
+        + _gs_k(81, b'0')                                     # print it
+    )
+
+
+def cut(feed_lines=3, partial=True):
+    """Feed feed_lines and cut (GS V 66/65 n)."""
+    return GS + b'V' + bytes([66 if partial else 65, feed_lines])
+
+
+def _field(label, value, width):
+    lines = textwrap.wrap(f'{label:<14}{value}', width, subsequent_indent=' ' * 14) or ['']
+    return '\n'.join(lines) + '\n'
+
+
+def escpos_receipt(data, codepage='cp437', width=LINE_WIDTH, printed_at=None):
     """
-    Prints a courier delivery receipt via serial thermal printer.
+    ESC/POS byte stream for a courier delivery receipt.
 
-    Parameters:
-    - data (dict): Dictionary with keys like 'sender', 'receiver', 'origin', 'destination', 'price', 'payment_mode'
-    - port (str): Serial port name (e.g., 'COM3')
-    - baudrate (int): Baud rate for the printer (default 9600)
+    The QR is drawn by the printer from data['qr'] (the same text receipt_wind
+    encodes), so only the payload crosses the serial line, not a bitmap.
     """
+    printed_at = printed_at or datetime.now()
+    rule = '-' * width + '\n'
+    body = (
+        rule
+        + f"Date: {printed_at.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+        + _field('Sender:', data.get('sender', 'N/A'), width)
+        + _field('Receiver:', data.get('receiver', 'N/A'), width)
+        + _field('Origin:', data.get('origin', 'N/A'), width)
+        + _field('Destination:', data.get('destination', 'N/A'), width)
+        + ''.join(('\n' if i == 0 else '') + _field(p['receipt'], p['detail'], width)
+                  for i, p in enumerate(data.get('parcels', ())))
+        + '\n'
+        + _field('Delivery Fee:', f"₹{data.get('price', '0.00')}", width)
+        + _field('Payment Mode:', data.get('payment_mode', 'N/A'), width)
+        + rule
+    )
+    out = INIT + select_codepage(codepage)
+    out += align('center') + bold(True) + text_size(1, 2) + encode_text('Courier Delivery Receipt\n', codepage)
+    out += text_size() + bold(False)
+    if data.get('receipt'):
+        out += encode_text(f"Receipt No: {data['receipt']}\n", codepage)
+    out += align('left') + encode_text(body, codepage)
+    if data.get('qr'):
+        out += align('center') + qr_code(data['qr']) + b'\n'
+    out += align('center') + encode_text('Thank you for choosing our service!\n', codepage)
+    return out + cut()
+
+
+def receipt_bytes(data, codepage='cp437'):
+    return escpos_receipt(data, codepage)
+
 
-    # Format receipt content
-    receipt = f"""
-    🏤 Courier Delivery Receipt
-    -----------------------------
-    Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-
-    Sender:      {data.get('sender', 'N/A')}
-    Receiver:    {data.get('receiver', 'N/A')}
-    Origin:      {data.get('origin', 'N/A')}
-    Destination: {data.get('destination', 'N/A')}
-
-    Delivery Fee: ₹{data.get('price', '0.00')}
-    Payment Mode: {data.get('payment_mode', 'N/A')}
-    -----------------------------
-    Thank you for choosing our service!
-    \n\n\n
+def print_courier_receipt(data, port='COM3', baudrate=9600, codepage='cp437'):
     """
+    Prints a courier delivery receipt via serial thermal printer.
+
+    Blocks until the receipt has been written; the GUI uses PrintSpooler instead.
 
+    Parameters:
+    - data (dict): Dictionary with keys like 'sender', 'receiver', 'origin', 'destination', 'price', 'payment_mode',
+      and optionally 'receipt', 'qr' (payload for the printer-native QR code) and 'parcels' (a consolidated
+      receipt's parcels, each a dict with 'receipt' and 'detail')
+    - port (str): Serial port name (e.g., 'COM3'), or a pyserial URL such as 'loop://'
+    - baudrate (int): Baud rate for the printer (default 9600)
+    - codepage (str): Printer code page for the text, one of CODEPAGES
+    """
     try:
         # Connect to serial printer
-        ser = serial.Serial(port, baudrate, timeout=1)
-        ser.write(receipt.encode('utf-8'))
-        ser.write(b'\n\n\n')  # Feed paper
-        ser.close()
+        with PRINT_SECONDS.time(port):
+            ser = serial.serial_for_url(port, baudrate, timeout=1)
+            ser.write(receipt_bytes(data, codepage))
+            ser.close()
+        PRINT_JOBS['printed'].inc()
         print("✅ Receipt sent to printer.")
     except Exception as e:
+        PRINT_JOBS['failed'].inc()
         print(f"❌ Failed to print receipt: {e}")
+
+
+class PrintJob:
+    """One queued receipt. status: queued -> printing -> printed, or retrying -> failed."""
+
+    def __init__(self, job_id, payload):
+        self.id = job_id
+        self.payload = payload
+        self.status = "queued"
+        self.attempts = 0
+        self.error = None
+        self.done = threading.Event()
+
+
+class PrintSpooler:
+    """
+    Prints receipts from a queue on a background thread over one persistent serial connection.
+
+    The port is opened on the first job and kept open. A failed write closes it,
+    waits retry_delay * attempt seconds and reconnects, up to `retries` attempts
+    per job. on_status(job) is called from the spooler thread on every status
+    change, so GUI callers should hand it over to their own thread.
+
+    Parameters:
+    - port (str): Serial port name (e.g., 'COM3') or pyserial URL ('loop://', '/dev/pts/3')
+    - baudrate (int): Baud rate for the printer (default 9600)
+    - codepage (str): Printer code page for the text, one of CODEPAGES
+    """
+
+    def __init__(self, port='COM3', baudrate=9600, retries=3, retry_delay=1.0, on_status=None, codepage='cp437'):
+        self.port = port
+        self.baudrate = baudrate
+        self.codepage = codepage
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.on_status = on_status
+        self._serial = None
+        self._queue = queue.Queue()
+        self._ids = itertools.count(1)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, data):
+        """Queue a receipt (dict as for print_courier_receipt, or raw bytes); returns its PrintJob."""
+        payload = data if isinstance(data, bytes) else receipt_bytes(data, self.codepage)
+        job = PrintJob(next(self._ids), payload)
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="print-spooler", daemon=True)
+                self._thread.start()
+        self._queue.put(job)
+        self._notify(job)
+        return job
+
+    def close(self, wait=True):
+        """Finish the queued jobs (if wait) and close the printer connection."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            if wait:
+                self._thread.join()
+        else:
+            self._disconnect()
+
+    def _notify(self, job):
+        if self.on_status:
+            try:
+                self.on_status(job)
+            except Exception as e:
+                print(f"[WARN] print status callback failed: {e}")
+
+    def _connect(self):
+        if self._serial is None or not self._serial.is_open:
+            self._serial = serial.serial_for_url(self.port, self.baudrate, timeout=1, write_timeout=30)
+        return self._serial
+
+    def _disconnect(self):
+        if self._serial is not None:
+            try:
+                self._serial.close()
+            except Exception:
+                pass
+            self._serial = None
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._disconnect()
+                return
+            job.status = "printing"
+            self._notify(job)
+            started = time.perf_counter()
+            for attempt in range(1, self.retries + 1):
+                job.attempts = attempt
+                try:
+                    ser = self._connect()
+                    ser.write(job.payload)
+                    ser.flush()
+                    job.status, job.error = "printed", None
+                    break
+                except Exception as e:  # SerialException, OSError, write timeouts
+                    self._disconnect()
+                    job.error = str(e)
+                    if attempt < self.retries:
+                        job.status = "retrying"
+                        PRINT_RETRIES.inc()
+                        self._notify(job)
+                        time.sleep(self.retry_delay * attempt)
+            else:
+                job.status = "failed"
+            PRINT_SECONDS.observe(time.perf_counter() - started, f"job {job.id} on {self.port}")
+            PRINT_JOBS[job.status].inc()
+            job.done.set()
+            self._notify(job)
+
+
+if __name__ == "__main__":
+    # Print a sample receipt through the spooler: python jj.py [PORT] [BAUD]
+    spooler = PrintSpooler(
+        sys.argv[1] if len(sys.argv) > 1 else 'COM3',
+        int(sys.argv[2]) if len(sys.argv) > 2 else 9600,
+        on_status=lambda job: print(f"job {job.id}: {job.status}" + (f" ({job.error})" if job.error else "")),
+    )
+    spooler.submit({'receipt': 'EMTEST0001', 'sender': 'Test Sender', 'receiver': 'Test Receiver',
+                    'origin': '110001', 'destination': '141001', 'price': '70.00',
+                    'payment_mode': 'Cash on Delivery', 'qr': 'Receipt: EMTEST0001'})
+    spooler.close()
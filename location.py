@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# =========================
+# Counter location (IP geolocation)
+# =========================
+# The counter doesn't move, so the provider is asked at most once per TTL: the
+# answer is kept in memory and in a small JSON file next to the app, so a
+# restarted terminal reuses it too. Lookups run on a worker thread through one
+# pooled requests.Session; lookup_async() hands back a Future for the GUI to poll.
+# The provider must answer with ipinfo.io-style JSON ("city", "region", "postal").
+
+LOCATION_URL = os.environ.get("COURIERX_LOCATION_URL", "https://ipinfo.io/json")
+LOCATION_TTL = float(os.environ.get("COURIERX_LOCATION_TTL", str(24 * 3600)))  # seconds
+LOCATION_CACHE_PATH = os.environ.get("COURIERX_LOCATION_CACHE", "location.cache.json")
+LOCATION_TIMEOUT = 4  # seconds, connect and read
+
+
+def make_session() -> requests.Session:
+    http = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=1)
+    http.mount("http://", adapter)
+    http.mount("https://", adapter)
+    return http
+
+
+def sender_address(loc: dict, find_pin=None) -> tuple:
+    """(address, pincode, known) for a lookup answer.
+
+    find_pin(pin) -> (district, state) or None, normally the pincode dataset's
+    lookup; its names are preferred to the provider's city/region. known is
+    None when there was nothing to look up.
+    """
+    pincode = loc.get("pincode", "")
+    match = find_pin(pincode) if pincode and find_pin else None
+    if match:
+        return ", ".join(p for p in match if p), pincode, True
+    address = f"{loc.get('city', '')}, {loc.get('state', '')}".strip(", ")
+    return address, pincode, (False if pincode and find_pin else None)
+
+
+class LocationLookup:
+    def __init__(self, url: str = LOCATION_URL, ttl: float = LOCATION_TTL,
+                 cache_path: str = LOCATION_CACHE_PATH, timeout: float = LOCATION_TIMEOUT,
+                 http: requests.Session = None):
+        self.url = url
+        self.ttl = ttl
+        self.cache_path = cache_path
+        self.timeout = timeout
+        self.http = http or make_session()
+        self._cached = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="location")
+        self._pending = None
+
+    # ---------- Cache ----------
+    def _fresh(self, entry) -> bool:
+        return (bool(entry) and entry.get("url") == self.url
+                and time.time() - float(entry.get("fetched_at", 0)) < self.ttl)
+
+    def cached(self):
+        """The last answer if it's younger than the TTL (memory first, then the cache file), else None."""
+        with self._lock:
+            if self._fresh(self._cached):
+                return self._cached
+        if not self.cache_path:
+            return None
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not self._fresh(entry):
+            return None
+        with self._lock:
+            self._cached = entry
+        return entry
+
+    def _store(self, entry: dict):
+        with self._lock:
+            self._cached = entry
+        if not self.cache_path:
+            return
+        tmp = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp, self.cache_path)
+        except OSError as e:
+            print(f"[WARN] Couldn't write {self.cache_path}: {e}")
+
+    # ---------- Lookup ----------
+    def fetch(self) -> dict:
+        """Ask the provider (blocking) and cache the answer: {'city', 'state', 'pincode', ...}."""
+        resp = self.http.get(self.url, timeout=self.timeout)
+        resp.raise_for_status()
+        data = resp.json()
+        entry = {
+            "city": data.get("city", "") or "",
+            "state": data.get("region", "") or "",
+            "pincode": str(data.get("postal", "") or "").strip(),
+            "url": self.url,
+            "fetched_at": time.time(),
+        }
+        self._store(entry)
+        return entry
+
+    def get(self, refresh: bool = False) -> dict:
+        if not refresh:
+            entry = self.cached()
+            if entry is not None:
+                return entry
+        return self.fetch()
+
+    def lookup_async(self, refresh: bool = False) -> Future:
+        """get() on the worker thread. Cached answers come back as a finished future,
+        and clicks while a request is in flight share that request."""
+        entry = None if refresh else self.cached()
+        if entry is not None:
+            done = Future()
+            done.set_result(entry)
+            return done
+        with self._lock:
+            if self._pending is None or self._pending.done():
+                self._pending = self._executor.submit(self.get, refresh)
+            return self._pending
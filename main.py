@@ -1,14 +1,22 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, font
-import random
-import string
-from sqlalchemy import create_engine, Column, Integer, String
-from sqlalchemy.orm import declarative_base, sessionmaker
-import pandas as pd
-import requests
-from PIL import Image, ImageTk
-import qrcode
+from tkinter import ttk, messagebox, filedialog, font
+import os
+import sys
+from PIL import ImageTk
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+import jj
+import location
+import qr_render
+from courierx import history, manifest, metrics, pincodes, search, tracking
+from courierx.booking import format_receiver_address, format_rupees, open_bookings, to_paise, validate_booking
+from courierx.bulk import IMPORT_FIELDS, book_parcels, shipment_from_row
+from courierx.cli import run_cli
+from courierx.db import Courier
 
 # Optional tooltip: idlelib may not be present in packaged environments
 try:
@@ -17,84 +25,134 @@ except Exception:
     Hovertip = None  # Fallback: no tooltips
 
 # =========================
-# Database
+# Core
 # =========================
-Base = declarative_base()
-engine = create_engine("sqlite:///couriers.db")
-Session = sessionmaker(bind=engine)
-session = Session()
+# Booking, pricing, receipt numbers and persistence live in the courierx
+# package; this module is only the Tk front end.
+if __name__ == "__main__" and len(sys.argv) > 1:
+    sys.exit(run_cli(sys.argv[1:]))
 
+# couriers.db (COURIERX_DB_URL) priced with rates.json (COURIERX_RATES); migrated once the window is up
+BOOKINGS = open_bookings(migrate=False)
+DB_READY = threading.Event()  # set once the migration succeeded
+_migration = {"step": None, "error": None}  # latest progress and failure, written by the worker
 
-class Courier(Base):
-    __tablename__ = "couriers"
-    id = Column(Integer, primary_key=True)
-    receipt = Column(String(20), unique=True)
 
-    sender_name = Column(String(100))
-    sender_address = Column(String(300))
-    sender_phone = Column(String(20))
-    sender_pincode = Column(String(10))
+def migrate_database():
+    try:
+        BOOKINGS.db.migrate(progress=lambda step, done, total: _migration.update(step=f"{step} {done:,}/{total:,}"))
+        DB_READY.set()
+    except Exception as e:
+        print(f"[WARN] Database migration failed: {e}")
+        _migration["error"] = e
+
 
-    receiver_name = Column(String(100))
-    receiver_address = Column(String(300))
-    receiver_phone = Column(String(20))
-    receiver_pincode = Column(String(10))
+def start_migration():
+    """Migrate couriers.db on a worker thread; booking and search stay disabled until it is done."""
+    for widget in DB_WIDGETS:
+        widget.state(["disabled"])
+    status_var.set("Updating database…")
+    threading.Thread(target=migrate_database, name="db-migrate", daemon=True).start()
+    root.after(100, _poll_migration)
 
-    # New fields we persist
-    weight = Column(String(10))
-    delivery_price = Column(String(10))
-    payment_method = Column(String(30))       # "Google Pay" / "Other UPI App" / "Cash on Delivery"
-    payment_status = Column(String(20))       # "Pending" / "Unverified" / "Paid"
+
+def _poll_migration():
+    if _migration["error"] is not None:
+        status_var.set("Database update failed")
+        messagebox.showerror("Database Error", f"Could not update the database:\n{_migration['error']}")
+        return
+    if not DB_READY.is_set():
+        if _migration["step"]:
+            status_var.set(f"Updating database… {_migration['step']}")
+        root.after(100, _poll_migration)
+        return
+    for widget in DB_WIDGETS:
+        widget.state(["!disabled"])
+    if PINCODES_READY.is_set():
+        status_var.set("Ready" if PINCODES is not None else "Pincode data unavailable")
+    else:
+        status_var.set("Loading pincode data…")
 
 
-Base.metadata.create_all(engine)
+# =========================
+# Auto location
+# =========================
+LOCATION = location.LocationLookup()  # COURIERX_LOCATION_URL / _TTL / _CACHE
 
 # =========================
 # Pincode CSV load (cached)
 # =========================
-PINCODES_DF = None
+PINCODES = None  # pincodes.PincodeTable once loaded
 COL_AREA = COL_PIN = COL_DIST = COL_STATE = None
+PINCODES_READY = threading.Event()  # set once loading finished (successfully or not)
+_pending_lookups = {}  # lookups queued behind the background load, latest per field
 
 
 def load_pincode_csv():
-    """Load India_pincode.csv with flexible column detection."""
-    global PINCODES_DF, COL_AREA, COL_PIN, COL_DIST, COL_STATE
+    """Load India_pincode.csv through its compact on-disk cache."""
+    global PINCODES, COL_AREA, COL_PIN, COL_DIST, COL_STATE
     try:
-        PINCODES_DF = pd.read_csv("India_pincode.csv", low_memory=False)
-        PINCODES_DF.columns = [c.strip() for c in PINCODES_DF.columns]
-
-        def find_col(candidates):
-            cols_norm = {c: c.strip().lower().replace(" ", "").replace("_", "") for c in PINCODES_DF.columns}
-            for c, n in cols_norm.items():
-                if n in candidates:
-                    return c
-            return None
-
-        # Try common variants
-        COL_AREA = find_col({"area", "locality", "officename", "village", "location", "place", "areaname"})
-        COL_PIN = find_col({"pincode", "pin", "postcode", "zipcode", "pincodeno", "pincodenumber"})
-        if COL_PIN is None:
-            for c in PINCODES_DF.columns:
-                if c.strip().lower() in ("pin code", "pin-code", "pin code number", "p.o.pincode"):
-                    COL_PIN = c
-                    break
-
-        # District / City
-        for c in PINCODES_DF.columns:
-            if c.strip().lower() in ("district"):
-                COL_DIST = c
-                break
-
-        # State
-        for c in PINCODES_DF.columns:
-            if c.strip().lower() in ("state", "statename"):
-                COL_STATE = c
-                break
+        table = pincodes.load("India_pincode.csv")
+        cols = table.columns
+        COL_AREA, COL_PIN, COL_DIST, COL_STATE = cols["area"], cols["pin"], cols["district"], cols["state"]
+        PINCODES = table
     except Exception as e:
         print(f"[WARN] Failed to load India_pincode.csv: {e}")
+    finally:
+        PINCODES_READY.set()
+
+
+def start_pincode_load():
+    """Load the dataset on a worker thread; the Tk thread polls for completion."""
+    if DB_READY.is_set():
+        status_var.set("Loading pincode data…")
+    threading.Thread(target=load_pincode_csv, name="pincode-load", daemon=True).start()
+    root.after(50, _poll_pincode_load)
+
+
+def _poll_pincode_load():
+    if not PINCODES_READY.is_set():
+        root.after(50, _poll_pincode_load)
+        return
+    if DB_READY.is_set():  # otherwise the migration status stays up
+        status_var.set("Ready" if PINCODES is not None else "Pincode data unavailable")
+    pending = list(_pending_lookups.values())
+    _pending_lookups.clear()
+    for lookup in pending:
+        lookup()
+
+
+def queue_until_loaded(key: str, lookup) -> bool:
+    """Queue lookup behind the background load; False if the dataset is already loaded."""
+    if PINCODES_READY.is_set():
+        return False
+    _pending_lookups[key] = lookup
+    status_var.set("Loading pincode data… (lookup will finish when ready)")
+    return True
+
+
+def _timed_lookup(op: str, lookup, arg):
+    with pincodes.LOOKUP_SECONDS[op].time(arg):
+        result = lookup(arg)
+    if not result:
+        pincodes.LOOKUP_MISSES[op].inc()
+    return result
+
+
+def find_area_matches(area: str) -> list:
+    """All (district, state, pincode) candidates for an area name, in CSV order."""
+    return _timed_lookup("find_area", PINCODES.find_area, area) if PINCODES is not None else []
+
+
+def find_area_suggestions(text: str) -> list:
+    """Typeahead completions for a partially typed (possibly misspelt) area name."""
+    return _timed_lookup("suggest", PINCODES.suggest_areas, text) if PINCODES is not None else []
 
 
-load_pincode_csv()
+def find_pin(pin: str):
+    """(district, state) for a PIN, or None if it isn't in the dataset (or the dataset isn't loaded)."""
+    return _timed_lookup("find_pin", PINCODES.find_pin, pin) if PINCODES is not None else None
+
 
 # =========================
 # Helpers
@@ -155,52 +213,98 @@ def get_value(entry: ttk.Entry) -> str:
 
 
 def get_current_location():
-    """Fill sender address and pincode using IP geolocation (best-effort)."""
-    set_entry_text(entry_sender_address, "")
-    set_entry_text(entry_pincode_sender, "")
-    try:
-        resp = requests.get("https://ipinfo.io/json", timeout=4)
-        data = resp.json()
-        city = data.get("city", "") or ""
-        state = data.get("region", "") or ""
-        pincode = data.get("postal", "") or ""
-        loc = f"{city}, {state}".strip(", ")
-        set_entry_text(entry_sender_address, loc)
-        set_entry_text(entry_pincode_sender, pincode)
-    except Exception as e:
-        messagebox.showwarning("Location", f"Couldn't fetch location automatically.\n{e}")
+    """Fill sender address and pincode using IP geolocation (best-effort, off the Tk thread)."""
+    future = LOCATION.lookup_async()
+    if not future.done():
+        status_var.set("Looking up location…")
+        btn_auto_location.state(["disabled"])
+
+    def poll():
+        if not future.done():
+            root.after(50, poll)
+            return
+        btn_auto_location.state(["!disabled"])
+        if future.exception():
+            status_var.set("Ready")
+            messagebox.showwarning("Location", f"Couldn't fetch location automatically.\n{future.exception()}")
+        else:
+            fill_sender_location(future.result())
 
+    poll()
 
-def validate_phone(P: str) -> bool:
-    return P == "" or (P.isdigit() and len(P) <= 10)
+
+def fill_sender_location(loc: dict):
+    """Put a location lookup into the sender fields, preferring the pincode dataset's names for its PIN."""
+    if queue_until_loaded("sender_location", lambda: fill_sender_location(loc)):
+        return
+    address, pincode, known = location.sender_address(loc, find_pin)
+    set_entry_text(entry_sender_address, address)
+    set_entry_text(entry_pincode_sender, pincode)
+    if pincode and PINCODES is not None:
+        mark_pin_entry(entry_pincode_sender, bool(known), pincode)
+    if known or not pincode:
+        status_var.set("Ready")
 
 
-def phn_is_valid(number: str) -> bool:
-    return number.isdigit() and len(number) == 10 and number[0] in "6789"
+def validate_phone(P: str) -> bool:
+    return P == "" or (P.isdigit() and len(P) <= 10)
 
 
 def validate_pincode(P: str) -> bool:
     return P == "" or (P.isdigit() and len(P) <= 6)
 
 
-def normalize_pin_value(val) -> str:
-    s = str(val).strip()
-    if "." in s:  # CSV sometimes has floats
-        s = s.split(".", 1)[0]
-    return s
+def pick_area_match(area: str, matches: list):
+    """Return the only match, or let the operator pick when an area has several PINs."""
+    if len(matches) <= 1:
+        return matches[0] if matches else None
+
+    chosen = [None]
+    win = tk.Toplevel(root)
+    win.title(f"Select PIN for {area}")
+    win.geometry("420x320")
+    win.transient(root)
+
+    ttk.Label(win, text=f"'{area}' matches {len(matches)} pincodes:").pack(anchor="w", padx=10, pady=(10, 5))
+    listbox = tk.Listbox(win, font=("Helvetica", 11), activestyle="dotbox")
+    listbox.pack(fill="both", expand=True, padx=10)
+    for dist, state, pin in matches:
+        listbox.insert(tk.END, f"{pin}  —  {dist}, {state}")
+    listbox.selection_set(0)
+
+    def on_ok(_=None):
+        sel = listbox.curselection()
+        if sel:
+            chosen[0] = matches[sel[0]]
+        win.destroy()
+
+    listbox.bind("<Double-Button-1>", on_ok)
+    listbox.bind("<Return>", on_ok)
+    btns = ttk.Frame(win)
+    btns.pack(pady=8)
+    ttk.Button(btns, text="OK", command=on_ok).pack(side="left", padx=5)
+    ttk.Button(btns, text="Cancel", command=win.destroy).pack(side="left", padx=5)
+
+    listbox.focus_set()
+    win.grab_set()
+    win.wait_window()
+    return chosen[0]
 
 
 def info_sender(area: str):
     """Lookup sender pincode by area name."""
     set_entry_text(entry_pincode_sender, "")
-    if PINCODES_DF is None or not COL_AREA or not COL_PIN:
+    if queue_until_loaded("sender", lambda: info_sender(area)):
+        return
+    if PINCODES is None or not COL_AREA or not COL_PIN:
         messagebox.showinfo("Not Found", "Pincode data not loaded or columns missing.")
         return
-    area = (area or "").strip().lower()
-    matched_rows = PINCODES_DF[PINCODES_DF[COL_AREA].fillna("").str.strip().str.lower() == area]
-    if not matched_rows.empty:
-        pincode1 = normalize_pin_value(matched_rows.iloc[0][COL_PIN])
-        set_entry_text(entry_pincode_sender, pincode1)
+    area = pincodes.normalize_area(area)
+    matches = find_area_matches(area)
+    if matches:
+        match = pick_area_match(area, matches)
+        if match:
+            set_entry_text(entry_pincode_sender, match[2])
     else:
         messagebox.showinfo("Not Found", f"No match found for sender area: {area}")
 
@@ -209,46 +313,107 @@ def info_receiver(area: str):
     set_entry_text(entry_city, "")
     set_entry_text(entry_state, "")
     set_entry_text(entry_pincode, "")
-    if PINCODES_DF is None or not COL_AREA or not COL_PIN:
+    if queue_until_loaded("receiver", lambda: info_receiver(area)):
+        return
+    if PINCODES is None or not COL_AREA or not COL_PIN:
         messagebox.showinfo("Not Found", "Pincode data not loaded or columns missing.")
         return
-    area = (area or "").strip().lower()
-    matched_rows = PINCODES_DF[PINCODES_DF[COL_AREA].fillna("").str.strip().str.lower() == area]
-    if not matched_rows.empty:
-        row = matched_rows.iloc[0]
+    area = pincodes.normalize_area(area)
+    matches = find_area_matches(area)
+    if matches:
+        match = pick_area_match(area, matches)
+        if not match:
+            return
+        dist, state, pin = match
         if COL_DIST:
-            set_entry_text(entry_city, str(row[COL_DIST]).strip())
+            set_entry_text(entry_city, dist)
         if COL_STATE:
-            set_entry_text(entry_state, str(row[COL_STATE]).strip())
-        set_entry_text(entry_pincode, normalize_pin_value(row[COL_PIN]))
+            set_entry_text(entry_state, state)
+        set_entry_text(entry_pincode, pin)
     else:
         messagebox.showinfo("Not Found", f"No match found for receiver area: {area}")
 
 
-def calculate_delivery_price(state: str, weight: float) -> float:
-    state = (state or "").strip().lower()
-    preferred_states = {"haryana", "punjab", "uttar pradesh", "delhi", "rajasthan", "himachal pradesh"}
-    state_aliases = {"up": "uttar pradesh", "hp": "himachal pradesh"}
-    state = state_aliases.get(state, state)
-    rate = 70 if state in preferred_states else 120
-    return round(rate * float(weight), 2)
+def mark_pin_entry(entry: ttk.Entry, known: bool, pin: str):
+    entry.configure(foreground="black" if known else "red")
+    if not known:
+        status_var.set(f"PIN {pin} not found in pincode data")
+
+
+def info_pincode_sender(pin: str):
+    """Validate the sender PIN and, if the address is still empty, fill district/state."""
+    if queue_until_loaded("sender_pin", lambda: info_pincode_sender(pin)):
+        return
+    if PINCODES is None:
+        return
+    match = find_pin(pin)
+    mark_pin_entry(entry_pincode_sender, match is not None, pin)
+    if match and not get_value(entry_sender_address):
+        set_entry_text(entry_sender_address, ", ".join(p for p in match if p))
+
+
+def info_pincode_receiver(pin: str):
+    """Validate the receiver PIN and fill city/state from it."""
+    if queue_until_loaded("receiver_pin", lambda: info_pincode_receiver(pin)):
+        return
+    if PINCODES is None:
+        return
+    match = find_pin(pin)
+    mark_pin_entry(entry_pincode, match is not None, pin)
+    if match:
+        dist, state = match
+        if dist:
+            set_entry_text(entry_city, dist)
+        if state:
+            set_entry_text(entry_state, state)
+
+
+# ---------- QR display ----------
+_qr_photos = qr_render.LRUCache(32)  # (payload, size) -> ImageTk.PhotoImage, Tk thread only
+
+
+def qr_photo(payload: str, size: int) -> ImageTk.PhotoImage:
+    key = (payload, size)
+    photo = _qr_photos.get(key)
+    if photo is None:
+        photo = ImageTk.PhotoImage(qr_render.qr_image(payload, size))
+        _qr_photos.put(key, photo)
+    return photo
+
+
+def show_qr(label: tk.Label, payload: str, size: int):
+    """Put the QR into label, rendering it on the worker thread if it isn't cached yet."""
+    def set_photo():
+        photo = qr_photo(payload, size)
+        label.configure(image=photo, text="")
+        label.image = photo
+
+    if (payload, size) in _qr_photos or qr_render.is_cached(payload, size):
+        set_photo()
+        return
+
+    label.configure(text="Generating QR…")
+    future = qr_render.render_async(payload, size)
 
+    def poll():
+        if not label.winfo_exists():
+            return
+        if not future.done():
+            label.after(20, poll)
+        elif future.exception():
+            label.configure(text=f"QR unavailable: {future.exception()}")
+        else:
+            set_photo()
 
-def generate_receipt(prefix: str = "EM", length: int = 10) -> str:
-    chars = string.ascii_uppercase + string.digits
-    while True:
-        random_part = ''.join(random.choices(chars, k=length - len(prefix)))
-        rcpt = prefix + random_part
-        existing = session.query(Courier).filter_by(receipt=rcpt).first()
-        if not existing:
-            return rcpt
+    poll()
 
 
-def payment(amount_float):
+def payment(amount_float, receipt_no: str = None):
     """Open a QR payment window for UPI."""
     upi_id = "jigerjeet@upi"
     payee_name = "Jigerjeet"
-    note = "Courier Payment"
+    # The receipt in the note lets `main.py reconcile` match the bank statement line
+    note = f"Courier {receipt_no}" if receipt_no else "Courier Payment"
 
     try:
         amount = float(amount_float)
@@ -256,7 +421,6 @@ def payment(amount_float):
         amount = 0.0
 
     upi_url = f"upi://pay?pa={upi_id}&pn={payee_name}&am={amount:.2f}&cu=INR&tn={note}"
-    qr_img = qrcode.make(upi_url)
 
     root_payment = tk.Toplevel(root)
     root_payment.title("UPI Payment - Courier Checkout")
@@ -271,11 +435,9 @@ def payment(amount_float):
     tk.Label(root_payment, text=f"Pay ₹{amount:.2f} to {payee_name}", font=label_font, bg="#f0f4f7", fg="#555").pack(
         pady=(0, 10))
 
-    qr_img_resized = qr_img.resize((200, 200))
-    qr_photo = ImageTk.PhotoImage(qr_img_resized)
-    qr_label = tk.Label(root_payment, image=qr_photo, bg="#f0f4f7")
-    qr_label.image = qr_photo
+    qr_label = tk.Label(root_payment, bg="#f0f4f7")
     qr_label.pack(pady=10)
+    show_qr(qr_label, upi_url, 200)
 
     timer_label = tk.Label(root_payment, text="", font=timer_font, fg="red", bg="#f0f4f7")
     timer_label.pack(pady=(5, 10))
@@ -299,6 +461,379 @@ def payment(amount_float):
               command=root_payment.destroy).pack()
 
 
+# ---------- Shipment history ----------
+# The Treeview never holds more than HISTORY_MAX_ROWS rows: pages are fetched
+# (keyset, see courierx.history) on a worker thread as the operator nears either
+# end, and rows scrolled far out of view are dropped again.
+HISTORY_MAX_ROWS = 5 * history.HISTORY_PAGE_SIZE
+HISTORY_COLUMNS = (  # (column, heading, width, sort key or None)
+    ("receipt", "Receipt", 105, "receipt"),
+    ("booked", "Booked", 135, "created_at"),
+    ("sender", "Sender", 120, None),
+    ("sender_phone", "Sender Phone", 100, "sender_phone"),
+    ("receiver", "Receiver", 120, None),
+    ("receiver_phone", "Receiver Phone", 100, "receiver_phone"),
+    ("pin", "PIN", 65, "receiver_pincode"),
+    ("weight", "Kg", 50, None),
+    ("price", "Price", 70, None),
+    ("status", "Payment", 85, "payment_status"),
+)
+_history_pages = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-pages")
+_history_counts = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-count")
+
+
+def history_values(row) -> tuple:
+    (_, rcpt, created_at, sender, sender_phone, receiver, receiver_phone, pin, weight, paise, _,
+     status) = row
+    return (rcpt, created_at.strftime("%Y-%m-%d %H:%M") if created_at else "", sender, sender_phone, receiver,
+            receiver_phone, pin, f"{weight:g}" if weight is not None else "", format_rupees(paise),
+            status or "Pending")
+
+
+def history_window():
+    """Browse every shipment, newest first; sort by a column heading, filter, and double-click to reopen."""
+    win = tk.Toplevel(root)
+    win.title("Shipment History")
+    win.geometry("1100x560")
+
+    bar = ttk.Frame(win, padding=10)
+    bar.pack(fill="x")
+    field_var = tk.StringVar(value="All shipments")
+    ttk.Combobox(bar, textvariable=field_var, values=["All shipments", *history.HISTORY_FILTERS],
+                 state="readonly", width=16).pack(side="left")
+    query_entry = ttk.Entry(bar, width=30)
+    query_entry.pack(side="left", padx=8)
+    info_var = tk.StringVar(value="")
+    ttk.Label(bar, textvariable=info_var).pack(side="right")
+
+    body = ttk.Frame(win)
+    body.pack(fill="both", expand=True, padx=10, pady=(0, 4))
+    tree = ttk.Treeview(body, columns=[c[0] for c in HISTORY_COLUMNS], show="headings", selectmode="browse")
+    scroll = ttk.Scrollbar(body, orient="vertical", command=tree.yview)
+    scroll.pack(side="right", fill="y")
+    tree.pack(side="left", fill="both", expand=True)
+    ttk.Label(win, text="Click a heading to sort. Double-click or Enter opens the receipt.",
+              foreground="gray").pack(anchor="w", padx=10, pady=(0, 8))
+
+    state = {"sort": "id", "desc": True, "field": None, "value": "", "gen": 0, "loading": False,
+             "at_start": True, "at_end": False, "count": None, "fetch_ms": 0.0}
+    keys = deque()  # (sort value, id) of each row in the tree, top to bottom
+
+    def show_info():
+        count = state["count"]
+        total = "counting…" if count is None else f"{count:,} shipment(s)"
+        info_var.set(f"{total} · page fetched in {state['fetch_ms']:.0f} ms")
+
+    def set_headings():
+        for col, text, width, sort in HISTORY_COLUMNS:
+            arrow = (" ▼" if state["desc"] else " ▲") if sort == state["sort"] else ""
+            tree.heading(col, text=text + arrow, command=(lambda s=sort: sort_by(s)) if sort else "")
+            tree.column(col, width=width, anchor="w")
+
+    def run_page(backward: bool):
+        after = (keys[0] if backward else keys[-1]) if keys else None
+        started = time.perf_counter()
+        rows = history.fetch_page(BOOKINGS.db, state["sort"], state["desc"], state["field"], state["value"],
+                                  after=after, backward=backward)
+        return rows, (time.perf_counter() - started) * 1000
+
+    def load(backward: bool = False):
+        if state["loading"] or state["at_start" if backward else "at_end"]:
+            return
+        state["loading"] = True
+        gen = state["gen"]
+        future = _history_pages.submit(run_page, backward)
+
+        def poll():
+            if not win.winfo_exists() or gen != state["gen"]:
+                return
+            if not future.done():
+                win.after(15, poll)
+                return
+            state["loading"] = False
+            if future.exception() is not None:
+                messagebox.showerror("Error", f"Could not load shipments:\n{future.exception()}", parent=win)
+                return
+            rows, state["fetch_ms"] = future.result()
+            add_rows(rows, backward)
+            show_info()
+
+        poll()
+
+    def add_rows(rows: list, backward: bool):
+        items = tree.get_children()
+        n = len(items)
+        top = round(tree.yview()[0] * n) if n else 0
+        if len(rows) < history.HISTORY_PAGE_SIZE:
+            state["at_start" if backward else "at_end"] = True
+        new_keys = [history.row_key(r, state["sort"]) for r in rows]
+        if backward:
+            for r in reversed(rows):
+                tree.insert("", 0, values=history_values(r))
+            keys.extendleft(reversed(new_keys))
+            top += len(rows)
+            excess = len(keys) - HISTORY_MAX_ROWS
+            if excess > 0:
+                tree.delete(*tree.get_children()[-excess:])
+                for _ in range(excess):
+                    keys.pop()
+                state["at_end"] = False
+        else:
+            for r in rows:
+                tree.insert("", tk.END, values=history_values(r))
+            keys.extend(new_keys)
+            excess = len(keys) - HISTORY_MAX_ROWS
+            if excess > 0:
+                tree.delete(*tree.get_children()[:excess])
+                for _ in range(excess):
+                    keys.popleft()
+                state["at_start"] = False
+                top -= excess
+        if keys and (backward or n):
+            tree.yview_moveto(max(0, top) / len(keys))
+
+    def on_scroll(first, last):
+        scroll.set(first, last)
+        if float(last) > 0.85:
+            load()
+        elif float(first) < 0.15:
+            load(backward=True)
+
+    def reload():
+        state["gen"] += 1
+        state.update(loading=False, at_start=True, at_end=False, count=None)
+        tree.delete(*tree.get_children())
+        keys.clear()
+        set_headings()
+        show_info()
+        gen = state["gen"]
+        count = _history_counts.submit(history.count_rows, BOOKINGS.db, state["field"], state["value"])
+
+        def poll_count():
+            if not win.winfo_exists() or gen != state["gen"]:
+                return
+            if not count.done():
+                win.after(50, poll_count)
+            elif count.exception() is None:
+                state["count"] = count.result()
+                show_info()
+
+        poll_count()
+        load()
+
+    def apply_filter(_=None):
+        field = field_var.get()
+        value = query_entry.get().strip()
+        if field == "Booked on" and value:
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                messagebox.showerror("Invalid date", "Enter the booking date as YYYY-MM-DD.", parent=win)
+                return
+        state["field"] = None if field == "All shipments" else field
+        state["value"] = value
+        reload()
+
+    def sort_by(sort: str):
+        state["desc"] = not state["desc"] if sort == state["sort"] else False
+        state["sort"] = sort
+        reload()
+
+    def open_selected(_=None):
+        sel = tree.selection()
+        if sel:
+            receipt_wind(tree.set(sel[0], "receipt"))
+
+    def newest_first():
+        state.update(sort="id", desc=True)
+        reload()
+
+    tree.configure(yscrollcommand=on_scroll)
+    ttk.Button(bar, text="Apply", command=apply_filter).pack(side="left")
+    ttk.Button(bar, text="Newest first", command=newest_first).pack(side="left", padx=8)
+    query_entry.bind("<Return>", apply_filter)
+    tree.bind("<Double-1>", open_selected)
+    tree.bind("<Return>", open_selected)
+    reload()
+    query_entry.focus_set()
+
+
+# ---------- Find by name / address ----------
+def find_window(text: str = ""):
+    """Best full-text matches for a name/address query (courierx.search); double-click opens the receipt."""
+    win = tk.Toplevel(root)
+    win.title("Find Shipment")
+    win.geometry("1100x460")
+
+    bar = ttk.Frame(win, padding=10)
+    bar.pack(fill="x")
+    query_entry = ttk.Entry(bar, width=40)
+    query_entry.pack(side="left")
+    query_entry.insert(0, text)
+    info_var = tk.StringVar(value="")
+    ttk.Label(bar, textvariable=info_var).pack(side="right")
+
+    body = ttk.Frame(win)
+    body.pack(fill="both", expand=True, padx=10, pady=(0, 4))
+    tree = ttk.Treeview(body, columns=[c[0] for c in HISTORY_COLUMNS], show="headings", selectmode="browse")
+    scroll = ttk.Scrollbar(body, orient="vertical", command=tree.yview)
+    tree.configure(yscrollcommand=scroll.set)
+    scroll.pack(side="right", fill="y")
+    tree.pack(side="left", fill="both", expand=True)
+    for col, heading, width, _ in HISTORY_COLUMNS:
+        tree.heading(col, text=heading)
+        tree.column(col, width=width, anchor="w")
+    ttk.Label(win, text="Every word must match a name or address; end a word with * to match its start "
+                        "(karol ba*). Double-click or Enter opens the receipt.",
+              foreground="gray").pack(anchor="w", padx=10, pady=(0, 8))
+    state = {"gen": 0}
+
+    def run_search(query: str):
+        started = time.perf_counter()
+        found = search.search_shipments(BOOKINGS.db, query)
+        return found, (time.perf_counter() - started) * 1000
+
+    def find(_=None):
+        query = query_entry.get().strip()
+        if not search.fts_query(query):
+            return
+        state["gen"] += 1
+        gen = state["gen"]
+        info_var.set("Searching…")
+        future = _history_pages.submit(run_search, query)
+
+        def poll():
+            if not win.winfo_exists() or gen != state["gen"]:
+                return
+            if not future.done():
+                win.after(15, poll)
+                return
+            if future.exception() is not None:
+                info_var.set("")
+                messagebox.showerror("Error", f"Search failed:\n{future.exception()}", parent=win)
+                return
+            found, ms = future.result()
+            tree.delete(*tree.get_children())
+            for c in found:
+                tree.insert("", tk.END, values=history_values([getattr(c, col.key) for col in history.HISTORY_COLUMNS]))
+            info_var.set(f"{len(found)} best match(es) in {ms:.0f} ms")
+
+        poll()
+
+    def open_selected(_=None):
+        sel = tree.selection()
+        if sel:
+            receipt_wind(tree.set(sel[0], "receipt"))
+
+    ttk.Button(bar, text="Find", command=find).pack(side="left", padx=8)
+    query_entry.bind("<Return>", find)
+    tree.bind("<Double-1>", open_selected)
+    tree.bind("<Return>", open_selected)
+    query_entry.focus_set()
+    find()
+
+
+# ---------- Dispatch manifest ----------
+def manifest_window():
+    """Per-bag totals of a day's parcels (courierx.manifest), exported as CSV or a printable sheet."""
+    win = tk.Toplevel(root)
+    win.title("Dispatch Manifest")
+    win.geometry("760x520")
+
+    bar = ttk.Frame(win, padding=10)
+    bar.pack(fill="x")
+    ttk.Label(bar, text="Booked on:").pack(side="left")
+    date_entry = ttk.Entry(bar, width=12)
+    date_entry.pack(side="left", padx=(4, 12))
+    date_entry.insert(0, date.today().isoformat())
+    ttk.Label(bar, text="Bags by:").pack(side="left")
+    group_box = ttk.Combobox(bar, values=manifest.MANIFEST_GROUPS, state="readonly", width=10)
+    group_box.set("district")
+    group_box.pack(side="left", padx=4)
+    info_var = tk.StringVar(value="")
+    ttk.Label(bar, textvariable=info_var).pack(side="right")
+
+    body = ttk.Frame(win)
+    body.pack(fill="both", expand=True, padx=10)
+    columns = [("bag", "Bag", 340, "w"), ("parcels", "Parcels", 80, "e"), ("kg", "Weight (kg)", 110, "e"),
+               ("price", "Price (₹)", 130, "e")]
+    tree = ttk.Treeview(body, columns=[c[0] for c in columns], show="headings")
+    scroll = ttk.Scrollbar(body, orient="vertical", command=tree.yview)
+    tree.configure(yscrollcommand=scroll.set)
+    scroll.pack(side="right", fill="y")
+    tree.pack(side="left", fill="both", expand=True)
+    for col, heading, width, anchor in columns:
+        tree.heading(col, text=heading)
+        tree.column(col, width=width, anchor=anchor)
+    actions = ttk.Frame(win, padding=10)
+    actions.pack(fill="x")
+    state = {"gen": 0}
+
+    def chosen():
+        try:
+            day = date.fromisoformat(date_entry.get().strip())
+        except ValueError:
+            messagebox.showerror("Invalid date", "Enter the booking date as YYYY-MM-DD.", parent=win)
+            return None
+        return day, group_box.get()
+
+    def build(day, group, csv_path, sheet_path):
+        if group != "prefix":
+            PINCODES_READY.wait()
+            if PINCODES is not None:
+                manifest.sync_pin_regions(BOOKINGS.db, PINCODES)
+        return manifest.write_manifest(BOOKINGS.db, day, group, csv_path, sheet_path)
+
+    def run(csv_path=None, sheet_path=None):
+        picked = chosen()
+        if picked is None:
+            return
+        day, group = picked
+        state["gen"] += 1
+        gen = state["gen"]
+        info_var.set("Writing…" if csv_path or sheet_path else "Totalling…")
+        future = _history_pages.submit(build, day, group, csv_path, sheet_path)
+
+        def poll():
+            if not win.winfo_exists() or gen != state["gen"]:
+                return
+            if not future.done():
+                win.after(50, poll)
+                return
+            if future.exception() is not None:
+                info_var.set("")
+                messagebox.showerror("Error", f"Manifest failed:\n{future.exception()}", parent=win)
+                return
+            totals = future.result()
+            tree.delete(*tree.get_children())
+            for bag, parcels, kg, paise in totals:
+                tree.insert("", tk.END, values=(manifest.bag_label(group, bag), parcels, f"{kg:.2f}",
+                                                format_rupees(paise)))
+            info_var.set(f"{sum(t[1] for t in totals)} parcel(s) in {len(totals)} bag(s)"
+                         + (f" — saved {os.path.basename(csv_path or sheet_path)}" if csv_path or sheet_path else ""))
+
+        poll()
+
+    def export_csv():
+        path = filedialog.asksaveasfilename(parent=win, defaultextension=".csv", filetypes=[("CSV", "*.csv")],
+                                            initialfile=f"manifest-{date_entry.get().strip()}.csv")
+        if path:
+            run(csv_path=path)
+
+    def save_sheet():
+        path = filedialog.asksaveasfilename(parent=win, defaultextension=".txt", filetypes=[("Text", "*.txt")],
+                                            initialfile=f"manifest-{date_entry.get().strip()}.txt")
+        if path:
+            run(sheet_path=path)
+
+    ttk.Button(bar, text="Show", command=run).pack(side="left", padx=8)
+    ttk.Button(actions, text="Export CSV", command=export_csv).pack(side="left")
+    ttk.Button(actions, text="Save Printable Sheet", command=save_sheet).pack(side="left", padx=10)
+    date_entry.bind("<Return>", lambda _: run())
+    group_box.bind("<<ComboboxSelected>>", lambda _: run())
+    run()
+
+
 def clear_form():
     for entry in [
         entry_sender_name, entry_sender_address, entry_pincode_sender, entry_sender_phone,
@@ -306,14 +841,75 @@ def clear_form():
         entry_city, entry_state, entry_pincode, entry_receiver_phone, entry_weight
     ]:
         entry.delete(0, tk.END)
+    entry_locality._filled_for = None
+    hide_locality_suggestions()
     add()
     status_var.set("Form cleared")
 
 
-def receipt_wind():
-    """Show receipt window based on the last 'receipt' global."""
+# ---------- Receipt printing ----------
+# One spooler for the app: it keeps the printer port open and prints on its own thread.
+PRINT_SPOOLER = jj.PrintSpooler(
+    os.environ.get("COURIERX_PRINTER_PORT", "COM3"),
+    int(os.environ.get("COURIERX_PRINTER_BAUD", "9600")),
+    codepage=os.environ.get("COURIERX_PRINTER_CODEPAGE", "cp437"),
+)
+PRINT_STATUS_TEXT = {
+    "queued": "Queued for printing…",
+    "printing": "Printing…",
+    "retrying": "Printer error, retrying…",
+    "printed": "Receipt printed",
+    "failed": "Print failed",
+}
+
+
+def receipt_qr_data(c: Courier) -> str:
+    """Text encoded in the receipt QR, on screen and on the printed receipt."""
+    return (
+        f"Receipt: {c.receipt}\n"
+        f"Sender: {c.sender_name}, {c.sender_phone}, {c.sender_pincode}\n"
+        f"Receiver: {c.receiver_name}, {c.receiver_phone}, {c.receiver_pincode}\n"
+        f"Weight: {c.weight} kg\n"
+        f"Delivery Price: ₹{format_rupees(c.price_paise)}\n"
+        f"Payment: {c.payment_method or '—'} ({c.payment_status or 'Pending'})\n"
+        f"Status: {tracking.status_text(c)}"
+    )
+
+
+def receipt_print_data(c: Courier) -> dict:
+    return {
+        "receipt": c.receipt,
+        "sender": f"{c.sender_name} ({c.sender_phone})",
+        "receiver": f"{c.receiver_name} ({c.receiver_phone})",
+        "origin": f"{c.sender_address} - {c.sender_pincode}",
+        "destination": f"{c.receiver_address} - {c.receiver_pincode}",
+        "price": format_rupees(c.price_paise),
+        "payment_mode": c.payment_method or "N/A",
+        "qr": receipt_qr_data(c),
+    }
+
+
+def track_print_job(job: jj.PrintJob, window: tk.Toplevel, var: tk.StringVar):
+    """Mirror a print job's status into var (while window is open) and the status bar."""
+    def poll():
+        text = PRINT_STATUS_TEXT[job.status]
+        if job.status in ("retrying", "failed") and job.error:
+            text += f": {job.error}"
+        if window.winfo_exists():
+            var.set(text)
+        status_var.set(f"Receipt {job.id}: {text}")
+        if not job.done.is_set():
+            root.after(200, poll)
+
+    poll()
+
+
+def receipt_wind(receipt_no: str = None):
+    """Show the receipt window for receipt_no (default: the last booking's 'receipt' global)."""
+    just_booked = receipt_no is None
+    receipt_no = receipt_no or receipt
     try:
-        c = session.query(Courier).filter_by(receipt=receipt).one()
+        c = BOOKINGS.get(receipt_no)
     except Exception as e:
         messagebox.showerror("Error", f"Could not load receipt data:\n{e}")
         return
@@ -323,7 +919,7 @@ def receipt_wind():
     receipt_window.geometry("820x680")
     receipt_window.configure(bg="#f5f5f5")
 
-    tk.Label(receipt_window, text="✅ Courier Submitted Successfully!",
+    tk.Label(receipt_window, text="✅ Courier Submitted Successfully!" if just_booked else "Courier Receipt",
              font=("Helvetica", 16, "bold"), fg="#4CAF50", bg="#f5f5f5").pack(pady=10)
 
     tk.Label(receipt_window, text=f"Receipt No: {c.receipt}",
@@ -336,25 +932,25 @@ def receipt_wind():
     sender_frame.pack(side=tk.LEFT, anchor="n", expand=True, fill="both", padx=(0, 10))
 
     tk.Label(sender_frame, text="📤 Sender Details", font=("Helvetica", 14, "bold"), bg="#f5f5f5").pack(anchor="w", pady=(0, 5))
-    for text in [
+    for line in [
         f"Name: {c.sender_name}",
         f"Address: {c.sender_address}",
         f"Phone: {c.sender_phone}",
         f"Pin Code: {c.sender_pincode}",
     ]:
-        tk.Label(sender_frame, text=text, font=("Helvetica", 12), bg="#f5f5f5").pack(anchor="w")
+        tk.Label(sender_frame, text=line, font=("Helvetica", 12), bg="#f5f5f5").pack(anchor="w")
 
     receiver_frame = tk.Frame(info_frame, bg="#f5f5f5")
     receiver_frame.pack(side=tk.RIGHT, anchor="n", expand=True, fill="both", padx=(10, 0))
 
     tk.Label(receiver_frame, text="📥 Receiver Details", font=("Helvetica", 14, "bold"), bg="#f5f5f5").pack(anchor="e", pady=(0, 5))
-    for text in [
+    for line in [
         f"Name: {c.receiver_name}",
         f"Address: {c.receiver_address}",
         f"Phone: {c.receiver_phone}",
         f"Pin Code: {c.receiver_pincode}",
     ]:
-        tk.Label(receiver_frame, text=text, font=("Helvetica", 12), bg="#f5f5f5").pack(anchor="e")
+        tk.Label(receiver_frame, text=line, font=("Helvetica", 12), bg="#f5f5f5").pack(anchor="e")
 
 
 
@@ -362,43 +958,42 @@ def receipt_wind():
     pay_text = f"Payment Method: {c.payment_method or '—'}"
     status_text = f"Payment Status: {c.payment_status or 'Pending'}"
     tk.Label(receipt_window, text=pay_text, font=("Helvetica", 12), bg="#f5f5f5").pack()
-    tk.Label(receipt_window, text=status_text, font=("Helvetica", 12), bg="#f5f5f5").pack(pady=(0, 8))
+    tk.Label(receipt_window, text=status_text, font=("Helvetica", 12), bg="#f5f5f5").pack()
+    tracking_row = tk.Frame(receipt_window, bg="#f5f5f5")
+    tracking_row.pack(pady=(0, 8))
+    tk.Label(tracking_row, text=f"Shipment Status: {tracking.status_text(c)}", font=("Helvetica", 12),
+             bg="#f5f5f5").pack(side=tk.LEFT)
+    if c.tracking_status:
+        tk.Button(tracking_row, text="History", font=("Helvetica", 10),
+                  command=lambda: tracking_window(c.receipt, receipt_window)).pack(side=tk.LEFT, padx=8)
+    if c.batch:
+        tk.Button(receipt_window, text=f"📦 Part of {c.batch}: show consolidated receipt", font=("Helvetica", 11),
+                  command=lambda: batch_receipt_wind(c.batch)).pack()
 
     # Receipt QR (info)
     tk.Label(receipt_window, text="📄 Receipt QR Code",
              font=("Helvetica", 14, "bold"), bg="#f5f5f5", fg="#333").pack(pady=(20, 5))
 
-    qr_data = (
-        f"Receipt: {c.receipt}\n"
-        f"Sender: {c.sender_name}, {c.sender_phone}, {c.sender_pincode}\n"
-        f"Receiver: {c.receiver_name}, {c.receiver_phone}, {c.receiver_pincode}\n"
-        f"Weight: {c.weight} kg\n"
-        f"Delivery Price: ₹{c.delivery_price}\n"
-        f"Payment: {c.payment_method or '—'} ({c.payment_status or 'Pending'})\n"
-        f"Status: Submitted"
-    )
-    qr_img = qrcode.make(qr_data).resize((180, 180))
-    qr_photo = ImageTk.PhotoImage(qr_img)
-
+    qr_data = receipt_qr_data(c)
     qr_frame = tk.Frame(receipt_window, bg="white", bd=2, relief="groove")
-    qr_label = tk.Label(qr_frame, image=qr_photo, bg="white")
-    qr_label.image = qr_photo
+    qr_label = tk.Label(qr_frame, bg="white")
     qr_label.pack()
     qr_frame.pack(pady=10)
+    show_qr(qr_label, qr_data, 180)
 
     def save_qr():
         try:
             fname = f"{c.receipt}_qr.png"
-            qr_img.save(fname)
+            qr_render.qr_image(qr_data, 180).save(fname)
             messagebox.showinfo("Saved", f"QR Code saved as {fname}")
         except Exception as e:
             messagebox.showerror("Error", f"Couldn't save QR code:\n{e}")
 
-    def print_qr():
-        try:
-            qr_img.show()
-        except Exception as e:
-            messagebox.showerror("Error", f"Couldn't open the image viewer:\n{e}")
+    print_status = tk.StringVar(value="")
+
+    def print_receipt():
+        job = PRINT_SPOOLER.submit(receipt_print_data(c))
+        track_print_job(job, receipt_window, print_status)
 
     btn_frame = tk.Frame(receipt_window, bg="#f5f5f5")
     btn_frame.pack(pady=10)
@@ -407,12 +1002,35 @@ def receipt_wind():
               command=save_qr).pack(side=tk.LEFT, padx=10)
 
     tk.Button(btn_frame, text="🖨️ Print", font=("Helvetica", 12), bg="#4CAF50", fg="white",
-              command=print_qr).pack(side=tk.LEFT, padx=10)
+              command=print_receipt).pack(side=tk.LEFT, padx=10)
 
     tk.Button(btn_frame, text="❌ Close Receipt", font=("Helvetica", 12), bg="#f44336", fg="white",
               command=receipt_window.destroy).pack(side=tk.LEFT, padx=10)
 
-    clear_form()
+    tk.Label(receipt_window, textvariable=print_status, font=("Helvetica", 11), bg="#f5f5f5",
+             fg="#555").pack()
+
+    if just_booked:
+        clear_form()
+
+
+def tracking_window(receipt_no: str, parent: tk.Toplevel):
+    """Every tracking scan of a shipment, oldest first (courierx.tracking)."""
+    try:
+        events = tracking.timeline(BOOKINGS.db, receipt_no)
+    except Exception as e:
+        messagebox.showerror("Error", f"Could not load tracking history:\n{e}", parent=parent)
+        return
+    win = tk.Toplevel(parent)
+    win.title(f"Tracking {receipt_no}")
+    win.geometry("560x300")
+    tree = ttk.Treeview(win, columns=("at", "status", "location"), show="headings")
+    for col, heading, width in (("at", "Time", 150), ("status", "Status", 150), ("location", "Location", 220)):
+        tree.heading(col, text=heading)
+        tree.column(col, width=width, anchor="w")
+    tree.pack(fill="both", expand=True, padx=10, pady=10)
+    for at, status, place in events:
+        tree.insert("", tk.END, values=(at.strftime("%Y-%m-%d %H:%M"), status, place or ""))
 
 
 def submit():
@@ -435,38 +1053,25 @@ def submit():
 
     weight = get_value(entry_weight)
 
-    # Validation
-    if not all([sender_name, sender_address, sender_pincode, sender_phone]):
-        messagebox.showwarning("Missing Info", "Please fill in all sender details.")
-        return
-    if not all([receiver_name, street, locality, city, state, receiver_pincode, receiver_phone]):
-        messagebox.showwarning("Missing Info", "Please fill in all receiver details.")
-        return
-    if not phn_is_valid(sender_phone):
-        messagebox.showwarning("Invalid Phone", "Sender phone must be 10 digits and start with 6, 7, 8, or 9.")
-        return
-    if not phn_is_valid(receiver_phone):
-        messagebox.showwarning("Invalid Phone", "Receiver phone must be 10 digits and start with 6, 7, 8, or 9.")
-        return
-    if not (sender_pincode.isdigit() and len(sender_pincode) == 6):
-        messagebox.showwarning("Invalid PIN", "Sender PIN must be exactly 6 digits.")
-        return
-    if not (receiver_pincode.isdigit() and len(receiver_pincode) == 6):
-        messagebox.showwarning("Invalid PIN", "Receiver PIN must be exactly 6 digits.")
-        return
-    if not weight:
-        messagebox.showwarning("Missing Info", "Please enter package weight (kg).")
-        return
-    try:
-        weight_float = float(weight)
-        if weight_float <= 0:
-            raise ValueError
-    except Exception:
-        messagebox.showwarning("Invalid Weight", "Weight must be a positive number, e.g., 2.5")
+    problem = validate_booking(
+        sender_name=sender_name, sender_address=sender_address, sender_pincode=sender_pincode,
+        sender_phone=sender_phone, receiver_name=receiver_name, street=street, locality=locality,
+        city=city, state=state, receiver_pincode=receiver_pincode, receiver_phone=receiver_phone,
+        weight=weight,
+    )
+    if problem:
+        messagebox.showwarning(*problem)
         return
+    weight_float = float(weight)
+    if PINCODES is not None:
+        unknown = [who for who, pin in (("Sender", sender_pincode), ("Receiver", receiver_pincode))
+                   if not PINCODES.is_known_pin(pin)]
+        if unknown and not messagebox.askokcancel(
+                "Unknown PIN", f"{' and '.join(unknown)} PIN not found in the pincode data.\nSubmit anyway?"):
+            return
 
-    receiver_address = f"{house}, {street}, {locality}, {city}, {state}"
-    receipt = generate_receipt()
+    receiver_address = format_receiver_address(house, street, locality, city, state)
+    receipt = BOOKINGS.receipts.next()
 
     info = (
         f"Receipt No: {receipt}\n\n"
@@ -487,10 +1092,10 @@ def submit():
         return
 
     # Compute delivery price BEFORE insert so we save it
-    AM = calculate_delivery_price(state, weight_float)
+    AM = BOOKINGS.quote(state, weight_float, receiver_pincode, sender_pincode)
 
     # Insert into DB
-    new_courier = Courier(
+    receipt = BOOKINGS.book(dict(
         receipt=receipt,
         sender_name=sender_name,
         sender_address=sender_address,
@@ -500,27 +1105,44 @@ def submit():
         receiver_address=receiver_address,
         receiver_phone=receiver_phone,
         receiver_pincode=receiver_pincode,
-        weight=f"{weight_float}",
-        delivery_price=f"{AM:.2f}",
+        weight=weight_float,
+        price_paise=to_paise(AM),
         payment_method=None,
         payment_status="Pending",
-    )
-    session.add(new_courier)
-    session.commit()
+    ))
+
+    def choose_payment(method: str):
+        try:
+            BOOKINGS.set_payment_method(receipt, method, AM)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not save payment method:\n{e}")
+            return False
+
+        if method != "Cash on Delivery":
+            payment(AM, receipt)
+        else:
+            receipt_wind()  # Show receipt directly for COD
+        return True
 
+    checkout_window(f"Courier Checkout - {receiver_name}", f"Delivering to {receiver_name}",
+                    f"Address:{receiver_address}", AM, choose_payment)
+
+
+def checkout_window(title: str, heading: str, detail: str, amount: float, choose_payment):
+    """Price and payment method buttons; choose_payment(method) saves the choice and returns True if it did."""
     # Checkout window (use Toplevel, not another Tk)
     root2 = tk.Toplevel(root)
     root2.geometry("860x760")
-    root2.title(f"Courier Checkout - {receiver_name}")
+    root2.title(title)
     root2.configure(bg="#f0f4f7")
 
     title_font = font.Font(family="Helvetica", size=16, weight="bold")
     label_font = font.Font(family="Helvetica", size=11)
 
-    delivery_price_var = tk.StringVar(value=f"₹{AM:.2f}")
+    delivery_price_var = tk.StringVar(value=f"₹{amount:.2f}")
 
-    tk.Label(root2, text=f"Delivering to {receiver_name}", font=title_font, bg="#f0f4f7", fg="#222").pack(pady=(20, 5))
-    tk.Label(root2, text=f"Address:{receiver_address}", font=label_font, bg="#f0f4f7", fg="#555").pack()
+    tk.Label(root2, text=heading, font=title_font, bg="#f0f4f7", fg="#222").pack(pady=(20, 5))
+    tk.Label(root2, text=detail, font=label_font, bg="#f0f4f7", fg="#555").pack()
 
     # Price
     tk.Label(root2, textvariable=delivery_price_var, font=("Helvetica", 18, "bold"),
@@ -536,22 +1158,9 @@ def submit():
 
     selected_payment = tk.StringVar(value="")
 
-    def choose_payment(method: str, open_qr: bool = False):
-        selected_payment.set(method)
-        try:
-            c = session.query(Courier).filter_by(receipt=receipt).one()
-            c.payment_method = method
-            c.delivery_price = f"{AM:.2f}"
-            c.payment_status = "Pending" if method == "Cash on Delivery" else "Unverified"
-            session.commit()
-        except Exception as e:
-            messagebox.showerror("Error", f"Could not save payment method:\n{e}")
-            return
-
-        if open_qr:
-            payment(AM)
-        if method == "Cash on Delivery":
-            receipt_wind()  # Show receipt directly for COD
+    def choose(method: str):
+        if choose_payment(method):
+            selected_payment.set(method)
 
     def create_payment_button(text, bg, fg, command=None):
         btn = tk.Button(payment_frame, text=text, width=25, bg=bg, fg=fg,
@@ -566,19 +1175,288 @@ def submit():
 
     create_payment_button(
         "Google Pay", "#e0f7fa", "#00796b",
-        command=lambda: choose_payment("Google Pay", open_qr=True)
+        command=lambda: choose("Google Pay")
     )
     create_payment_button(
         "Other UPI App", "#e0f7fa", "#00796b",
-        command=lambda: choose_payment("Other UPI App", open_qr=True)
+        command=lambda: choose("Other UPI App")
     )
     create_payment_button(
         "Cash on Delivery", "#ffe0b2", "#bf360c",
-        command=lambda: choose_payment("Cash on Delivery", open_qr=False)
+        command=lambda: choose("Cash on Delivery")
     )
 
     tk.Button(root2, text="← Back", width=10, bg="#d7ccc8", fg="#4e342e", font=label_font,
               command=root2.destroy).place(x=30, y=20)
+    return root2
+
+# ---------- Multi-parcel booking ----------
+# One sender, many parcels: "Add to Batch" moves the receiver and weight from
+# the form into the batch grid and locks the sender fields until the batch is
+# booked or discarded. Booking prices every parcel in one pass and inserts
+# them all in one transaction (courierx.bulk.book_parcels); they are paid for
+# together, with one UPI QR for the total, and get one consolidated receipt.
+BATCH = []  # (shipment row for book_parcels, quoted price in rupees), in the order added
+_batch_ui = {}  # widgets of the open batch window
+
+
+def sender_entries() -> tuple:
+    return entry_sender_name, entry_sender_address, entry_pincode_sender, entry_sender_phone
+
+
+def receiver_entries() -> tuple:
+    return (entry_receiver_name, entry_house, entry_street, entry_locality, entry_city, entry_state,
+            entry_pincode, entry_receiver_phone, entry_weight)
+
+
+def lock_sender(locked: bool):
+    for entry in sender_entries():
+        entry.state(["readonly"] if locked else ["!readonly"])
+
+
+def clear_receiver():
+    for entry in receiver_entries():
+        entry.configure(validate="none")
+        entry.delete(0, tk.END)
+        _mark_placeholder(entry, entry._placeholder_text)
+    entry_locality._filled_for = None
+    hide_locality_suggestions()
+
+
+def form_shipment():
+    """The form as a validated shipment row (see courierx.bulk.shipment_from_row), or None after saying why."""
+    # The sender then receiver entries are in IMPORT_FIELDS order
+    fields = dict(zip(IMPORT_FIELDS, (get_value(e) for e in sender_entries() + receiver_entries())))
+    row, error = shipment_from_row(fields, PINCODES)
+    if error:
+        messagebox.showwarning("Invalid Parcel", error)
+        return None
+    if PINCODES is not None:
+        unknown = [who for who, pin in (("Sender", row["sender_pincode"]), ("Receiver", row["receiver_pincode"]))
+                   if not PINCODES.is_known_pin(pin)]
+        if unknown and not messagebox.askokcancel(
+                "Unknown PIN", f"{' and '.join(unknown)} PIN not found in the pincode data.\nAdd anyway?"):
+            return None
+    return row
+
+
+def add_to_batch():
+    row = form_shipment()
+    if row is None:
+        return
+    price = BOOKINGS.quote(row["_state"], row["weight"], row["receiver_pincode"], row["sender_pincode"])
+    BATCH.append((row, price))
+    lock_sender(True)
+    clear_receiver()
+    batch_window()
+    status_var.set(f"Parcel {len(BATCH)} added to the batch")
+    entry_receiver_name.focus_set()
+
+
+def end_batch():
+    BATCH.clear()
+    lock_sender(False)
+    win = _batch_ui.pop("win", None)
+    if win is not None and win.winfo_exists():
+        win.destroy()
+
+
+def discard_batch():
+    if BATCH and not messagebox.askyesno("Discard Batch", f"Discard the {len(BATCH)} parcel(s) not yet booked?",
+                                         parent=_batch_ui.get("win")):
+        return
+    end_batch()
+    status_var.set("Batch discarded")
+
+
+def batch_window():
+    """Open the batch grid, or refresh it if it's open."""
+    win = _batch_ui.get("win")
+    if win is None or not win.winfo_exists():
+        win = tk.Toplevel(root)
+        win.title("Batch Booking")
+        win.geometry("820x440")
+        win.protocol("WM_DELETE_WINDOW", discard_batch)
+        sender_var = tk.StringVar()
+        ttk.Label(win, textvariable=sender_var, font=HEADER_FONT).pack(anchor="w", padx=10, pady=(10, 4))
+        body = ttk.Frame(win)
+        body.pack(fill="both", expand=True, padx=10)
+        columns = (("n", "#", 35), ("receiver", "Receiver", 150), ("phone", "Phone", 100), ("pin", "PIN", 65),
+                   ("place", "City, State", 220), ("weight", "Kg", 55), ("price", "Price", 80))
+        tree = ttk.Treeview(body, columns=[c[0] for c in columns], show="headings", selectmode="extended")
+        for col, heading, width in columns:
+            tree.heading(col, text=heading)
+            tree.column(col, width=width, anchor="w")
+        scroll = ttk.Scrollbar(body, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scroll.set)
+        scroll.pack(side="right", fill="y")
+        tree.pack(side="left", fill="both", expand=True)
+        total_var = tk.StringVar()
+        bar = ttk.Frame(win, padding=10)
+        bar.pack(fill="x")
+        ttk.Label(bar, textvariable=total_var).pack(side="left")
+        book_btn = ttk.Button(bar, command=book_batch)
+        book_btn.pack(side="right")
+        ttk.Button(bar, text="Discard Batch", command=discard_batch).pack(side="right", padx=8)
+        ttk.Button(bar, text="Remove Selected", command=remove_from_batch).pack(side="right")
+        _batch_ui.update(win=win, tree=tree, sender=sender_var, total=total_var, book=book_btn)
+
+    tree = _batch_ui["tree"]
+    tree.delete(*tree.get_children())
+    for i, (row, price) in enumerate(BATCH):
+        place = row["receiver_address"].split(", ", 3)[-1]  # "locality, city, state"
+        tree.insert("", tk.END, iid=str(i), values=(i + 1, row["receiver_name"], row["receiver_phone"],
+                                                    row["receiver_pincode"], place, f"{row['weight']:g}",
+                                                    f"₹{price:.2f}"))
+    if BATCH:
+        first = BATCH[0][0]
+        _batch_ui["sender"].set(f"Sender: {first['sender_name']}, {first['sender_phone']} "
+                                f"(fields locked until the batch is booked or discarded)")
+    kg = sum(row["weight"] for row, _ in BATCH)
+    _batch_ui["total"].set(f"{len(BATCH)} parcel(s) · {kg:g} kg · ₹{sum(p for _, p in BATCH):.2f}")
+    _batch_ui["book"].configure(text=f"Book {len(BATCH)} Parcel(s)", state="normal" if BATCH else "disabled")
+    win.lift()
+
+
+def remove_from_batch():
+    for iid in sorted(map(int, _batch_ui["tree"].selection()), reverse=True):
+        del BATCH[iid]
+    if not BATCH:
+        lock_sender(False)
+    batch_window()
+
+
+def book_batch():
+    win = _batch_ui["win"]
+    first = BATCH[0][0]
+    kg = sum(row["weight"] for row, _ in BATCH)
+    if not messagebox.askokcancel(
+            "Confirm Batch",
+            f"Sender: {first['sender_name']}, {first['sender_phone']}\n\n"
+            f"{len(BATCH)} parcel(s), {kg:g} kg\nTotal: ₹{sum(p for _, p in BATCH):.2f}",
+            parent=win):
+        return
+    try:
+        batch_no, _ = book_parcels(BOOKINGS, [dict(row) for row, _ in BATCH])
+        parcels = BOOKINGS.get_batch(batch_no)
+    except Exception as e:
+        messagebox.showerror("Error", f"Could not book the parcels:\n{e}", parent=win)
+        return
+    end_batch()
+    clear_form()
+    status_var.set(f"Booked {len(parcels)} parcel(s) under {batch_no}")
+    amount = sum(c.price_paise for c in parcels) / 100
+
+    def choose_payment(method: str):
+        try:
+            BOOKINGS.set_batch_payment(batch_no, method)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not save payment method:\n{e}")
+            return False
+        if method != "Cash on Delivery":
+            payment(amount, batch_no)  # one QR for the total; the batch number goes in the note
+        batch_receipt_wind(batch_no)
+        return True
+
+    checkout_window(f"Batch Checkout - {batch_no}", f"{len(parcels)} parcels from {first['sender_name']}",
+                    f"Consolidated receipt: {batch_no}", amount, choose_payment)
+
+
+def batch_qr_data(batch_no: str, parcels: list) -> str:
+    """Text encoded in the consolidated receipt QR: the totals and one line per parcel."""
+    c = parcels[0]
+    lines = [
+        f"Consolidated receipt: {batch_no}",
+        f"Sender: {c.sender_name}, {c.sender_phone}, {c.sender_pincode}",
+        f"Parcels: {len(parcels)}, {sum(p.weight for p in parcels):g} kg",
+        f"Total: ₹{format_rupees(sum(p.price_paise for p in parcels))}",
+        f"Payment: {c.payment_method or '—'} ({c.payment_status or 'Pending'})",
+    ]
+    return "\n".join(lines + [f"{p.receipt} {p.receiver_pincode} {p.weight:g} kg" for p in parcels])
+
+
+def batch_print_data(batch_no: str, parcels: list) -> dict:
+    c = parcels[0]
+    return {
+        "receipt": batch_no,
+        "sender": f"{c.sender_name} ({c.sender_phone})",
+        "receiver": f"{len(parcels)} parcels, {sum(p.weight for p in parcels):g} kg",
+        "origin": f"{c.sender_address} - {c.sender_pincode}",
+        "destination": "See parcels below",
+        "price": format_rupees(sum(p.price_paise for p in parcels)),
+        "payment_mode": c.payment_method or "N/A",
+        "parcels": [{"receipt": p.receipt, "detail": f"{p.receiver_name}, {p.receiver_pincode}, {p.weight:g} kg, "
+                                                     f"₹{format_rupees(p.price_paise)}"} for p in parcels],
+        "qr": batch_qr_data(batch_no, parcels),
+    }
+
+
+def batch_receipt_wind(batch_no: str):
+    """Consolidated receipt of a multi-parcel booking: every parcel, the total and one QR."""
+    try:
+        parcels = BOOKINGS.get_batch(batch_no)
+    except Exception as e:
+        messagebox.showerror("Error", f"Could not load receipt data:\n{e}")
+        return
+    if not parcels:
+        messagebox.showerror("Error", f"No multi-parcel booking {batch_no}")
+        return
+    c = parcels[0]
+
+    win = tk.Toplevel(root)
+    win.title("Consolidated Receipt")
+    win.geometry("820x760")
+    win.configure(bg="#f5f5f5")
+    tk.Label(win, text=f"✅ {len(parcels)} Parcels Booked", font=("Helvetica", 16, "bold"), fg="#4CAF50",
+             bg="#f5f5f5").pack(pady=10)
+    tk.Label(win, text=f"Consolidated Receipt No: {batch_no}", font=("Helvetica", 12), bg="#f5f5f5").pack(pady=5)
+    tk.Label(win, text=f"📤 {c.sender_name}, {c.sender_phone} · {c.sender_address} - {c.sender_pincode}",
+             font=("Helvetica", 12), bg="#f5f5f5").pack(pady=(0, 8))
+
+    body = tk.Frame(win, bg="#f5f5f5")
+    body.pack(fill="x", padx=40)
+    columns = (("receipt", "Receipt", 110), ("receiver", "Receiver", 170), ("address", "Address", 250),
+               ("weight", "Kg", 55), ("price", "Price", 80))
+    tree = ttk.Treeview(body, columns=[col[0] for col in columns], show="headings", height=min(len(parcels), 8))
+    for col, heading, width in columns:
+        tree.heading(col, text=heading)
+        tree.column(col, width=width, anchor="w")
+    scroll = ttk.Scrollbar(body, orient="vertical", command=tree.yview)
+    tree.configure(yscrollcommand=scroll.set)
+    scroll.pack(side="right", fill="y")
+    tree.pack(side="left", fill="x", expand=True)
+    for p in parcels:
+        tree.insert("", tk.END, values=(p.receipt, f"{p.receiver_name} ({p.receiver_phone})",
+                                        f"{p.receiver_address} - {p.receiver_pincode}", f"{p.weight:g}",
+                                        f"₹{format_rupees(p.price_paise)}"))
+    tree.bind("<Double-1>", lambda _: tree.selection() and receipt_wind(tree.set(tree.selection()[0], "receipt")))
+
+    total = sum(p.price_paise for p in parcels)
+    tk.Label(win, text=f"Total: ₹{format_rupees(total)} for {sum(p.weight for p in parcels):g} kg",
+             font=("Helvetica", 14, "bold"), bg="#f5f5f5").pack(pady=(10, 0))
+    tk.Label(win, text=f"Payment Method: {c.payment_method or '—'} · Status: {c.payment_status or 'Pending'}",
+             font=("Helvetica", 12), bg="#f5f5f5").pack()
+
+    qr_frame = tk.Frame(win, bg="white", bd=2, relief="groove")
+    qr_label = tk.Label(qr_frame, bg="white")
+    qr_label.pack()
+    qr_frame.pack(pady=10)
+    show_qr(qr_label, batch_qr_data(batch_no, parcels), 220)
+
+    print_status = tk.StringVar(value="")
+
+    def print_receipt():
+        job = PRINT_SPOOLER.submit(batch_print_data(batch_no, parcels))
+        track_print_job(job, win, print_status)
+
+    btn_frame = tk.Frame(win, bg="#f5f5f5")
+    btn_frame.pack(pady=10)
+    tk.Button(btn_frame, text="🖨️ Print", font=("Helvetica", 12), bg="#4CAF50", fg="white",
+              command=print_receipt).pack(side=tk.LEFT, padx=10)
+    tk.Button(btn_frame, text="❌ Close Receipt", font=("Helvetica", 12), bg="#f44336", fg="white",
+              command=win.destroy).pack(side=tk.LEFT, padx=10)
+    tk.Label(win, textvariable=print_status, font=("Helvetica", 11), bg="#f5f5f5", fg="#555").pack()
+
 
 # =========================
 # Tkinter GUI
@@ -639,6 +1517,26 @@ ttk.Label(sender_frame, text="Phone Number:").grid(row=2, column=0, sticky="w",
 entry_sender_phone = ttk.Entry(sender_frame, width=30, validate="key", validatecommand=phone_vcmd)
 entry_sender_phone.grid(row=2, column=1, pady=5)
 
+# Check the PIN (and fill what it implies) as soon as 6 digits are typed
+def bind_pin_lookup(entry: ttk.Entry, lookup):
+    entry._checked_pin = None
+
+    def on_key(_):
+        if getattr(entry, "_has_placeholder", False):
+            return
+        pin = get_value(entry)
+        if len(pin) == 6 and pin != entry._checked_pin:
+            entry._checked_pin = pin
+            lookup(pin)
+        elif len(pin) < 6:
+            entry._checked_pin = None
+            entry.configure(foreground="black")
+
+    entry.bind("<KeyRelease>", on_key, add="+")
+
+
+bind_pin_lookup(entry_pincode_sender, info_pincode_sender)
+
 btn_auto_location = ttk.Button(sender_frame, text="Auto Location", command=get_current_location)
 btn_auto_location.grid(row=2, column=3, pady=5)
 
@@ -665,11 +1563,97 @@ ttk.Label(receiver_frame, text="Locality/Area:").grid(row=1, column=2, sticky="w
 entry_locality = ttk.Entry(receiver_frame, width=30)
 entry_locality.grid(row=1, column=3, pady=5)
 
+# ---------- Locality typeahead ----------
+suggest_win = None   # borderless dropdown under entry_locality
+suggest_list = None
+entry_locality._filled_for = None  # locality text the receiver fields were last filled for
+
+
+def fill_receiver_from_locality(area: str):
+    entry_locality._filled_for = area
+    info_receiver(area)
+
+
+def hide_locality_suggestions():
+    if suggest_win is not None:
+        suggest_win.withdraw()
+
+
+def show_locality_suggestions(names: list):
+    global suggest_win, suggest_list
+    if not names:
+        hide_locality_suggestions()
+        return
+    if suggest_win is None:
+        suggest_win = tk.Toplevel(root)
+        suggest_win.overrideredirect(True)
+        suggest_list = tk.Listbox(suggest_win, font=LABEL_FONT, activestyle="none", exportselection=False)
+        suggest_list.pack(fill="both", expand=True)
+        suggest_list.bind("<ButtonRelease-1>", lambda _: pick_locality_suggestion())
+        suggest_list.bind("<Return>", lambda _: pick_locality_suggestion())
+        suggest_list.bind("<Escape>", lambda _: (hide_locality_suggestions(), entry_locality.focus_set()))
+    suggest_list.delete(0, tk.END)
+    for name in names:
+        suggest_list.insert(tk.END, name)
+    suggest_list.configure(height=len(names), width=entry_locality.cget("width"))
+    x = entry_locality.winfo_rootx()
+    y = entry_locality.winfo_rooty() + entry_locality.winfo_height()
+    suggest_win.geometry(f"+{x}+{y}")
+    suggest_win.deiconify()
+    suggest_win.lift()
+
+
+def suggestions_visible() -> bool:
+    return suggest_win is not None and suggest_win.winfo_viewable()
+
+
+def pick_locality_suggestion():
+    sel = suggest_list.curselection()
+    name = suggest_list.get(sel[0] if sel else 0)
+    hide_locality_suggestions()
+    set_entry_text(entry_locality, name)
+    entry_locality.focus_set()
+    entry_locality.icursor(tk.END)
+    fill_receiver_from_locality(name)
+
+
+def on_locality_key(event):
+    if event.keysym == "Down" and suggestions_visible():
+        suggest_list.focus_set()
+        suggest_list.selection_clear(0, tk.END)
+        suggest_list.selection_set(0)
+        suggest_list.activate(0)
+        return
+    if event.keysym == "Escape":
+        hide_locality_suggestions()
+        return
+    if event.keysym in ("Return", "KP_Enter"):
+        if suggestions_visible():
+            pick_locality_suggestion()
+        return
+    show_locality_suggestions(find_area_suggestions(get_value(entry_locality)))
+
+
 # Auto-fill district/state/pin when locality loses focus (only if not placeholder)
 def on_locality_focus_out(_):
-    if not getattr(entry_locality, "_has_placeholder", False):
-        info_receiver(entry_locality.get())
+    if suggestions_visible():
+        # Clicking the dropdown moves focus to it; only fill if focus went elsewhere
+        root.after(100, _locality_focus_settled)
+        return
+    area = get_value(entry_locality)
+    if area and area != entry_locality._filled_for:
+        fill_receiver_from_locality(area)
+
 
+def _locality_focus_settled():
+    focused = root.focus_get()
+    if focused is suggest_list or focused is entry_locality:
+        return
+    hide_locality_suggestions()
+    on_locality_focus_out(None)
+
+
+entry_locality.bind("<KeyRelease>", on_locality_key, add="+")
 entry_locality.bind("<FocusOut>", on_locality_focus_out, add="+")
 
 ttk.Label(receiver_frame, text="City (District):").grid(row=2, column=0, sticky="w", pady=5)
@@ -684,6 +1668,8 @@ ttk.Label(receiver_frame, text="Pin Code:").grid(row=3, column=0, sticky="w", pa
 entry_pincode = ttk.Entry(receiver_frame, width=30, validate="key", validatecommand=pincode_vcmd)
 entry_pincode.grid(row=3, column=1, pady=5)
 
+bind_pin_lookup(entry_pincode, info_pincode_receiver)
+
 ttk.Label(receiver_frame, text="Phone Number:").grid(row=3, column=2, sticky="w", pady=5)
 entry_receiver_phone = ttk.Entry(receiver_frame, width=30, validate="key", validatecommand=phone_vcmd)
 entry_receiver_phone.grid(row=3, column=3, pady=5)
@@ -698,6 +1684,24 @@ submit_btn.pack(side="left", padx=10)
 clear_btn = ttk.Button(button_frame, text="Clear Form", command=clear_form)
 clear_btn.pack(side="left", padx=10)
 
+batch_btn = ttk.Button(button_frame, text="Add to Batch", command=add_to_batch)
+batch_btn.pack(side="left", padx=10)
+
+search_btn = ttk.Button(button_frame, text="Shipment History", command=history_window)
+search_btn.pack(side="left", padx=10)
+
+manifest_btn = ttk.Button(button_frame, text="Dispatch Manifest", command=manifest_window)
+manifest_btn.pack(side="left", padx=10)
+
+find_entry = ttk.Entry(button_frame, width=28)
+find_entry.pack(side="left", padx=(20, 4))
+find_entry.bind("<Return>", lambda _: DB_READY.is_set() and find_window(get_value(find_entry)))
+add_placeholder(find_entry, "Find by name or address")
+find_btn = ttk.Button(button_frame, text="Find", command=lambda: find_window(get_value(find_entry)))
+find_btn.pack(side="left")
+
+DB_WIDGETS = (submit_btn, batch_btn, search_btn, manifest_btn, find_btn)  # need the migrated database
+
 
 
 def add():
@@ -719,5 +1723,29 @@ def add():
 # Initialize placeholders
 add()
 
+# Migrate the database and parse the pincode dataset once the window is up
+root.after_idle(start_migration)
+root.after_idle(start_pincode_load)
+
+# =========================
+# Instrumentation
+# =========================
+# Lateness of a 100 ms timer is how long the Tk thread was busy, i.e. how long
+# the window "hung". Metrics go to COURIERX_METRICS_FILE (see courierx.metrics).
+UI_LAG = metrics.histogram("courierx_ui_lag_seconds", "How late the Tk event loop ran a 100 ms timer")
+UI_LAG_INTERVAL_MS = 100
+
+
+def _watch_ui_lag(expected=None):
+    now = time.perf_counter()
+    if expected is not None:
+        UI_LAG.observe(max(0.0, now - expected))
+    root.after(UI_LAG_INTERVAL_MS, _watch_ui_lag, now + UI_LAG_INTERVAL_MS / 1000)
+
+
+if metrics.METRICS_ENABLED:
+    root.after_idle(_watch_ui_lag)
+metrics.start_textfile_writer()
+
 if __name__ == "__main__":
     root.mainloop()
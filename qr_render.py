@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import qrcode
+from PIL import Image
+
+from courierx import metrics
+
+# =========================
+# QR rendering
+# =========================
+# QRs are drawn straight at the requested pixel size: the box size is the
+# largest whole number of pixels per module that fits with a 4-module quiet
+# zone, and the leftover pixels widen the white margin. Nothing is resampled,
+# so modules stay sharp. Rendered images are kept in a bounded LRU keyed by
+# (payload, size), and render_async() does the work on a background thread.
+
+QR_CACHE_SIZE = 64
+QUIET_ZONE = 4  # modules, as the QR spec asks
+
+
+class LRUCache:
+    """Small thread-safe LRU mapping."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
+QR_RENDER = metrics.histogram("courierx_qr_render_seconds", "Rendering a QR image (cache misses only)")
+
+_images = LRUCache(QR_CACHE_SIZE)
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="qr-render")
+
+
+def qr_matrix(payload: str) -> np.ndarray:
+    """QR modules as a bool array (True = dark), without quiet zone."""
+    qr = qrcode.QRCode(border=0)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    return np.array(qr.get_matrix(), dtype=bool)
+
+
+@metrics.timed(QR_RENDER)
+def render_qr(payload: str, size_px: int) -> Image.Image:
+    """Render a size_px x size_px greyscale QR without any resampling."""
+    modules = qr_matrix(payload)
+    n = modules.shape[0]
+    box = max(1, size_px // (n + 2 * QUIET_ZONE))
+    side = max(size_px, n * box + 2 * QUIET_ZONE)  # only grows for payloads too big for size_px
+    canvas = np.full((side, side), 255, dtype=np.uint8)
+    offset = (side - n * box) // 2
+    canvas[offset:offset + n * box, offset:offset + n * box] = np.where(modules, 0, 255).astype(np.uint8) \
+        .repeat(box, axis=0).repeat(box, axis=1)
+    return Image.fromarray(canvas, mode="L")
+
+
+def qr_image(payload: str, size_px: int) -> Image.Image:
+    """Cached render_qr(). Callers must not modify the returned image."""
+    key = (payload, size_px)
+    img = _images.get(key)
+    if img is None:
+        img = render_qr(payload, size_px)
+        _images.put(key, img)
+    return img
+
+
+def is_cached(payload: str, size_px: int) -> bool:
+    return (payload, size_px) in _images
+
+
+def render_async(payload: str, size_px: int) -> Future:
+    """qr_image() on the render thread; already-cached QRs come back as a finished future."""
+    img = _images.get((payload, size_px))
+    if img is not None:
+        done = Future()
+        done.set_result(img)
+        return done
+    return _executor.submit(qr_image, payload, size_px)
+
+
+def benchmark(repeat: int = 50):
+    """Compare the old make()+resize() path with native and cached rendering."""
+    payloads = [
+        "upi://pay?pa=jigerjeet@upi&pn=Jigerjeet&am=245.00&cu=INR&tn=Courier Payment",
+        "Receipt: EMBN9Y65ZT\nSender: Asha Verma, 9876543210, 110005\n"
+        "Receiver: Rahul Sharma, 9123456780, 141001\nWeight: 2.5 kg\n"
+        "Delivery Price: ₹175.00\nPayment: Google Pay (Unverified)\nStatus: Submitted",
+    ]
+
+    def timed(fn):
+        started = time.perf_counter()
+        for i in range(repeat):
+            fn(i)
+        return (time.perf_counter() - started) / repeat * 1000
+
+    for payload, size in zip(payloads, (200, 180)):
+        old = timed(lambda i: qrcode.make(payload).resize((size, size)))
+        native = timed(lambda i: render_qr(payload, size))
+        qr_image(payload, size)
+        cached = timed(lambda i: qr_image(payload, size))
+        print(f"{len(payload):>4}-char payload @ {size}px: make+resize {old:.2f} ms, "
+              f"native {native:.2f} ms, cached {cached * 1000:.1f} µs")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,13 @@
+from courierx.booking import open_bookings
+from courierx.receipts import format_receipt
+
+
+def test_book_keeps_the_callers_receipt(tmp_path):
+    bookings = open_bookings(f"sqlite:///{tmp_path / 'couriers.db'}")
+    # the counter shows the receipt number before booking, so it passes one in
+    for _ in range(3):
+        receipt = bookings.receipts.next()
+        assert bookings.book(dict(receipt=receipt, sender_name="Asha", receiver_name="Ravi")) == receipt
+    assert bookings.book(dict(sender_name="Asha", receiver_name="Ravi")) == format_receipt(3)
+    assert bookings.receipts.next() == format_receipt(4)  # no sequence numbers skipped
+    bookings.db.dispose()
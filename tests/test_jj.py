@@ -0,0 +1,119 @@
+from datetime import datetime
+
+import pytest
+
+import jj
+
+RECEIPT = {
+    'receipt': 'EM00000001', 'sender': 'Asha (9876543210)', 'receiver': 'Ravi (9876543211)',
+    'origin': 'Delhi - 110001', 'destination': 'Pune - 411001', 'price': '120.00',
+    'payment_mode': 'Cash on Delivery', 'qr': 'Receipt: EM00000001',
+}
+PRINTED_AT = datetime(2026, 10, 16, 14, 5, 0)
+
+GOLDEN = (
+    b'\x1b@'                                  # ESC @ initialize
+    b'\x1bt\x00'                              # ESC t 0: cp437
+    b'\x1ba\x01\x1bE\x01\x1d!\x01'            # centre, bold, double height
+    b'Courier Delivery Receipt\n'
+    b'\x1d!\x00\x1bE\x00'
+    b'Receipt No: EM00000001\n'
+    b'\x1ba\x00'
+    b'--------------------------------\n'
+    b'Date: 2026-10-16 14:05:00\n'
+    b'\n'
+    b'Sender:       Asha (9876543210)\n'
+    b'Receiver:     Ravi (9876543211)\n'
+    b'Origin:       Delhi - 110001\n'
+    b'Destination:  Pune - 411001\n'
+    b'\n'
+    b'Delivery Fee: Rs.120.00\n'
+    b'Payment Mode: Cash on Delivery\n'
+    b'--------------------------------\n'
+    b'\x1ba\x01'
+    b'\x1d(k\x04\x00\x31\x41\x32\x00'         # QR model 2
+    b'\x1d(k\x03\x00\x31\x43\x04'             # module size 4
+    b'\x1d(k\x03\x00\x31\x45\x31'             # error correction M
+    b'\x1d(k\x16\x00\x31\x50\x30Receipt: EM00000001'  # store 19 bytes: pL = 19 + 3
+    b'\x1d(k\x03\x00\x31\x51\x30'             # print
+    b'\n'
+    b'\x1ba\x01Thank you for choosing our service!\n'
+    b'\x1dVB\x03'                             # GS V 66 3: feed 3 lines, partial cut
+)
+
+
+def test_receipt_golden():
+    assert jj.escpos_receipt(RECEIPT, printed_at=PRINTED_AT) == GOLDEN
+
+
+def test_init_and_codepage():
+    assert jj.escpos_receipt(RECEIPT, printed_at=PRINTED_AT).startswith(b'\x1b@\x1bt\x00')
+    out = jj.escpos_receipt(RECEIPT, codepage='cp858', printed_at=PRINTED_AT)
+    assert out.startswith(b'\x1b@\x1bt\x13')
+    assert jj.select_codepage('cp1252') == b'\x1bt\x10'
+
+
+def test_rupee_transliterated():
+    assert jj.encode_text('₹70.00 — paid') == b'Rs.70.00 - paid'
+    assert jj.encode_text('📤 Sender') == b' Sender'
+    assert b'\xe2\x82\xb9' not in jj.escpos_receipt(RECEIPT, printed_at=PRINTED_AT)
+
+
+def test_qr_short_payload():
+    assert jj.qr_code('ABC') == (
+        b'\x1d(k\x04\x00\x31\x41\x32\x00'
+        b'\x1d(k\x03\x00\x31\x43\x04'
+        b'\x1d(k\x03\x00\x31\x45\x31'
+        b'\x1d(k\x06\x00\x31\x50\x30ABC'
+        b'\x1d(k\x03\x00\x31\x51\x30'
+    )
+
+
+def test_qr_store_length_over_255():
+    payload = 'X' * 300  # pL pH = 303 = 0x012f
+    out = jj.qr_code(payload, module_size=6, error_level='H')
+    assert b'\x1d(k\x03\x00\x31\x43\x06' in out
+    assert b'\x1d(k\x03\x00\x31\x45\x33' in out
+    assert b'\x1d(k\x2f\x01\x31\x50\x30' + b'X' * 300 + b'\x1d(k\x03\x00\x31\x51\x30' in out
+
+
+def test_qr_store_length_boundary():
+    assert b'\x1d(k\xff\x00\x31\x50\x30' in jj.qr_code('Y' * 252)
+    assert b'\x1d(k\x00\x01\x31\x50\x30' in jj.qr_code('Y' * 253)
+
+
+@pytest.mark.parametrize('level, limit', [('L', 2953), ('M', 2331), ('Q', 1663), ('H', 1273)])
+def test_qr_payload_limit_per_error_level(level, limit):
+    assert jj.qr_code('Z' * limit, error_level=level).count(b'Z') == limit
+    with pytest.raises(ValueError):
+        jj.qr_code('Z' * (limit + 1), error_level=level)
+
+
+def test_qr_payload_limit_counts_utf8_bytes():
+    jj.qr_code('é' * 1165)  # 2330 bytes
+    with pytest.raises(ValueError):
+        jj.qr_code('é' * 1166)  # 2332 bytes, though only 1166 characters
+
+
+def test_cut():
+    assert jj.escpos_receipt(RECEIPT, printed_at=PRINTED_AT).endswith(b'\x1dVB\x03')
+    assert jj.cut(feed_lines=0, partial=False) == b'\x1dVA\x00'
+
+
+def test_spooler_writes_over_loopback():
+    statuses = []
+    spooler = jj.PrintSpooler('loop://', on_status=lambda job: statuses.append(job.status))
+    job = spooler.submit(jj.escpos_receipt(RECEIPT, printed_at=PRINTED_AT))
+    assert job.done.wait(5)
+    assert job.status == 'printed' and job.attempts == 1
+    assert spooler._serial.read(len(GOLDEN)) == GOLDEN
+    spooler.close()
+    assert 'printing' in statuses and statuses[-1] == 'printed'
+
+
+def test_spooler_fails_after_retries():
+    spooler = jj.PrintSpooler('nosuchscheme://printer', retries=2, retry_delay=0)
+    job = spooler.submit(b'\x1b@')
+    assert job.done.wait(5)
+    assert job.status == 'failed' and job.attempts == 2 and job.error
+    spooler.close()
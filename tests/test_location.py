@@ -0,0 +1,130 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import location
+from courierx import pincodes
+
+ANSWER = {"ip": "203.0.113.7", "city": "Ludhiana", "region": "Punjab", "postal": "141001", "country": "IN"}
+
+
+class StubProvider(BaseHTTPRequestHandler):
+    """ipinfo.io-style answers; the path picks the behaviour."""
+    hits = {}
+    delay = {"/slow": 1.0, "/busy": 0.3}
+
+    def do_GET(self):
+        StubProvider.hits[self.path] = StubProvider.hits.get(self.path, 0) + 1
+        time.sleep(self.delay.get(self.path, 0))
+        if self.path == "/error":
+            self.send_response(503)
+            self.end_headers()
+            return
+        body = json.dumps(ANSWER).encode()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up (timeout test)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def provider():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubProvider)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def reset_hits():
+    StubProvider.hits.clear()
+
+
+def lookup(provider, path, tmp_path, **kw):
+    return location.LocationLookup(url=provider + path, cache_path=str(tmp_path / "location.cache.json"), **kw)
+
+
+def test_answer_is_mapped_and_cached(provider, tmp_path):
+    loc = lookup(provider, "/ok", tmp_path)
+    entry = loc.get()
+    assert (entry["city"], entry["state"], entry["pincode"]) == ("Ludhiana", "Punjab", "141001")
+    assert loc.get() == entry and loc.lookup_async().result() == entry
+    assert StubProvider.hits == {"/ok": 1}
+    # a restarted terminal reads the cache file instead of asking again
+    assert lookup(provider, "/ok", tmp_path).get() == entry
+    assert StubProvider.hits == {"/ok": 1}
+
+
+def test_cache_expires_after_ttl(provider, tmp_path):
+    loc = lookup(provider, "/ok", tmp_path, ttl=0.2)
+    loc.get()
+    loc.get()
+    assert StubProvider.hits == {"/ok": 1}
+    time.sleep(0.3)
+    assert loc.cached() is None
+    loc.get()
+    assert StubProvider.hits == {"/ok": 2}
+
+
+def test_cache_is_per_provider_url(provider, tmp_path):
+    lookup(provider, "/ok", tmp_path).get()
+    assert lookup(provider, "/other", tmp_path).cached() is None
+
+
+def test_concurrent_lookups_share_one_request(provider, tmp_path):
+    loc = lookup(provider, "/busy", tmp_path)
+    futures = [loc.lookup_async() for _ in range(5)]
+    assert all(f is futures[0] for f in futures)
+    assert futures[0].result(5)["pincode"] == "141001"
+    assert StubProvider.hits == {"/busy": 1}
+
+
+def test_postal_code_goes_through_pincode_dataset(provider, tmp_path):
+    csv_path = tmp_path / "pins.csv"
+    csv_path.write_text("officename,pincode,district,statename\n"
+                        "Ludhiana City H.O,141001,LUDHIANA,PUNJAB\n"
+                        "Karol Bagh S.O,110005,CENTRAL DELHI,DELHI\n", encoding="utf-8")
+    table = pincodes.load(str(csv_path), str(tmp_path / "pins.cache"))
+    entry = lookup(provider, "/ok", tmp_path).get()
+    assert location.sender_address(entry, table.find_pin) == ("LUDHIANA, PUNJAB", "141001", True)
+    unknown = dict(entry, pincode="999999")
+    assert location.sender_address(unknown, table.find_pin) == ("Ludhiana, Punjab", "999999", False)
+    assert location.sender_address(entry) == ("Ludhiana, Punjab", "141001", None)
+
+
+def test_timeout_reaches_callback_without_blocking(provider, tmp_path):
+    loc = lookup(provider, "/slow", tmp_path, timeout=0.2)
+    started = time.perf_counter()
+    future = loc.lookup_async()
+    assert time.perf_counter() - started < 0.1  # the Tk thread only polls the future
+    called = threading.Event()
+    future.add_done_callback(lambda f: called.set())
+    assert called.wait(5)
+    assert time.perf_counter() - started < 0.9  # given up before the stub (1 s) answers, one retry included
+    # the pooled session's retry wraps the read timeout
+    assert isinstance(future.exception(), (requests.exceptions.Timeout, requests.exceptions.ConnectionError))
+    assert "timed out" in str(future.exception())
+    assert loc.cached() is None
+
+
+def test_http_error_reaches_callback(provider, tmp_path):
+    loc = lookup(provider, "/error", tmp_path)
+    errors = []
+    called = threading.Event()
+    future = loc.lookup_async()
+    future.add_done_callback(lambda f: (errors.append(f.exception()), called.set()))
+    assert called.wait(5)
+    assert isinstance(errors[0], requests.exceptions.HTTPError)
+    assert loc.cached() is None
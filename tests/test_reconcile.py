@@ -0,0 +1,66 @@
+import csv
+from datetime import datetime
+
+import pytest
+
+from courierx import reconcile
+from courierx.booking import open_bookings
+
+
+@pytest.fixture
+def bookings(tmp_path):
+    b = open_bookings(f"sqlite:///{tmp_path / 'couriers.db'}")
+    yield b
+    b.db.dispose()
+
+
+def book_upi(bookings, amount, created_at):
+    receipt = bookings.book(dict(sender_name="Asha", receiver_name="Ravi", weight=1.0, created_at=created_at))
+    bookings.set_payment_method(receipt, "Google Pay", amount)
+    return receipt
+
+
+def write_statement(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["Txn Date", "Amount", "Remarks", "UTR"])
+        w.writerows(rows)
+    return str(path)
+
+
+@pytest.mark.parametrize("text", ["inf", "-inf", "nan", "1e400", "₹1e999"])
+def test_non_finite_amount_is_not_an_amount(text):
+    assert reconcile.parse_statement_amount(text) is None
+
+
+def test_amounts():
+    assert reconcile.parse_statement_amount("₹1,234.50") == 123450
+    assert reconcile.parse_statement_amount("Rs. 70") == 7000
+    assert reconcile.parse_statement_amount("n/a") is None
+
+
+def test_overflowing_amount_is_reported_not_fatal(bookings, tmp_path):
+    first = book_upi(bookings, 120.0, datetime(2026, 10, 16, 14, 0))
+    second = book_upi(bookings, 70.0, datetime(2026, 10, 16, 15, 0))
+    path = write_statement(tmp_path / "statement.csv", [
+        ["16/10/2026 14:02", "120.00", f"UPI/{first}", "U1"],
+        ["16/10/2026 14:30", "1e400", "UPI/garbled", "U2"],
+        ["16/10/2026 14:31", "inf", "UPI/garbled", "U3"],
+        ["16/10/2026 15:01", "70.00", f"UPI/{second}", "U4"],
+    ])
+    issues = []
+    counts = reconcile.reconcile_payments(bookings.db, path, on_issue=lambda *a: issues.append(a[:3]))
+    assert counts["matched"] == 2 and counts["updated"] == 2 and counts["unmatched"] == 2
+    assert issues == [(3, "unmatched", "not a credit amount"), (4, "unmatched", "not a credit amount")]
+    assert bookings.get(first).payment_status == bookings.get(second).payment_status == "Paid"
+
+
+def test_time_parser_remembers_its_own_format():
+    parser = reconcile.StatementTimeParser()
+    assert parser("16 Oct 2026 14:05") == datetime(2026, 10, 16, 14, 5)
+    assert parser.last_format == "%d %b %Y %H:%M"
+    assert parser("17 Oct 2026") == datetime(2026, 10, 17)  # other formats still tried
+    assert parser("16/10/2026 14:05") == datetime(2026, 10, 16, 14, 5)
+    assert parser("not a time") is None
+    assert reconcile.STATEMENT_TIME_FORMATS[0] == "%d %b %Y %H:%M:%S"  # the shared constant is left alone
+    assert reconcile.StatementTimeParser().last_format is None